@@ -0,0 +1,46 @@
+"""
+End-to-end Agent.process_goals wall time against a fake Ollama.
+
+    python -m benchmarks.bench_agent [-n 20] [--latency 0.2] [--workers 1 4]
+"""
+from __future__ import annotations
+import argparse, json, time
+from jarvis_hybrid import ollama_client
+from jarvis_hybrid.agent import Agent
+from .common import isolated_state
+from .fake_ollama import FakeOllama
+
+def _batch(n: int, workers: int, llm: int, tag: str) -> float:
+    agent = Agent()
+    agent.cfg.goal_workers = workers
+    agent.cfg.llm_concurrency = llm
+    for i in range(n):
+        agent.add_goal(f"bench task {tag} {i}")   # distinct goals -> no plan cache hits
+    t0 = time.perf_counter()
+    agent.process_goals()
+    return time.perf_counter() - t0
+
+def run(n: int = 20, latency: float = 0.2, workers=(1, 4), llm: int = 4) -> dict:
+    srv = FakeOllama(latency=latency).start()
+    ollama_client.configure_client(srv.url, pool_size=llm)
+    out = {"goals": n, "llm_latency_s": latency, "runs": []}
+    try:
+        with isolated_state():
+            for w in workers:
+                wall = _batch(n, w, llm, f"w{w}")
+                out["runs"].append({"workers": w, "wall_s": wall, "goals_per_s": n / wall})
+    finally:
+        srv.stop()
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-n", type=int, default=20)
+    ap.add_argument("--latency", type=float, default=0.2)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--llm", type=int, default=4, help="llm_concurrency")
+    a = ap.parse_args()
+    print(json.dumps(run(a.n, a.latency, a.workers, a.llm), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Many concurrent chats and goals in one process: threads vs asyncio.
+
+    python -m benchmarks.bench_async [--chats 50] [--goals 50] [--latency 0.2] [--tokens-per-sec 100]
+
+"threads" answers every chat with ChatSession.ask on its own thread (what the
+blocking client needs for concurrency); "asyncio" awaits ChatSession.aask for
+all of them on one event loop. Then one AsyncAgent runs the goals
+with goal_workers = goals. peak_threads counts this process's threads
+(the fake server's request threads excluded). The scheduler still admits
+ollama_max_inflight requests at a time, as it would for a real local model;
+it is raised here so the client side is what gets measured.
+"""
+from __future__ import annotations
+import argparse, asyncio, json, threading, time
+from jarvis_hybrid import ollama_client
+from jarvis_hybrid.async_agent import AsyncAgent
+from jarvis_hybrid.chat import ChatSession
+from jarvis_hybrid.config import load_config
+from .common import isolated_state
+from .fake_ollama import FakeOllama
+
+class _PeakThreads:
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._t = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.005):
+            n = sum("process_request" not in t.name for t in threading.enumerate())
+            self.peak = max(self.peak, n)
+
+    def __enter__(self):
+        self._t.start(); return self
+
+    def __exit__(self, *a):
+        self._stop.set(); self._t.join()
+
+def _chats_threads(n: int, cfg) -> dict:
+    out = []
+    def one(i):
+        out.append(ChatSession(cfg.model, cfg=cfg).ask(f"thread chat {i}"))
+    with _PeakThreads() as pk:
+        t0 = time.perf_counter()
+        ts = [threading.Thread(target=one, args=(i,)) for i in range(n)]
+        for t in ts: t.start()
+        for t in ts: t.join()
+        wall = time.perf_counter() - t0
+    return {"wall_s": wall, "peak_threads": pk.peak, "answers": len(out)}
+
+def _chats_async(n: int, cfg) -> dict:
+    async def chats():
+        return await asyncio.gather(*[ChatSession(cfg.model, cfg=cfg).aask(f"async chat {i}") for i in range(n)])
+    with _PeakThreads() as pk:
+        t0 = time.perf_counter()
+        out = asyncio.run(chats())
+        wall = time.perf_counter() - t0
+    return {"wall_s": wall, "peak_threads": pk.peak, "answers": len(out)}
+
+def _goals_async(n: int, cfg) -> dict:
+    agent = AsyncAgent(cfg=cfg)
+    cfg.goal_workers = cfg.llm_concurrency = cfg.exec_concurrency = n
+    cfg.pipeline_depth = 0; cfg.plan_batch_size = 1
+    for i in range(n):
+        agent.add_goal(f"async goal {i}")
+    with _PeakThreads() as pk:
+        t0 = time.perf_counter()
+        asyncio.run(agent.process_goals())
+        wall = time.perf_counter() - t0
+    return {"wall_s": wall, "peak_threads": pk.peak}
+
+def run(chats: int = 50, goals: int = 50, latency: float = 0.2, tokens_per_sec: float = 100.0) -> dict:
+    srv = FakeOllama(latency=latency, tokens_per_sec=tokens_per_sec,
+                     response=json.dumps({"intent": "python", "target": None, "python_code": "print('ok')"})).start()
+    n = max(chats, goals)
+    try:
+        with isolated_state():
+            ollama_client.configure_client(srv.url, pool_size=n)
+            sched = ollama_client.get_scheduler()
+            saved = sched.max_inflight
+            sched.max_inflight = n
+            cfg = load_config()
+            cfg.chat_use_context = False
+            try:
+                return {"chats": chats, "goals": goals, "llm_latency_s": latency,
+                        "chat_threads": _chats_threads(chats, cfg), "chat_asyncio": _chats_async(chats, cfg),
+                        "goals_asyncio": _goals_async(goals, cfg)}
+            finally:
+                sched.max_inflight = saved
+    finally:
+        srv.stop()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--chats", type=int, default=50)
+    ap.add_argument("--goals", type=int, default=50)
+    ap.add_argument("--latency", type=float, default=0.2)
+    ap.add_argument("--tokens-per-sec", type=float, default=100.0)
+    a = ap.parse_args()
+    print(json.dumps(run(a.chats, a.goals, a.latency, a.tokens_per_sec), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Chat prompt size and latency per turn: full-history text prompts vs ChatSession.
+
+    python -m benchmarks.bench_chat [--turns 30] [--eval-ms-per-token 0.5]
+
+The fake server charges eval-ms-per-token for every prompt token it has to
+evaluate, like a real model's prompt processing.
+"""
+from __future__ import annotations
+import argparse, json, time
+from jarvis_hybrid.config import Config
+from jarvis_hybrid.ollama_client import configure_client, model_generate_stream
+from jarvis_hybrid import chat
+from .common import isolated_state
+from .fake_ollama import FakeOllama
+
+ANSWER = ("Sure. Here is a fairly detailed answer that covers the question from a few angles, "
+          "with an example and a short list of caveats to keep in mind. ") * 4
+
+def _old_turns(n: int) -> list:
+    # the pre-session implementation: up to MAX_TURNS full turns every time
+    hist, out = [], []
+    for i in range(n):
+        u = f"Question number {i}: how would I go about improving this part of my project?"
+        prompt = chat._build_prompt(hist, u)
+        t0 = time.perf_counter(); meta = {}
+        a = "".join(model_generate_stream("bench", prompt, meta=meta)).strip()
+        out.append((len(prompt), meta.get("prompt_eval_count"), (time.perf_counter() - t0) * 1e3))
+        hist.append((u, a))
+    return out
+
+def _session_turns(n: int, cfg: Config) -> list:
+    sess = chat.ChatSession("bench", cfg=cfg)
+    for i in range(n):
+        sess.ask(f"Question number {i}: how would I go about improving this part of my project?")
+    return [(s.prompt_chars, s.prompt_tokens, s.total_ms) for s in sess.stats]
+
+def _pick(rows: list) -> dict:
+    idx = sorted({0, 4, 9, len(rows) - 1})
+    out = {f"turn_{i + 1}": {"prompt_chars": rows[i][0], "prompt_tokens": rows[i][1],
+                             "latency_ms": round(rows[i][2], 1)} for i in idx if i < len(rows)}
+    out["mean_latency_ms"] = round(sum(r[2] for r in rows) / len(rows), 1)
+    out["max_prompt_tokens"] = max(r[1] or 0 for r in rows)
+    return out
+
+def run(turns: int = 30, eval_ms_per_token: float = 0.5) -> dict:
+    srv = FakeOllama(response=ANSWER, prompt_eval_per_token=eval_ms_per_token / 1e3).start()
+    configure_client(srv.url)
+    try:
+        with isolated_state():
+            old = _old_turns(turns)
+            cfg = Config(model="bench")
+            ctx = _session_turns(turns, cfg)
+            cfg_text = Config(model="bench", chat_use_context=False)
+            text = _session_turns(turns, cfg_text)
+    finally:
+        srv.stop(); configure_client()
+    return {"turns": turns, "full_history": _pick(old), "session_context": _pick(ctx),
+            "session_budgeted_text": _pick(text)}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--turns", type=int, default=30)
+    ap.add_argument("--eval-ms-per-token", type=float, default=0.5)
+    a = ap.parse_args()
+    print(json.dumps(run(a.turns, a.eval_ms_per_token), indent=2))
+
+if __name__ == "__main__":
+    main()
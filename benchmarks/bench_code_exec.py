@@ -0,0 +1,46 @@
+"""
+Code execution latency: cold `python script.py` spawn vs warm worker pool.
+
+    python -m benchmarks.bench_code_exec [-n 30] [--pool-size 2] [--gap 0.3]
+
+Pool workers are single-use, so each run waits up to --gap seconds first
+(untimed) for its replacement to start, as the planning step between goals
+does in practice. With --gap 0 jobs queue behind interpreter start-up.
+"""
+from __future__ import annotations
+import argparse, json, statistics, time
+from jarvis_hybrid.code_exec import run_python_subprocess
+from jarvis_hybrid.worker_pool import WorkerPool
+
+SNIPPET = "import psutil, requests\nprint('ok', psutil.cpu_count())\n"
+
+def _lat(fn, n: int, gap: float = 0.0) -> dict:
+    xs = []
+    for _ in range(n):
+        if gap: time.sleep(gap)
+        t0 = time.perf_counter(); fn(); xs.append((time.perf_counter() - t0) * 1e3)
+    xs.sort()
+    return {"p50_ms": statistics.median(xs), "p95_ms": xs[int(0.95 * (len(xs) - 1))], "mean_ms": statistics.fmean(xs)}
+
+def run(n: int = 30, pool_size: int = 2, gap: float = 0.3) -> dict:
+    pool = WorkerPool(pool_size, preload=("psutil", "requests"))
+    try:
+        pool.warm()
+        assert pool.run_code(SNIPPET).strip() == run_python_subprocess(SNIPPET).strip()
+        cold = _lat(lambda: run_python_subprocess(SNIPPET), n)
+        warm = _lat(lambda: pool.run_code(SNIPPET), n, gap)
+    finally:
+        pool.close()
+    return {"runs": n, "gap_s": gap, "cold_spawn": cold, "warm_pool": warm,
+            "speedup_p50": cold["p50_ms"] / warm["p50_ms"] if warm["p50_ms"] else None}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-n", type=int, default=30)
+    ap.add_argument("--pool-size", type=int, default=2)
+    ap.add_argument("--gap", type=float, default=0.3)
+    a = ap.parse_args()
+    print(json.dumps(run(a.n, a.pool_size, a.gap), indent=2))
+
+if __name__ == "__main__":
+    main()
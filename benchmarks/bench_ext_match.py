@@ -0,0 +1,64 @@
+"""
+Extension trigger matching: JSON reload + nested substring loop vs compiled index.
+
+    python -m benchmarks.bench_ext_match [--triggers 10000] [--goals 2000]
+"""
+from __future__ import annotations
+import argparse, json, random, time
+from jarvis_hybrid import extension_manager as XM
+from .common import isolated_state
+
+WORDS = ("disk space report backup photos clean temp folder sync notes export csv "
+         "invoice weather news mail calendar rename music video resize image zip "
+         "archive download upload server restart log scan ports wifi battery").split()
+
+def _naive(goal: str):
+    # the pre-index implementation
+    g = goal.lower()
+    for ext in XM.load_index():
+        for t in ext.get("triggers",[]):
+            if t.lower() in g:
+                return ext
+    return None
+
+def _make_index(n_triggers: int, per_ext: int, rnd: random.Random):
+    idx = []
+    for i in range(n_triggers // per_ext):
+        trig = [" ".join(rnd.sample(WORDS, rnd.randint(2, 3))) + f" {i}-{j}" for j in range(per_ext)]
+        idx.append({"name": f"ext{i}", "triggers": trig, "path": f"ext{i}.py", "created_ts": 0})
+    return idx
+
+def run(triggers: int = 10000, goals: int = 2000, per_ext: int = 4, seed: int = 1) -> dict:
+    rnd = random.Random(seed)
+    with isolated_state():
+        idx = _make_index(triggers, per_ext, rnd)
+        XM.save_index(idx)
+        sample = []
+        for k in range(goals):
+            if k % 2:
+                ext = rnd.choice(idx); sample.append("please " + rnd.choice(ext["triggers"]) + " now")
+            else:
+                sample.append("please " + " ".join(rnd.sample(WORDS, 4)))
+        naive_goals = sample[: max(1, goals // 20)]   # the old path is slow; time a subset
+        t0 = time.perf_counter(); [_naive(g) for g in naive_goals]; naive = (time.perf_counter() - t0) / len(naive_goals)
+        t0 = time.perf_counter(); XM.find_matching_extension(sample[0]); build = time.perf_counter() - t0
+        t0 = time.perf_counter(); [XM.find_matching_extension(g) for g in sample]; fast = (time.perf_counter() - t0) / len(sample)
+        agree = all((_naive(g) is None) == (XM.find_matching_extension(g) is None) for g in naive_goals)
+    return {
+        "triggers": triggers, "extensions": len(idx),
+        "naive_us_per_goal": naive * 1e6,
+        "index_build_ms": build * 1e3,
+        "index_us_per_goal": fast * 1e6,
+        "speedup": naive / fast if fast else None,
+        "same_hit_or_miss": agree,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--triggers", type=int, default=10000)
+    ap.add_argument("--goals", type=int, default=2000)
+    a = ap.parse_args()
+    print(json.dumps(run(a.triggers, a.goals), indent=2))
+
+if __name__ == "__main__":
+    main()
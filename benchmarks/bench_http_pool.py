@@ -0,0 +1,54 @@
+"""
+Per-request overhead: fresh urllib connection vs pooled keep-alive client.
+
+    python -m benchmarks.bench_http_pool [-n 500] [--threads 4]
+"""
+from __future__ import annotations
+import argparse, json, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib import request
+from jarvis_hybrid.ollama_client import OllamaHTTPClient
+from .fake_ollama import FakeOllama
+
+def _urllib_generate(url: str, model: str, prompt: str) -> str:
+    # the pre-pool code path: new Request + new TCP connection per call
+    data = json.dumps({"model": model, "prompt": prompt, "stream": False}).encode("utf-8")
+    req = request.Request(url + "/api/generate", data=data, headers={"Content-Type":"application/json"})
+    with request.urlopen(req, timeout=600) as resp:
+        return json.loads(resp.read().decode("utf-8","ignore")).get("response","")
+
+def _timed(fn, n: int, threads: int) -> float:
+    t0 = time.perf_counter()
+    if threads <= 1:
+        for _ in range(n): fn()
+    else:
+        with ThreadPoolExecutor(threads) as ex:
+            list(ex.map(lambda _: fn(), range(n)))
+    return time.perf_counter() - t0
+
+def run(n: int = 500, threads: int = 1) -> dict:
+    srv = FakeOllama().start()
+    client = OllamaHTTPClient(srv.url, pool_size=max(1, threads))
+    try:
+        _urllib_generate(srv.url, "m", "warmup"); client.generate("m", "warmup")
+        cold = _timed(lambda: _urllib_generate(srv.url, "m", "hi"), n, threads)
+        warm = _timed(lambda: client.generate("m", "hi"), n, threads)
+    finally:
+        client.close(); srv.stop()
+    return {
+        "requests": n, "threads": threads,
+        "urllib_us_per_req": cold / n * 1e6,
+        "pool_us_per_req": warm / n * 1e6,
+        "saved_us_per_req": (cold - warm) / n * 1e6,
+        "speedup": cold / warm if warm else None,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-n", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=1)
+    a = ap.parse_args()
+    print(json.dumps(run(a.n, a.threads), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Offline intent classifier: training time, route() latency and accuracy on paraphrases.
+
+    python -m benchmarks.bench_intent [--extensions 500] [--goals 1000] [--seed 1]
+
+Every synthetic extension gets a trigger phrase and a source goal made of
+made-up words. Test goals reword them (reordered words, filler, one typo)
+so the exact trigger matcher misses; "correct" counts goals routed to their
+own extension, "wrong" those routed elsewhere, and "unrelated_routed" goals
+from an unseen vocabulary that were routed at all. "near_miss_routed" counts
+goals that should go to the planner but look like a known one: built-in
+action look-alikes ("open power settings"), an extension's verb and one
+word with a foreign one, or an extension's goal plus an extra task.
+"sweep" repeats the held-out goals over thresholds x margins.
+"""
+from __future__ import annotations
+import argparse, json, random, statistics, string, time
+from dataclasses import replace
+from jarvis_hybrid import extension_manager as XM
+from jarvis_hybrid.actions import match_action
+from jarvis_hybrid.config import get_config
+from .common import isolated_state
+
+VERBS = ["resize", "archive", "convert", "rename", "upload", "backup", "sort", "compress", "clean", "sync"]
+FILLER = ["please", "can you", "go ahead and", "i want to", "quickly"]
+ACTION_NEAR_MISSES = ["open power settings", "open codepen in browser", "create a notebook",
+                      "create notes summarizing the meeting", "open the calculator app store page",
+                      "open command history file", "battery of tests for the parser", "notepad++ plugin list"]
+SWEEP = ((0.2, 0.35, 0.5, 0.6), (0.05, 0.1, 0.2))
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 8)))
+
+def _typo(rng: random.Random, w: str) -> str:
+    i = rng.randrange(len(w) - 1)
+    return w[:i] + w[i + 1] + w[i] + w[i + 2:]
+
+def _paraphrase(rng: random.Random, verb: str, a: str, b: str) -> str:
+    a, b = (_typo(rng, a), b) if rng.random() < 0.5 else (a, _typo(rng, b))
+    words = [verb, "the", b, a] if rng.random() < 0.5 else [verb, "my", a, b, "now"]
+    return f"{rng.choice(FILLER)} {' '.join(words)}"
+
+def run(extensions: int = 500, goals: int = 1000, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    from jarvis_hybrid import intent_classifier as IC
+    with isolated_state():
+        cfg = replace(get_config(), intent_classifier=True)
+        topics = [(rng.choice(VERBS), _word(rng), _word(rng)) for _ in range(extensions)]
+        XM.save_index([{"name": f"{v}_{a}", "triggers": [f"{v} {a} {b}"], "path": f"ext_{i}.py",
+                        "goal": f"{v} all {a} {b} files"} for i, (v, a, b) in enumerate(topics)])
+        ids = [e["id"] for e in XM.list_extensions()]
+        t0 = time.perf_counter()
+        IC.get_classifier(cfg)
+        train_ms = (time.perf_counter() - t0) * 1e3
+
+        lat, correct, wrong, exact = [], 0, 0, 0
+        for _ in range(goals):
+            k = rng.randrange(extensions)
+            g = _paraphrase(rng, *topics[k])
+            if XM.find_matching_extension(g) is not None:
+                exact += 1
+            t0 = time.perf_counter()
+            hit = IC.route(g, cfg)
+            lat.append((time.perf_counter() - t0) * 1e6)
+            if hit and hit[0] == "extension":
+                if hit[1]["id"] == ids[k]: correct += 1
+                else: wrong += 1
+        stray = sum(IC.route(f"{_word(rng)} {_word(rng)} {_word(rng)}", cfg) is not None for _ in range(goals))
+        near = [g for g in ACTION_NEAR_MISSES if match_action(g, cfg) is None]
+        for _ in range(goals):
+            v, a, b = topics[rng.randrange(extensions)]
+            near.append(f"{v} {a} {rng.choice(topics)[2]}" if rng.random() < 0.5
+                        else f"{v} all {a} {b} files and email them to {_word(rng)}")
+        near_routed = sum(IC.route(g, cfg) is not None for g in near)
+
+        held_out = [(_paraphrase(rng, *topics[k]), ids[k]) for k in (rng.randrange(extensions) for _ in range(goals))]
+        sweep = []
+        for th in SWEEP[0]:
+            for mg in SWEEP[1]:
+                c = replace(cfg, intent_threshold=th, intent_margin=mg)
+                hits = [IC.route(g, c) for g, _ in held_out]
+                sweep.append({"threshold": th, "margin": mg,
+                              "correct": sum(bool(h) and h[0] == "extension" and h[1]["id"] == i
+                                             for h, (_, i) in zip(hits, held_out)),
+                              "wrong": sum(bool(h) and not (h[0] == "extension" and h[1]["id"] == i)
+                                           for h, (_, i) in zip(hits, held_out)),
+                              "near_miss_routed": sum(IC.route(g, c) is not None for g in near)})
+
+        # incremental add: queue + promote one more extension
+        XM.queue_pending("tidy zzqx wvbn files", "print('ok')")
+        t0 = time.perf_counter()
+        XM.promote_pending(XM.list_pending()[0]["id"], ["tidy zzqx wvbn"], "tidy_zzqx")
+        promote_ms = (time.perf_counter() - t0) * 1e3
+        hit = IC.route("please tidy up my zzqx wvnb", cfg)
+    lat.sort()
+    return {"extensions": extensions, "goals": goals, "train_ms": train_ms,
+            "route_us": {"p50": statistics.median(lat), "p95": lat[int(0.95 * (len(lat) - 1))]},
+            "exact_trigger_hits": exact, "correct": correct, "wrong": wrong,
+            "accuracy": correct / goals, "unrelated_routed": stray,
+            "near_misses": len(near), "near_miss_routed": near_routed, "sweep": sweep,
+            "promote_ms": promote_ms, "promoted_routed": bool(hit and hit[0] == "extension")}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--extensions", type=int, default=500)
+    ap.add_argument("--goals", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=1)
+    a = ap.parse_args()
+    print(json.dumps(run(a.extensions, a.goals, a.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Logger throughput in messages/sec: reopen-per-batch writer vs the persistent-handle writer.
+
+    python -m benchmarks.bench_logger [-n 200000] [--threads 4]
+
+"caller" is how fast log() returns; "end_to_end" includes waiting until
+every line is on disk.
+"""
+from __future__ import annotations
+import argparse, json, queue, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from jarvis_hybrid import logger
+
+class _OldLogger:
+    """The pre-rewrite logger, writing to `path`."""
+    def __init__(self, path: Path):
+        self.path = path; self.q: "queue.Queue[str]" = queue.Queue(); self.stop = False
+        self.t = threading.Thread(target=self._writer, daemon=True); self.t.start()
+
+    def _rotate(self):
+        if self.path.exists() and self.path.stat().st_size > logger.MAX_BYTES:
+            self.path.rename(self.path.with_name(f"old_{time.time_ns()}.log"))
+
+    def _writer(self):
+        buf = []; last = time.time()
+        while not self.stop or not self.q.empty():
+            try: buf.append(self.q.get(timeout=0.25))
+            except queue.Empty: pass
+            if buf and (len(buf) >= 100 or time.time() - last > 0.5):
+                self._rotate()
+                with open(self.path, "a", encoding="utf-8", errors="ignore") as fh: fh.writelines(buf)
+                buf.clear(); last = time.time()
+
+    def log(self, msg: str, level: str = "INFO"):
+        ts = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.q.put(f"{ts} [{level}] {msg}\n")
+
+    def close(self):
+        self.stop = True; self.t.join()
+
+def _drive(fn, n: int, threads: int) -> float:
+    msg = "Ollama prompt -> mistral (1234 chars, stream)"
+    t0 = time.perf_counter()
+    if threads <= 1:
+        for _ in range(n): fn(msg)
+    else:
+        per = n // threads
+        with ThreadPoolExecutor(threads) as ex:
+            list(ex.map(lambda _: [fn(msg) for _ in range(per)], range(threads)))
+    return time.perf_counter() - t0
+
+def _bench_old(root: Path, n: int, threads: int) -> dict:
+    lg = _OldLogger(root / "old.log")
+    t0 = time.perf_counter()
+    call = _drive(lg.log, n, threads)
+    lg.close()
+    return {"caller_msgs_per_s": n / call, "end_to_end_msgs_per_s": n / (time.perf_counter() - t0)}
+
+def _bench_new(root: Path, n: int, threads: int, fmt: str, fields: bool) -> dict:
+    saved = logger.set_log_dir(root)
+    logger.configure_logger(fmt=fmt, max_queue=max(n, 100_000))
+    try:
+        t0 = time.perf_counter()
+        fn = (lambda m: logger.log(m, "INFO", batch_index=3, stage="plan", duration_ms=12.5)) if fields else logger.log
+        call = _drive(fn, n, threads)
+        logger.flush_logger(timeout=120)
+        e2e = time.perf_counter() - t0
+    finally:
+        logger.set_log_dir(saved)
+        logger.configure_logger(fmt="text", max_queue=100_000)
+    return {"caller_msgs_per_s": n / call, "end_to_end_msgs_per_s": n / e2e}
+
+def run(n: int = 200_000, threads: int = 1) -> dict:
+    logger.set_console_echo(False)
+    with tempfile.TemporaryDirectory(prefix="jarvis_log_") as td:
+        root = Path(td)
+        old = _bench_old(root, n, threads)
+        new = _bench_new(root, n, threads, "text", False)
+        fields = _bench_new(root, n, threads, "text", True)
+        js = _bench_new(root, n, threads, "json", True)
+    return {"messages": n, "threads": threads, "old": old, "new_text": new,
+            "new_text_with_fields": fields, "new_json_with_fields": js,
+            "speedup_end_to_end": new["end_to_end_msgs_per_s"] / old["end_to_end_msgs_per_s"]}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-n", type=int, default=200_000)
+    ap.add_argument("--threads", type=int, default=1)
+    a = ap.parse_args()
+    print(json.dumps(run(a.n, a.threads), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Memory search latency at scale: full-scan str.count ranking vs FTS5/BM25.
+
+    python -m benchmarks.bench_memory_search [--rows 100000] [--queries 50]
+"""
+from __future__ import annotations
+import argparse, itertools, json, random, sqlite3, statistics, time
+from jarvis_hybrid import memory
+from .common import isolated_state
+
+VOCAB = ("python flask django nginx server config docker compose kubernetes react vue "
+         "typescript webpack pytest unittest sqlite postgres redis cache queue worker "
+         "celery api rest graphql auth oauth jwt login cli console logger scanner agent "
+         "planner extension memory summary project module package build deploy ci "
+         "windows linux script powershell batch csv json yaml toml markdown docs").split()
+
+def _vocab(rnd: random.Random, n: int = 20_000):
+    # real summaries have a long-tailed vocabulary; sample words Zipf-style
+    extra = ["".join(rnd.choices("abcdefghijklmnopqrstuvwxyz", k=rnd.randint(4, 9))) for _ in range(n)]
+    words = VOCAB + extra
+    cum = list(itertools.accumulate(1.0 / (r + 1) for r in range(len(words))))
+    return words, cum
+
+def _old_search(q: str, topk: int = 10):
+    # the pre-FTS implementation
+    conn = memory.connect(); cur = conn.cursor()
+    cur.execute("SELECT summary FROM project_summaries")
+    rows = cur.fetchall(); conn.close()
+    ql = q.lower(); scored = []
+    for (txt,) in rows:
+        scored.append((txt.lower().count(ql), txt))
+    scored.sort(reverse=True, key=lambda x: x[0])
+    return scored[:topk]
+
+def _populate(rows: int, rnd: random.Random, words, cum):
+    conn = sqlite3.connect(memory.DB_PATH)
+    data = ((f"C:/proj/{i}", " ".join(rnd.choices(words, cum_weights=cum, k=60)), float(i)) for i in range(rows))
+    conn.executemany("INSERT INTO project_summaries(root,summary,ts) VALUES(?,?,?)", data)
+    conn.commit(); conn.close()
+
+def _lat(fn, queries) -> dict:
+    xs = []
+    for q in queries:
+        t0 = time.perf_counter(); fn(q); xs.append((time.perf_counter() - t0) * 1e3)
+    xs.sort()
+    return {"p50_ms": statistics.median(xs), "p95_ms": xs[int(0.95 * (len(xs) - 1))]}
+
+def run(rows: int = 100_000, queries: int = 50, seed: int = 7) -> dict:
+    rnd = random.Random(seed)
+    with isolated_state():
+        words, cum = _vocab(rnd)
+        t0 = time.perf_counter(); _populate(rows, rnd, words, cum); load = time.perf_counter() - t0
+        qs = [" ".join(rnd.choices(words[:2000], k=2)) for _ in range(queries)]
+        old = _lat(_old_search, qs[: max(3, queries // 10)])
+        fts = _lat(memory.search_text, qs)
+        phrase = _lat(lambda q: memory.search(f'"{q}"'), qs)
+        prefix = _lat(lambda q: memory.search(q[:3] + "*"), qs)
+    return {"rows": rows, "insert_s": load, "scan_search": old, "fts_bm25": fts,
+            "fts_phrase": phrase, "fts_prefix": prefix,
+            "speedup_p50": old["p50_ms"] / fts["p50_ms"] if fts["p50_ms"] else None}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--queries", type=int, default=50)
+    a = ap.parse_args()
+    print(json.dumps(run(a.rows, a.queries), indent=2))
+
+if __name__ == "__main__":
+    main()
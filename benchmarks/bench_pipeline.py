@@ -0,0 +1,53 @@
+"""
+Pipelined planning: batch wall time with and without plan prefetch.
+
+    python -m benchmarks.bench_pipeline [-n 8] [--plan-s 0.3] [--exec-s 0.3] [--depth 2]
+
+Every goal needs a plan (fake LLM latency plan-s) and then runs code that
+sleeps exec-s. One goal worker, so without prefetch the batch takes about
+n * (plan + exec); with it, about plan + n * max(plan, exec).
+"""
+from __future__ import annotations
+import argparse, json, time
+from jarvis_hybrid import ollama_client
+from jarvis_hybrid.agent import Agent
+from .common import isolated_state
+from .fake_ollama import FakeOllama
+
+def _batch(n: int, depth: int, tag: str) -> float:
+    agent = Agent()
+    agent.cfg.goal_workers = 1
+    agent.cfg.pipeline_depth = depth
+    agent.cfg.plan_batch_size = 1
+    agent.cfg.use_worker_pool = False
+    for i in range(n):
+        agent.add_goal(f"pipeline task {tag} {i}")
+    t0 = time.perf_counter()
+    agent.process_goals()
+    return time.perf_counter() - t0
+
+def run(n: int = 8, plan_s: float = 0.3, exec_s: float = 0.3, depth: int = 2) -> dict:
+    code = f"import time; time.sleep({exec_s}); print('done')"
+    srv = FakeOllama(latency=plan_s, response=json.dumps({"intent": "python", "target": None, "python_code": code})).start()
+    ollama_client.configure_client(srv.url)
+    try:
+        with isolated_state():
+            serial = _batch(n, 0, "serial")
+            piped = _batch(n, depth, "piped")
+    finally:
+        srv.stop()
+    return {"goals": n, "plan_s": plan_s, "exec_s": exec_s, "depth": depth,
+            "no_prefetch_s": serial, "prefetch_s": piped, "speedup": serial / piped,
+            "ideal_s": plan_s + n * max(plan_s, exec_s)}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-n", type=int, default=8)
+    ap.add_argument("--plan-s", type=float, default=0.3)
+    ap.add_argument("--exec-s", type=float, default=0.3)
+    ap.add_argument("--depth", type=int, default=2)
+    a = ap.parse_args()
+    print(json.dumps(run(a.n, a.plan_s, a.exec_s, a.depth), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Batched planning: LLM requests, prompt chars and wall time for a queue of small goals.
+
+    python -m benchmarks.bench_plan_batch [-n 16] [--latency 0.1] [--eval-ms-per-token 0.5] [--batch 4]
+
+The fake model answers batch prompts with one plan per numbered goal and
+charges eval-ms-per-token for every prompt token, like prompt processing on
+a real model.
+"""
+from __future__ import annotations
+import argparse, json, re, time
+from jarvis_hybrid import ollama_client
+from jarvis_hybrid.agent import Agent
+from .common import isolated_state
+from .fake_ollama import FakeOllama
+
+PLAN = {"intent": "python", "target": None, "python_code": "print('ok')"}
+
+def _answer(prompt: str) -> str:
+    if '"plans"' in prompt:
+        ids = re.findall(r"^(\d+)\. ", prompt, re.M)
+        return json.dumps({"plans": [dict(PLAN, id=int(i)) for i in ids]})
+    return json.dumps(PLAN)
+
+def _batch(srv: FakeOllama, n: int, batch: int, tag: str) -> dict:
+    agent = Agent()
+    agent.cfg.goal_workers = 1
+    agent.cfg.plan_batch_size = batch
+    for i in range(n):
+        agent.add_goal(f"small task {tag} number {i}")
+    r0, c0 = srv.requests, srv.prompt_chars
+    t0 = time.perf_counter()
+    agent.process_goals()
+    return {"wall_s": time.perf_counter() - t0, "llm_requests": srv.requests - r0,
+            "prompt_chars": srv.prompt_chars - c0}
+
+def run(n: int = 16, latency: float = 0.1, eval_ms_per_token: float = 0.5, batch: int = 4) -> dict:
+    srv = FakeOllama(latency=latency, response=_answer, prompt_eval_per_token=eval_ms_per_token / 1e3).start()
+    ollama_client.configure_client(srv.url)
+    try:
+        with isolated_state():
+            single = _batch(srv, n, 1, "single")
+            batched = _batch(srv, n, batch, "batched")
+    finally:
+        srv.stop()
+    return {"goals": n, "batch": batch, "single": single, "batched": batched,
+            "speedup": single["wall_s"] / batched["wall_s"]}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-n", type=int, default=16)
+    ap.add_argument("--latency", type=float, default=0.1)
+    ap.add_argument("--eval-ms-per-token", type=float, default=0.5)
+    ap.add_argument("--batch", type=int, default=4)
+    a = ap.parse_args()
+    print(json.dumps(run(a.n, a.latency, a.eval_ms_per_token, a.batch), indent=2))
+
+if __name__ == "__main__":
+    main()
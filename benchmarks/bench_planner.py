@@ -0,0 +1,61 @@
+"""
+Planner round-trip: full completion + find("{") + json.loads vs JSON-mode streaming with early stop.
+
+    python -m benchmarks.bench_planner [-n 30] [--latency 0.05] [--tokens-per-sec 200] [--trailing 300]
+
+The fake model answers with a plan followed by `trailing` chars of prose,
+as chatty models do. "invalid" counts plans that came back unusable
+(the goal would become a no-op plan).
+"""
+from __future__ import annotations
+import argparse, json, statistics, time
+from jarvis_hybrid import ollama_client
+from jarvis_hybrid.ollama_client import model_generate
+from jarvis_hybrid.planner import PROMPT_TEMPLATE, try_plan
+from .fake_ollama import FakeOllama
+
+PLAN = {"intent": "python", "target": None, "python_code": "import os\nprint(os.getcwd())"}
+
+def _legacy_plan(goal: str, model: str):
+    # the pre-JSON-mode implementation
+    out = model_generate(model, PROMPT_TEMPLATE.replace("{goal}", goal))
+    try:
+        pl = json.loads(out[out.index("{"):])
+    except Exception:
+        return None
+    return pl if isinstance(pl, dict) else None
+
+def _round(fn, n: int, tag: str) -> dict:
+    lat, bad = [], 0
+    for i in range(n):
+        t0 = time.perf_counter()
+        pl = fn(f"planner bench goal {tag} {i}", "bench")
+        lat.append((time.perf_counter() - t0) * 1e3)
+        if pl is None: bad += 1
+    lat.sort()
+    return {"p50_ms": statistics.median(lat), "p95_ms": lat[int(0.95 * (len(lat) - 1))],
+            "mean_ms": statistics.fmean(lat), "invalid": bad}
+
+def run(n: int = 30, latency: float = 0.05, tokens_per_sec: float = 200.0, trailing: int = 300) -> dict:
+    reply = json.dumps(PLAN) + "\n\nThis plan prints the current directory. " + "Let me know if you need more. " * (trailing // 31)
+    srv = FakeOllama(latency=latency, tokens_per_sec=tokens_per_sec, response=reply).start()
+    ollama_client.configure_client(srv.url)
+    try:
+        _round(try_plan, 2, "warm")   # warm the connection pool
+        return {"plans": n, "llm_latency_s": latency, "tokens_per_sec": tokens_per_sec,
+                "reply_chars": len(reply), "legacy": _round(_legacy_plan, n, "legacy"),
+                "json_stream": _round(try_plan, n, "json")}
+    finally:
+        srv.stop()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-n", type=int, default=30)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--tokens-per-sec", type=float, default=200.0)
+    ap.add_argument("--trailing", type=int, default=300)
+    a = ap.parse_args()
+    print(json.dumps(run(a.n, a.latency, a.tokens_per_sec, a.trailing), indent=2))
+
+if __name__ == "__main__":
+    main()
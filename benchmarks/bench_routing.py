@@ -0,0 +1,61 @@
+"""
+Two-tier planner routing: single code model vs classifier first, and the router backing off a slow classifier.
+
+    python -m benchmarks.bench_routing [-n 40] [--code-s 0.4] [--classifier-s 0.05] [--code-share 0.3]
+
+code-share of the goals need code; the rest are "open <site>" goals the
+classifier can answer alone.
+"""
+from __future__ import annotations
+import argparse, json, time
+from jarvis_hybrid import ollama_client
+from jarvis_hybrid.config import Config
+from jarvis_hybrid.model_router import router
+from jarvis_hybrid.planner import route_plan
+from .fake_ollama import FakeOllama
+
+def _answer(prompt: str) -> str:
+    goal = prompt.split("Goal: ", 1)[1].split("\n", 1)[0]
+    if prompt.startswith("Classify the user goal"):
+        if goal.startswith("open "):
+            return json.dumps({"intent": "open_url", "target": goal.split()[1]})
+        return json.dumps({"intent": "python", "target": None})
+    return json.dumps({"intent": "python", "target": None, "python_code": "print('ok')"})
+
+def _goals(n: int, code_share: float) -> list:
+    step = max(1, round(1 / code_share)) if code_share > 0 else n + 1
+    return [f"compute report {i}" if i % step == 0 else f"open site{i}.example.com" for i in range(n)]
+
+def _run(goals: list, cfg: Config) -> dict:
+    router.reset()
+    t0 = time.perf_counter()
+    for g in goals: route_plan(g, cfg)
+    wall = time.perf_counter() - t0
+    st = router.stats()
+    return {"wall_s": wall, "ms_per_goal": wall / len(goals) * 1e3,
+            "calls": {k: v["calls"] for k, v in st["tiers"].items()}, "escalations": st["escalations"]}
+
+def run(n: int = 40, code_s: float = 0.4, classifier_s: float = 0.05, code_share: float = 0.3) -> dict:
+    srv = FakeOllama(response=_answer, model_latency={"big": code_s, "small": classifier_s, "slow-small": code_s}).start()
+    ollama_client.configure_client(srv.url)
+    goals = _goals(n, code_share)
+    base = dict(model="big", allow_web_open=True)
+    try:
+        return {"goals": n, "code_share": code_share,
+                "single_tier": _run(goals, Config(**base)),
+                "two_tier": _run(goals, Config(classifier_model="small", **base)),
+                "slow_classifier": _run(goals, Config(classifier_model="slow-small", **base))}
+    finally:
+        srv.stop(); router.reset()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-n", type=int, default=40)
+    ap.add_argument("--code-s", type=float, default=0.4)
+    ap.add_argument("--classifier-s", type=float, default=0.05)
+    ap.add_argument("--code-share", type=float, default=0.3)
+    a = ap.parse_args()
+    print(json.dumps(run(a.n, a.code_s, a.classifier_s, a.code_share), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Tracing overhead: cost of a span with tracing off vs on, per call.
+
+    python -m benchmarks.bench_tracing [-n 200000]
+"""
+from __future__ import annotations
+import argparse, json, time
+from jarvis_hybrid import tracing
+from jarvis_hybrid.actions import match_action, run_action
+from jarvis_hybrid.config import get_config
+
+def _ns(fn, n: int) -> float:
+    t0 = time.perf_counter_ns()
+    for _ in range(n): fn()
+    return (time.perf_counter_ns() - t0) / n
+
+def _empty_span():
+    with tracing.span("bench"):
+        pass
+
+def run(n: int = 200_000) -> dict:
+    goal = "summarize the quarterly numbers in my spreadsheet"
+    bare = _ns(lambda: match_action(goal, get_config()), n)   # run_action without its span
+    was = tracing.ENABLED
+    try:
+        tracing.configure(False)
+        off_span = _ns(_empty_span, n); off_action = _ns(lambda: run_action(goal), n)
+        tracing.configure(True)
+        on_span = _ns(_empty_span, n); on_action = _ns(lambda: run_action(goal), n)
+    finally:
+        tracing.configure(was); tracing.reset()
+    return {"calls": n, "span_off_ns": off_span, "span_on_ns": on_span,
+            "match_action_ns": bare, "run_action_tracing_off_ns": off_action,
+            "run_action_tracing_on_ns": on_action,
+            "overhead_off_pct": (off_action - bare) / bare * 100}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("-n", type=int, default=200_000)
+    a = ap.parse_args()
+    print(json.dumps(run(a.n), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Semantic top-k over the memory-mapped vector store vs a per-row Python scan.
+
+    python -m benchmarks.bench_vector_search [--rows 100000] [--dims 256,768] [--queries 50]
+
+dim_256 is what the store holds by default (embed_dims); dim_768 is the
+untruncated nomic-embed-text width, for comparison.
+"""
+from __future__ import annotations
+import argparse, json, math, statistics, tempfile, time
+from pathlib import Path
+import numpy as np
+from jarvis_hybrid.vector_memory import HashEmbedder, VectorStore
+
+def _python_topk(vecs: np.ndarray, q: np.ndarray, k: int):
+    # row-at-a-time cosine, the obvious implementation without a matrix
+    qn = math.sqrt(sum(x * x for x in q))
+    scored = []
+    for i, row in enumerate(vecs.tolist()):
+        dot = sum(a * b for a, b in zip(row, q))
+        scored.append((dot / ((math.sqrt(sum(a * a for a in row)) * qn) or 1.0), i))
+    scored.sort(reverse=True)
+    return scored[:k]
+
+def _lat(fn, n: int) -> dict:
+    xs = []
+    for i in range(n):
+        t0 = time.perf_counter(); fn(i); xs.append((time.perf_counter() - t0) * 1e3)
+    xs.sort()
+    return {"p50_ms": statistics.median(xs), "p95_ms": xs[int(0.95 * (len(xs) - 1))]}
+
+def run_dim(rows: int, dim: int, queries: int, k: int = 10, seed: int = 7) -> dict:
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((rows, dim), dtype=np.float32)
+    qs = rng.standard_normal((queries, dim), dtype=np.float32)
+    with tempfile.TemporaryDirectory(prefix="jarvis_vec_") as td:
+        st = VectorStore(Path(td) / "vectors", embedder=HashEmbedder(dim))
+        t0 = time.perf_counter()
+        for s in range(0, rows, 10_000):
+            st.add_vectors(range(s, min(rows, s + 10_000)), data[s:s + 10_000])
+        load = time.perf_counter() - t0
+        sub = data[:2_000]   # the scan is far too slow for the full set; scaled below
+        scan = _lat(lambda i: _python_topk(sub, qs[i].tolist(), k), 3)
+        scan = {m: v * rows / len(sub) for m, v in scan.items()}
+        one = _lat(lambda i: st.search_vectors(qs[i], k), queries)
+        t0 = time.perf_counter(); st.search_vectors(qs, k); batch = time.perf_counter() - t0
+        st.reset()
+    return {"rows": rows, "dim": dim, "insert_s": load, "python_scan_est": scan, "numpy_topk": one,
+            "batched_ms_per_query": batch * 1e3 / queries,
+            "speedup_p50": scan["p50_ms"] / one["p50_ms"] if one["p50_ms"] else None}
+
+def run(rows: int = 100_000, dims=(256, 768), queries: int = 50) -> dict:
+    return {f"dim_{d}": run_dim(rows, d, queries) for d in dims}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--dims", default="256,768")
+    ap.add_argument("--queries", type=int, default=50)
+    a = ap.parse_args()
+    print(json.dumps(run(a.rows, [int(d) for d in a.dims.split(",")], a.queries), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Shared helpers for benchmarks: keep runs out of the real memory.db, extensions,
+config.json and logs/.
+"""
+from __future__ import annotations
+import contextlib, tempfile
+from pathlib import Path
+from typing import Iterator
+
+@contextlib.contextmanager
+def isolated_state() -> Iterator[Path]:
+    """Point memory, extension storage, config.json and logs at a throwaway directory."""
+    from jarvis_hybrid import config, logger, memory, extension_manager as XM
+    logger.set_console_echo(False)
+    memory.flush()
+    saved = (memory.DB_PATH, XM.EXT_DIR, XM.INDEX_PATH, XM.PENDING_PATH, config.CONFIG_PATH)
+    with tempfile.TemporaryDirectory(prefix="jarvis_bench_") as td:
+        root = Path(td)
+        old_logs = logger.set_log_dir(root / "logs")
+        config.CONFIG_PATH = root / "config.json"; config._snapshot = None
+        memory.DB_PATH = root / "memory.db"
+        memory.init_db()
+        XM.EXT_DIR = root / "extensions"; XM.EXT_DIR.mkdir()
+        XM.INDEX_PATH = XM.EXT_DIR / "extension_index.json"
+        XM.PENDING_PATH = XM.EXT_DIR / "pending_extensions.json"
+        try:
+            yield root
+        finally:
+            memory.flush()
+            memory.DB_PATH, XM.EXT_DIR, XM.INDEX_PATH, XM.PENDING_PATH, config.CONFIG_PATH = saved
+            config._snapshot = None
+            logger.set_log_dir(old_logs)
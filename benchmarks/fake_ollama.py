@@ -0,0 +1,142 @@
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks.
+
+    srv = FakeOllama(latency=0.0, tokens_per_sec=0).start()
+    ... point jarvis_hybrid.ollama_client.configure_client(srv.url) at it ...
+    srv.stop()
+
+/api/generate answers with a fixed response (stream or not), or with
+`response(prompt)` when response is a callable. `latency` (or
+`model_latency[model]`) is added before the first token; `tokens_per_sec` (0 = unlimited) paces the
+streamed chunks (and delays non-streamed replies by the same total). The final chunk carries a `context` (previous context +
+this exchange, one int per ~4 chars) and `prompt_eval_count` (new prompt
+tokens only); `prompt_eval_per_token` seconds are charged for those.
+
+/api/embed and /api/embeddings return deterministic `embed_dim`-wide
+vectors derived from each text's hash.
+"""
+from __future__ import annotations
+import hashlib, json, random, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def fake_vector(text: str, dim: int) -> list:
+    rnd = random.Random(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest())
+    return [rnd.uniform(-1.0, 1.0) for _ in range(dim)]
+
+DEFAULT_RESPONSE = '{"intent": "python", "target": null, "python_code": "print(\'ok\')"}'
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+    disable_nagle_algorithm = True  # like Ollama's Go server; avoids 40 ms delayed-ACK stalls
+
+    def log_message(self, *a):  # silence per-request stderr lines
+        pass
+
+    def _json(self, obj: dict):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, obj: dict):
+        data = (json.dumps(obj) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        srv: FakeOllama = self.server.fake
+        n = int(self.headers.get("Content-Length") or 0)
+        req = json.loads(self.rfile.read(n) or b"{}")
+        srv.requests += 1
+        if self.path == "/api/embed":
+            texts = req.get("input") or []
+            if isinstance(texts, str): texts = [texts]
+            self._json({"model": req.get("model"), "embeddings": [fake_vector(t, srv.embed_dim) for t in texts]})
+            return
+        if self.path == "/api/embeddings":
+            self._json({"embedding": fake_vector(req.get("prompt", ""), srv.embed_dim)})
+            return
+        if self.path != "/api/generate":
+            self.send_error(404); return
+        text = srv.response(req.get("prompt", "")) if callable(srv.response) else srv.response
+        srv.prompt_chars += len(req.get("prompt", ""))
+        n_prompt = len(req.get("prompt", "")) // 4 + 1
+        ctx = list(req.get("context") or [])
+        final = {"model": req.get("model"), "response": "", "done": True, "prompt_eval_count": n_prompt,
+                 "eval_count": len(text) // 4 + 1,
+                 "context": ctx + list(range(len(ctx), len(ctx) + n_prompt + len(text) // 4 + 1))}
+        delay = srv.model_latency.get(req.get("model"), srv.latency) + n_prompt * srv.prompt_eval_per_token
+        if delay: time.sleep(delay)
+        if not req.get("stream", True):
+            if srv.tokens_per_sec: time.sleep(len(text) / 4 / srv.tokens_per_sec)   # generation time
+            self._json(dict(final, response=text))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        step = 4  # ~one token per 4 chars
+        delay = 1.0 / srv.tokens_per_sec if srv.tokens_per_sec else 0.0
+        try:
+            for i in range(0, len(text), step):
+                if delay: time.sleep(delay)
+                self._chunk({"model": req.get("model"), "response": text[i:i+step], "done": False})
+            self._chunk(final)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # client stopped reading (cancelled)
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 128   # many clients connect at once (the default 5 costs a 1 s SYN retry)
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):   # clients dropping sockets is normal here
+            super().handle_error(request, client_address)
+
+class FakeOllama:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 tokens_per_sec: float = 0.0, response=DEFAULT_RESPONSE,
+                 prompt_eval_per_token: float = 0.0, embed_dim: int = 256, model_latency=None):
+        self.latency = latency
+        self.model_latency = dict(model_latency or {})
+        self.embed_dim = embed_dim
+        self.prompt_eval_per_token = prompt_eval_per_token
+        self.tokens_per_sec = tokens_per_sec
+        self.response = response
+        self.requests = 0
+        self.prompt_chars = 0
+        self._srv = _Server((host, port), _Handler)
+        self._srv.daemon_threads = True
+        self._srv.fake = self
+        self._thread = threading.Thread(target=self._srv.serve_forever, args=(0.05,), daemon=True)   # quick stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._srv.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._srv.shutdown()
+        self._srv.server_close()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Run a fake Ollama server.")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--tokens-per-sec", type=float, default=0.0)
+    ap.add_argument("--response", default=DEFAULT_RESPONSE, help="text every /api/generate returns")
+    a = ap.parse_args()
+    s = FakeOllama(port=a.port, latency=a.latency, tokens_per_sec=a.tokens_per_sec, response=a.response).start()
+    print(f"Fake Ollama on {s.url} (Ctrl+C to stop)")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        s.stop()
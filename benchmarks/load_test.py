@@ -0,0 +1,136 @@
+"""
+Daemon load test: requests/sec and latency per endpoint under concurrent clients.
+
+    python -m benchmarks.load_test [--clients 16] [--seconds 5] [--mix health,search,extensions,chat,goal]
+                                   [--url http://127.0.0.1:8765] [--token T] [--latency 0.05]
+
+Without --url an in-process server (isolated memory.db seeded with goals,
+fake Ollama answering after --latency seconds) is started on a free port.
+Each client thread keeps one keep-alive connection and cycles through the
+mix: "chat" streams a reply (NDJSON), "goal" runs one planned goal whose
+code prints "ok". 503 answers (request queue full) are counted as "busy",
+anything else that is not 200 as "errors".
+"""
+from __future__ import annotations
+import argparse, asyncio, http.client, json, statistics, threading, time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from jarvis_hybrid import memory, ollama_client
+from jarvis_hybrid.config import load_config
+from jarvis_hybrid.server import JarvisServer
+from .common import isolated_state
+from .fake_ollama import FakeOllama
+
+PLAN = json.dumps({"intent": "python", "target": None, "python_code": "print('ok')"})
+REQUESTS: Dict[str, Callable[[int, int], Tuple[str, str, Optional[dict]]]] = {
+    "health":     lambda c, n: ("GET", "/health", None),
+    "search":     lambda c, n: ("GET", f"/memory/search?q=report+{n % 50}&k=5", None),
+    "extensions": lambda c, n: ("GET", "/extensions", None),
+    "chat":       lambda c, n: ("POST", "/chat", {"message": f"client {c} question {n}", "stream": True}),
+    "goal":       lambda c, n: ("POST", "/goals", {"goals": [f"load test goal {c}-{n}"]}),
+}
+
+def _client(base: str, token: str, mix: List[str], deadline: float, c: int, out: list):
+    u = urlsplit(base)
+    headers = {"Content-Type": "application/json"}
+    if token: headers["Authorization"] = f"Bearer {token}"
+    conn = http.client.HTTPConnection(u.hostname, u.port, timeout=120)
+    n = c
+    while time.perf_counter() < deadline:
+        kind = mix[n % len(mix)]
+        method, path, body = REQUESTS[kind](c, n)
+        n += 1
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+            resp = conn.getresponse(); resp.read()
+            status = resp.status
+        except (OSError, http.client.HTTPException):
+            status = 0
+            conn.close(); conn = http.client.HTTPConnection(u.hostname, u.port, timeout=120)
+        out.append((kind, status, time.perf_counter() - t0))
+    conn.close()
+
+def _load(base: str, token: str, clients: int, seconds: float, mix: List[str]) -> dict:
+    out: List[Tuple[str, int, float]] = []
+    deadline = time.perf_counter() + seconds
+    ts = [threading.Thread(target=_client, args=(base, token, mix, deadline, c, out)) for c in range(clients)]
+    t0 = time.perf_counter()
+    for t in ts: t.start()
+    for t in ts: t.join()
+    wall = time.perf_counter() - t0
+    per = {}
+    for kind in mix:
+        lat = sorted(d * 1e3 for k, s, d in out if k == kind and s == 200)
+        if lat:
+            per[kind] = {"ok": len(lat), "p50_ms": statistics.median(lat), "p95_ms": lat[int(0.95 * (len(lat) - 1))]}
+    ok = sum(s == 200 for _, s, _ in out)
+    return {"clients": clients, "seconds": wall, "requests": len(out), "ok": ok, "req_per_s": ok / wall,
+            "busy": sum(s == 503 for _, s, _ in out), "errors": sum(s not in (200, 503) for _, s, _ in out),
+            "endpoints": per}
+
+def _start(cfg) -> Tuple[JarvisServer, Callable[[], None]]:
+    server, ready, loop = JarvisServer(cfg), threading.Event(), asyncio.new_event_loop()
+    task: list = []
+    def run():
+        asyncio.set_event_loop(loop)
+        task.append(loop.create_task(server.serve("127.0.0.1", 0, ready=ready)))
+        try:
+            loop.run_until_complete(task[0])
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+    th = threading.Thread(target=run, name="load-test-server", daemon=True)
+    th.start()
+    if not ready.wait(60):
+        raise RuntimeError("server did not start")
+    def stop():
+        loop.call_soon_threadsafe(task[0].cancel)
+        th.join(30)
+    return server, stop
+
+def run(clients: int = 16, seconds: float = 5.0, mix: str = "health,search,extensions,chat,goal",
+        url: str = "", token: str = "", latency: float = 0.05, workers: int = 16, queue: int = 64) -> dict:
+    kinds = [k.strip() for k in mix.split(",") if k.strip()]
+    unknown = set(kinds) - set(REQUESTS)
+    if unknown:
+        raise ValueError(f"unknown request kinds: {sorted(unknown)}")
+    if url:
+        return {"url": url, **_load(url, token, clients, seconds, kinds)}
+    srv = FakeOllama(latency=latency, tokens_per_sec=500, response=PLAN).start()
+    try:
+        with isolated_state():
+            ollama_client.configure_client(srv.url, pool_size=max(4, clients))
+            cfg = load_config()
+            cfg.server_workers, cfg.server_queue, cfg.server_token = workers, queue, ""
+            cfg.chat_use_context = False
+            for i in range(500):
+                memory.add_goal(f"write the weekly report {i % 50} for project {i}")
+            memory.flush()
+            server, stop = _start(cfg)
+            try:
+                host, port = server.address[:2]
+                res = _load(f"http://{host}:{port}", server.token, clients, seconds, kinds)
+            finally:
+                stop()
+        return {"llm_latency_s": latency, "server_workers": workers, "server_queue": queue,
+                "handled": server.handled, "rejected": server.rejected, **res}
+    finally:
+        srv.stop()
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--mix", default="health,search,extensions,chat,goal")
+    ap.add_argument("--url", default="", help="load an already running daemon instead")
+    ap.add_argument("--token", default="")
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--workers", type=int, default=16)
+    ap.add_argument("--queue", type=int, default=64)
+    a = ap.parse_args()
+    print(json.dumps(run(a.clients, a.seconds, a.mix, a.url, a.token, a.latency, a.workers, a.queue), indent=2))
+
+if __name__ == "__main__":
+    main()
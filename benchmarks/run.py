@@ -0,0 +1,105 @@
+"""
+Run benchmark scenarios and save the results as one JSON file.
+
+    python -m benchmarks.run [--full] [--only agent scan ...] [--out FILE] [--compare OLD.json]
+
+Default sizes finish in about a minute; --full uses the large ones
+(200k-file scan, 100k-row memory search, ...). Results go to
+benchmarks/results/<timestamp>.json with the git revision, Python version
+and platform, so runs can be compared over time. --compare prints the
+relative change of every number shared with an earlier result file.
+"""
+from __future__ import annotations
+import argparse, importlib, json, os, platform, subprocess, sys, time, traceback
+from pathlib import Path
+from .common import isolated_state
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# name -> (module, quick kwargs, full kwargs)
+SCENARIOS = {
+    "agent":         ("bench_agent",         {"n": 20, "latency": 0.05},      {"n": 100, "latency": 0.2}),
+    "planner":       ("bench_planner",       {"n": 30},                       {"n": 200}),
+    "pipeline":      ("bench_pipeline",      {"n": 6, "plan_s": 0.2, "exec_s": 0.2}, {"n": 20}),
+    "plan_batch":    ("bench_plan_batch",    {"n": 12},                       {"n": 48}),
+    "routing":       ("bench_routing",       {"n": 20, "code_s": 0.2},        {"n": 60}),
+    "intent":        ("bench_intent",        {"extensions": 300, "goals": 500}, {"extensions": 2000, "goals": 2000}),
+    "async":         ("bench_async",         {"chats": 30, "goals": 30},      {"chats": 200, "goals": 200}),
+    "load_test":     ("load_test",           {"clients": 8, "seconds": 3},    {"clients": 64, "seconds": 10}),
+    "http_pool":     ("bench_http_pool",     {"n": 300},                      {"n": 2000, "threads": 4}),
+    "ext_match":     ("bench_ext_match",     {"triggers": 2000, "goals": 500}, {"triggers": 10000, "goals": 2000}),
+    "memory_insert": ("bench_memory_insert", {"n": 2000},                     {"n": 20000, "threads": 4}),
+    "memory_search": ("bench_memory_search", {"rows": 20000, "queries": 20},  {"rows": 100_000, "queries": 50}),
+    "vector_search": ("bench_vector_search", {"rows": 20000, "dims": (256,)}, {"rows": 100_000, "dims": (256, 768)}),
+    "scan":          ("bench_scan",          {"files": 20000},                {"files": 200_000}),
+    "chat":          ("bench_chat",          {"turns": 10},                   {"turns": 30}),
+    "logger":        ("bench_logger",        {"n": 50000},                    {"n": 500_000, "threads": 4}),
+    "tracing":       ("bench_tracing",       {"n": 50000},                    {"n": 200_000}),
+    "code_exec":     ("bench_code_exec",     {"n": 10},                       {"n": 50}),
+}
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=RESULTS_DIR.parent, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def run_all(names, full: bool = False) -> dict:
+    out = {"meta": {"started": time.strftime("%Y-%m-%d %H:%M:%S"), "git": _git_rev(),
+                    "python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count(), "preset": "full" if full else "quick"},
+           "results": {}}
+    for name in names:
+        mod, quick, big = SCENARIOS[name]
+        print(f"[{name}] ...", file=sys.stderr, flush=True)
+        t0 = time.perf_counter()
+        try:
+            with isolated_state():   # nothing lands in the checkout, even for scenarios without their own
+                res = importlib.import_module(f"{__package__}.{mod}").run(**(big if full else quick))
+        except Exception as e:   # one broken scenario (e.g. missing numpy) shouldn't lose the rest
+            res = {"error": f"{type(e).__name__}: {e}", "trace": traceback.format_exc(limit=3)}
+        res["scenario_s"] = time.perf_counter() - t0
+        out["results"][name] = res
+    return out
+
+def _numbers(obj, prefix: str = ""):
+    if isinstance(obj, dict):
+        for k, v in obj.items(): yield from _numbers(v, f"{prefix}.{k}" if prefix else k)
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj): yield from _numbers(v, f"{prefix}[{i}]")
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        yield prefix, float(obj)
+
+def compare(old: dict, new: dict) -> list:
+    """(metric, old, new, % change) for every number present in both results."""
+    before = dict(_numbers(old.get("results", {})))
+    rows = []
+    for key, v in _numbers(new.get("results", {})):
+        if key in before and not key.endswith("scenario_s"):
+            b = before[key]
+            rows.append((key, b, v, (v - b) / b * 100 if b else 0.0))
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--full", action="store_true", help="large sizes (slow)")
+    ap.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), metavar="NAME")
+    ap.add_argument("--out", help="result file (default benchmarks/results/<timestamp>.json)")
+    ap.add_argument("--compare", help="earlier result file to diff against")
+    a = ap.parse_args()
+    res = run_all(a.only or list(SCENARIOS), a.full)
+    out = Path(a.out) if a.out else RESULTS_DIR / f"{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(res, indent=2, default=str), encoding="utf-8")
+    print(f"Wrote {out}")
+    for name, r in res["results"].items():
+        print(f"  {name:<14} {'ERROR ' + r['error'] if 'error' in r else 'ok'} ({r['scenario_s']:.1f}s)")
+    if a.compare:
+        old = json.loads(Path(a.compare).read_text(encoding="utf-8"))
+        print(f"\nvs {a.compare} ({old.get('meta', {}).get('git', '?')}):")
+        for key, b, v, pct in compare(old, res):
+            print(f"  {key:<60}{b:>14.4g}{v:>14.4g}{pct:>+9.1f}%")
+
+if __name__ == "__main__":
+    main()
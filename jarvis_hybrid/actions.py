@@ -1,72 +1,226 @@
 """
 Known actions for fast execution.
+
+Actions are registered with @action(name, pattern..., gate=...). Patterns
+are case-insensitive regexes (use \\b for word boundaries); all enabled
+patterns are compiled into one alternation so a goal is scanned once.
+When several actions match, the one registered first wins. `gate` names a
+Config flag that must be true for the action to run.
 """
 from __future__ import annotations
-import os, webbrowser, subprocess, psutil
+import os, re, webbrowser, subprocess, psutil
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from .logger import log
-from .config import load_config
+from .config import Config, get_config, resolved_roots
+from .tracing import span
+
+ActionFn = Callable[[str, "re.Match[str]", Config], str]
+
+@dataclass
+class Action:
+    name: str
+    regex: "re.Pattern[str]"
+    fn: ActionFn
+    gate: Optional[str] = None
+
+_REGISTRY: List[Action] = []
+_combined: Dict[tuple, "re.Pattern[str]"] = {}
+
+def register_action(name: str, patterns: List[str], fn: ActionFn, gate: Optional[str] = None):
+    src = "|".join(f"(?:{p})" for p in patterns)
+    _REGISTRY.append(Action(name, re.compile(src, re.IGNORECASE), fn, gate))
+    _combined.clear()
+
+def action(name: str, *patterns: str, gate: Optional[str] = None):
+    def deco(fn: ActionFn) -> ActionFn:
+        register_action(name, list(patterns), fn, gate)
+        return fn
+    return deco
+
+def _dispatch_regex(cfg: Config) -> Tuple["re.Pattern[str]", List[Action]]:
+    enabled = tuple(i for i, a in enumerate(_REGISTRY) if not a.gate or getattr(cfg, a.gate, False))
+    rx = _combined.get(enabled)
+    if rx is None:
+        # group names carry the registry index; inner groups are stripped by re-matching later.
+        # Lookaheads match empty, so finditer tries every start and overlapping matches aren't skipped.
+        src = "|".join(f"(?=(?P<a{i}>{_REGISTRY[i].regex.pattern}))" for i in enabled) or "(?!)"
+        rx = _combined[enabled] = re.compile(_strip_names(src), re.IGNORECASE)
+    return rx, _REGISTRY
+
+def _strip_names(src: str) -> str:
+    # keep only our a<N> group names so patterns may reuse names like (?P<path>...)
+    return re.sub(r"\(\?P<(?!a\d+>)\w+>", "(?:", src)
+
+def match_action(goal: str, cfg: Optional[Config] = None) -> Optional[Tuple[Action, "re.Match[str]"]]:
+    """The highest-priority enabled action matching goal (without running it)."""
+    cfg = cfg or get_config()
+    rx, reg = _dispatch_regex(cfg)
+    best = None
+    for m in rx.finditer(goal):
+        i = int(m.lastgroup[1:])
+        if best is None or i < best: best = i
+    if best is None:
+        return None
+    act = reg[best]
+    return act, act.regex.search(goal)
+
+def run_action(goal: str) -> str:
+    cfg = get_config()
+    with span("action.match"):
+        hit = match_action(goal, cfg)
+    if hit is None:
+        return ""  # unknown -> let planner/LLM handle
+    act, m = hit
+    with span("action.run", action=act.name):
+        return act.fn(goal, m, cfg)
+
+def action_examples() -> Dict[str, List[str]]:
+    """Plain phrases from each action's patterns, for actions that need no captured groups."""
+    out: Dict[str, List[str]] = {}
+    for a in _REGISTRY:
+        if a.regex.groupindex: continue   # e.g. read_file needs (?P<path>...)
+        phrases = [re.sub(r"\\b|\(\?:|[()?*^$\\]", "", p).strip() for p in a.regex.pattern.split("|")]
+        out[a.name] = [p for p in phrases if p] + [a.name.replace("_", " ")]
+    return out
+
+def get_action(name: str) -> Optional[Action]:
+    return next((a for a in _REGISTRY if a.name == name), None)
+
+def run_named_action(name: str, goal: str, cfg: Optional[Config] = None) -> str:
+    """Run an action picked by name rather than by its patterns ("" if gated off or unknown)."""
+    cfg = cfg or get_config()
+    act = get_action(name)
+    if act is None or act.regex.groupindex or (act.gate and not getattr(cfg, act.gate, False)):
+        return ""
+    with span("action.run", action=name):
+        return act.fn(goal, None, cfg)
 
 def _in_allowed(path: Path, allowed) -> bool:
     pl = str(path.resolve()).lower()
     for ar in allowed:
-        if pl.startswith(str(Path(ar).resolve()).lower()):
+        if pl.startswith(ar):
             return True
     return False
 
-def run_action(goal: str) -> str:
-    cfg = load_config()
-    g = goal.lower()
-
-    # open websites
-    if cfg.allow_web_open and ("youtube" in g or "open youtube" in g):
-        webbrowser.open("https://www.youtube.com"); return "Opened YouTube."
-    if cfg.allow_web_open and ("google" in g or "open google" in g or "search google" in g):
-        webbrowser.open("https://www.google.com"); return "Opened Google."
-
-    # open system apps
-    if cfg.allow_system_actions and "notepad" in g:
-        subprocess.Popen(["notepad.exe"]); return "Opened Notepad."
-    if cfg.allow_system_actions and ("calc" in g or "calculator" in g):
-        subprocess.Popen(["calc.exe"]); return "Opened Calculator."
-    if cfg.allow_system_actions and ("cmd" in g or "command prompt" in g):
-        subprocess.Popen(["cmd.exe"]); return "Opened Command Prompt."
-    if cfg.allow_system_actions and "powershell" in g:
-        subprocess.Popen(["powershell.exe"]); return "Opened PowerShell."
-    if cfg.allow_system_actions and "vs code" in g or "vscode" in g or "code " in g:
-        subprocess.Popen(["code"]); return "Tried to open VS Code (requires code in PATH)."
-
-    # create note file
-    if "create note" in g:
-        fname = "note.txt"
-        with open(fname,"a",encoding="utf-8") as fh: fh.write("New note.\n")
-        os.startfile(fname)
-        return f"Created and opened {fname}."
-
-    # read file if allowed
-    if g.startswith("read file "):
-        p = Path(goal.split(" ",2)[2].strip().strip('"').strip("'"))
-        if not p.exists(): return f"File not found: {p}"
-        if not _in_allowed(p, cfg.allowed_roots): return f"Blocked (not in allowed roots): {p}"
-        try:
-            txt = p.read_text(encoding="utf-8",errors="ignore")
-            return f"--- Begin {p.name} ---\n{txt[:2000]}\n--- End ---"
-        except Exception as e:
-            return f"Read error: {e}"
+# ------------------ built-in actions (registration order = priority) ------------------
+# open websites
+@action("open_youtube", r"\byoutube\b", gate="allow_web_open")
+def _youtube(goal, m, cfg):
+    webbrowser.open("https://www.youtube.com"); return "Opened YouTube."
 
-    # system info
-    if "battery" in g:
-        try:
-            b = psutil.sensors_battery()
-            if b is None: return "No battery info."
-            return f"Battery: {b.percent}% | Plugged: {b.power_plugged}"
-        except Exception as e:
-            return f"Battery read error: {e}"
-    if "cpu usage" in g or "cpu" in g:
+@action("open_google", r"\bgoogle\b", gate="allow_web_open")
+def _google(goal, m, cfg):
+    webbrowser.open("https://www.google.com"); return "Opened Google."
+
+# open system apps
+@action("open_notepad", r"\bnotepad\b", gate="allow_system_actions")
+def _notepad(goal, m, cfg):
+    subprocess.Popen(["notepad.exe"]); return "Opened Notepad."
+
+@action("open_calculator", r"\bcalc(?:ulator)?\b", gate="allow_system_actions")
+def _calc(goal, m, cfg):
+    subprocess.Popen(["calc.exe"]); return "Opened Calculator."
+
+@action("open_cmd", r"\bcmd\b", r"\bcommand prompt\b", gate="allow_system_actions")
+def _cmd(goal, m, cfg):
+    subprocess.Popen(["cmd.exe"]); return "Opened Command Prompt."
+
+@action("open_powershell", r"\bpowershell\b", gate="allow_system_actions")
+def _powershell(goal, m, cfg):
+    subprocess.Popen(["powershell.exe"]); return "Opened PowerShell."
+
+@action("open_vscode", r"\bvs ?code\b", r"\bopen code\b", gate="allow_system_actions")
+def _vscode(goal, m, cfg):
+    subprocess.Popen(["code"]); return "Tried to open VS Code (requires code in PATH)."
+
+# create note file
+@action("create_note", r"\bcreate note\b")
+def _create_note(goal, m, cfg):
+    fname = "note.txt"
+    with open(fname,"a",encoding="utf-8") as fh: fh.write("New note.\n")
+    os.startfile(fname)
+    return f"Created and opened {fname}."
+
+# read file if allowed
+@action("read_file", r"^read file\s+(?P<path>.+)$")
+def _read_file(goal, m, cfg):
+    p = Path(m.group("path").strip().strip('"').strip("'"))
+    if not p.exists(): return f"File not found: {p}"
+    if not _in_allowed(p, resolved_roots()): return f"Blocked (not in allowed roots): {p}"
+    try:
+        txt = p.read_text(encoding="utf-8",errors="ignore")
+        return f"--- Begin {p.name} ---\n{txt[:2000]}\n--- End ---"
+    except Exception as e:
+        return f"Read error: {e}"
+
+# system info
+@action("battery_status", r"\bbattery\b")
+def _battery(goal, m, cfg):
+    try:
+        b = psutil.sensors_battery()
+        if b is None: return "No battery info."
+        return f"Battery: {b.percent}% | Plugged: {b.power_plugged}"
+    except Exception as e:
+        return f"Battery read error: {e}"
+
+@action("cpu_usage", r"\bcpu\b")
+def _cpu(goal, m, cfg):
+    try:
+        return f"CPU Usage: {psutil.cpu_percent(interval=1.0)}%"
+    except Exception as e:
+        return f"CPU read error: {e}"
+
+# ------------------ planner intents without code ------------------
+# A plan whose intent is one of these (with a usable target) can be carried
+# out directly, so the planner doesn't need the code model for it.
+def _intent_url(target: str) -> Optional[str]:
+    t = target.strip()
+    if re.match(r"^https?://\S+$", t, re.I): return t
+    if re.match(r"^[\w-]+(\.[\w-]+)+(/\S*)?$", t): return "https://" + t
+    return None
+
+def _intent_path(target: str) -> Path:
+    return Path(target.strip().strip('"').strip("'"))
+
+def intent_runnable(plan: dict, cfg: Optional[Config] = None) -> bool:
+    """run_intent(plan) would do something (right intent, usable target, gate open)."""
+    cfg = cfg or get_config()
+    intent, target = plan.get("intent"), plan.get("target") or ""
+    if intent == "open_url":
+        return cfg.allow_web_open and _intent_url(target) is not None
+    if intent == "open_app":
+        return cfg.allow_system_actions and bool(target.strip())
+    if intent in ("read_file", "create_file"):
+        return bool(target.strip()) and _in_allowed(_intent_path(target), resolved_roots())
+    return intent == "system_info"
+
+def run_intent(plan: dict, cfg: Optional[Config] = None) -> Tuple[str, bool]:
+    """Carry out a code-less plan: (message, ok); ("", False) if it isn't runnable."""
+    cfg = cfg or get_config()
+    if not intent_runnable(plan, cfg):
+        return "", False
+    intent, target = plan["intent"], (plan.get("target") or "").strip()
+    with span("action.intent", intent=intent):
         try:
-            return f"CPU Usage: {psutil.cpu_percent(interval=1.0)}%"
+            if intent == "open_url":
+                url = _intent_url(target); webbrowser.open(url); return f"Opened {url}.", True
+            if intent == "open_app":
+                if hasattr(os, "startfile"): os.startfile(target)
+                else: subprocess.Popen([target])
+                return f"Opened {target}.", True
+            if intent == "read_file":
+                p = _intent_path(target)
+                if not p.is_file(): return f"File not found: {p}", False
+                return f"--- Begin {p.name} ---\n{p.read_text(encoding='utf-8', errors='ignore')[:2000]}\n--- End ---", True
+            if intent == "create_file":
+                p = _intent_path(target)
+                if p.exists(): return f"Already exists: {p}", False
+                p.parent.mkdir(parents=True, exist_ok=True); p.touch()
+                return f"Created {p}.", True
+            vm = psutil.virtual_memory()
+            return (f"CPU: {psutil.cpu_percent(interval=0.5)}% | RAM: {vm.percent}% of "
+                    f"{vm.total / 2**30:.1f} GB | Disk: {psutil.disk_usage(os.path.abspath(os.sep)).percent}%"), True
         except Exception as e:
-            return f"CPU read error: {e}"
-
-    return ""  # unknown -> let planner/LLM handle
+            return f"{intent} error: {e}", False
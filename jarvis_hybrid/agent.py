@@ -1,78 +1,63 @@
 """
-Jarvis Hybrid Agent (Auto-Extend)
----------------------------------
-Flow:
- 1. Try known rule-based action (fast).
- 2. Check saved extensions (user-approved learned actions).
- 3. If no match -> LLM planner -> Python code -> run.
- 4. Queue generated code as pending extension for user review.
+Jarvis Hybrid Agent: the blocking front end of async_agent.AsyncAgent.
+
+Agent keeps AsyncAgent's goal list and runs its calls on one shared
+background event loop (run_sync), so every Agent shares the same asyncio
+Ollama pool. Ctrl+C during process_goals() cancels the batch (running code
+is killed, planner streams closed) and then re-raises KeyboardInterrupt.
+See async_agent for how goals are routed, planned and run.
 """
 from __future__ import annotations
-from typing import Callable, List
-from .logger import log
-from .config import load_config
-from . import memory
-from .actions import run_action
-from .planner import plan
-from .code_exec import run_python
-from . import extension_manager as XM
-
-LogFn = Callable[[str], None]
+import asyncio, threading
+from typing import List, Optional
+from .async_agent import AsyncAgent, LogFn
+from .config import Config
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agent-loop", daemon=True).start()
+    return _loop
+
+def run_sync(coro):
+    """Run coro on the shared agent event loop and wait; Ctrl+C cancels it, waits, and re-raises."""
+    loop = _background_loop()
+    done = threading.Event()
+    box = {}
+    def start():
+        t = box["task"] = loop.create_task(coro)
+        t.add_done_callback(lambda _: done.set())
+    loop.call_soon_threadsafe(start)
+    try:
+        while not done.wait(0.5): pass   # short waits keep Ctrl+C responsive on Windows
+    except KeyboardInterrupt:
+        loop.call_soon_threadsafe(lambda: box["task"].cancel())
+        while not done.wait(0.5): pass
+        raise
+    return box["task"].result()
 
 class Agent:
-    def __init__(self, cb: LogFn | None = None):
-        self.cb = cb or (lambda m: None)
-        self.cfg = load_config()
-        self.goals: List[str] = []
-
-    def _emit(self, msg: str, level="INFO"):
-        log(msg, level); self.cb(msg)
+    def __init__(self, cb: LogFn | None = None, on_token: LogFn | None = None):
+        self._core = AsyncAgent(cb, on_token)
 
-    def add_goal(self, g: str):
-        g = g.strip()
-        if not g: return
-        self.goals.append(g)
-        memory.add_goal(g)
-        self._emit(f"Added goal: {g}")
+    @property
+    def cfg(self) -> Config:
+        return self._core.cfg
 
-    def clear_goals(self):
-        self.goals.clear()
-        memory.clear_goals()
-        self._emit("Goals cleared.")
-
-    def _handle_goal(self, goal: str):
-        # 1. Known action
-        act_result = run_action(goal)
-        if act_result:
-            self._emit(f"Action result: {act_result}")
-            return
+    @property
+    def goals(self) -> List[str]:
+        return self._core.goals
 
-        # 2. Extension match
-        ext = XM.find_matching_extension(goal)
-        if ext:
-            self._emit(f"Using learned extension: {ext['name']}")
-            out = XM.run_extension(ext)
-            self._emit(out)
-            return
+    def add_goal(self, g: str, serial: bool = False):
+        self._core.add_goal(g, serial)
 
-        # 3. Plan via LLM
-        self._emit(f"Planning goal: {goal}")
-        pl = plan(goal, self.cfg.model)
-        self._emit(f"Planner intent: {pl.get('intent')} target={pl.get('target')}")
-        code = pl.get("python_code","") or ""
-        if code.strip():
-            self._emit("Running LLM-generated Python...")
-            out = run_python(code)
-            self._emit(out)
-            # 4. Queue for extension approval
-            XM.queue_pending(goal, code)
-            self._emit("Generated code queued for extension review.")
-        else:
-            self._emit("No code from planner; nothing to do.")
+    def clear_goals(self):
+        run_sync(self._core.clear_goals())
 
     def process_goals(self):
-        for g in list(self.goals):
-            self._emit(f"[DEBUG] Processing goal: {g}")
-            self._handle_goal(g)
-        self.goals.clear()
-        self._emit("All goals complete.")
+        run_sync(self._core.process_goals())
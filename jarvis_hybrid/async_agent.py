@@ -0,0 +1,368 @@
+"""
+AsyncAgent: the goal pipeline on asyncio (agent.Agent is its blocking front end).
+
+Flow:
+ 1. Try known rule-based action (fast).
+ 2. Check saved extensions (user-approved learned actions).
+    2b. Offline intent classifier: a paraphrase of a known action or
+        extension is routed to it without the LLM (intent_classifier).
+ 3. If no match -> LLM planner -> Python code -> run.
+ 4. Queue generated code as pending extension for user review.
+
+Output (log lines and the planner's tokens for on_token) is emitted in
+submission order: the oldest unfinished goal streams live, later goals are
+replayed when they reach the head. A goal added as "then <goal>" (or
+serial=True) waits for the goal before it to finish. While a goal's code
+runs, the plans for the next cfg.pipeline_depth goals are requested at
+background LLM priority (goals an action, extension or cached plan would
+resolve are skipped); with cfg.plan_batch_size > 1 they are planned that
+many per request (planner.aplan_batch). clear_goals() discards them.
+
+Every goal is a task, not a thread:
+
+- planner calls stream through async_ollama (no thread per request);
+- code and extensions run via code_exec.arun_python /
+  extension_manager.arun_extension and are killed on timeout or cancel;
+- blocking work (SQLite: memory, plan cache, extension registry, intent
+  classifier; built-in actions) goes to the loop's default executor
+  (asyncio.to_thread).
+
+cfg.goal_workers, llm_concurrency and exec_concurrency cap goals, planner
+calls and code runs in flight. Cancelling process_goals() cancels every
+goal of the batch: planner streams are closed, which stops generation, and
+running code is killed.
+"""
+from __future__ import annotations
+import asyncio, time
+from typing import Callable, Dict, List, Optional, Tuple
+from .logger import log
+from . import tracing
+from .config import Config, load_config
+from . import memory
+from .actions import match_action, run_action, run_intent, run_named_action
+from .planner import aplan_batch, aroute, fallback_plan
+from .ollama_client import PRIORITY_BACKGROUND, PRIORITY_PLANNER
+from . import plan_cache
+from .code_exec import arun_python
+from . import extension_manager as XM
+
+LogFn = Callable[[str], None]
+EmitFn = Callable[..., None]
+
+def _route_intent(goal: str, cfg):
+    """intent_classifier.route(), or None when disabled or numpy is missing."""
+    if not cfg.intent_classifier:
+        return None
+    try:
+        from . import intent_classifier
+    except ImportError:
+        return None
+    return intent_classifier.route(goal, cfg)
+
+def _failed(out: str) -> bool:
+    return out.startswith("Execution error:") or "Traceback (most recent call last)" in out
+
+class _OrderedLog:
+    """
+    Emit per-goal messages and planner tokens in submission order; the
+    oldest unfinished goal streams live, the others are replayed when they
+    reach the head.
+    """
+    def __init__(self, emit: EmitFn, n: int, on_token: LogFn | None = None):
+        self._emit = emit
+        self._on_token = on_token
+        self._buf: List[list] = [[] for _ in range(n)]   # [msg, level]; level None: tokens
+        self._done = [False] * n
+        self._head = 0
+
+    def write(self, i: int, msg: str, level="INFO"):
+        if i == self._head: self._emit(msg, level)
+        else: self._buf[i].append([msg, level])
+
+    def tokens(self, i: int) -> LogFn | None:
+        """on_token for goal i, or None when nobody listens."""
+        if self._on_token is None:
+            return None
+        def tok(t: str):
+            if i == self._head: self._on_token(t)
+            elif self._buf[i] and self._buf[i][-1][1] is None: self._buf[i][-1][0] += t
+            else: self._buf[i].append([t, None])
+        return tok
+
+    def finish(self, i: int):
+        self._done[i] = True
+        while self._head < len(self._done) and self._done[self._head]:
+            self._head += 1
+            if self._head < len(self._buf):
+                for m, l in self._buf[self._head]:
+                    if l is None: self._on_token(m)
+                    else: self._emit(m, l)
+                self._buf[self._head].clear()
+
+class _Prefetcher:
+    """Plans queued goals ahead of time; take(i) hands over goal i's Future, if any."""
+    def __init__(self, agent: "AsyncAgent", goals: List[str], depth: int, batch: int = 1):
+        self._agent = agent
+        self._goals = goals
+        self._batch = max(1, batch)
+        self._depth = max(depth, self._batch)
+        self._futs: Dict[int, asyncio.Future] = {}
+        self._taken: set = set()     # goals past their planning step
+        self._started: set = set()   # goals whose planning request has begun
+        self._next = 0
+        self._closed = False
+        self._workers = asyncio.Semaphore(max(1, min(self._depth, agent.cfg.llm_concurrency)))
+        self._tasks: set = set()
+
+    def advance(self, i: int):
+        """Goal i no longer needs the model: start planning goals up to i+depth (-1: from the first)."""
+        if self._closed: return
+        self._next = max(self._next, i + 1)
+        while self._next < min(len(self._goals), i + 1 + self._depth):
+            todo = [j for j in range(self._next, min(len(self._goals), self._next + self._batch))
+                    if j not in self._taken]
+            self._next += self._batch
+            if todo:
+                loop = asyncio.get_running_loop()
+                items = [(j, self._futs.setdefault(j, loop.create_future())) for j in todo]
+                prio = PRIORITY_PLANNER if i < 0 else PRIORITY_BACKGROUND
+                t = asyncio.create_task(self._plan(items, prio))
+                self._tasks.add(t); t.add_done_callback(self._tasks.discard)
+
+    def _skip(self, goal: str) -> bool:
+        """An action, extension or cached plan will handle goal."""
+        cfg = self._agent.cfg
+        return self._closed or bool(match_action(goal, cfg)) or XM.find_matching_extension(goal) is not None \
+            or _route_intent(goal, cfg) is not None or plan_cache.contains(goal, plan_cache.plan_sources(cfg), cfg.plan_cache_ttl)
+
+    async def _plan(self, items: List[Tuple[int, asyncio.Future]], priority: int):
+        """Resolve each Future to (planned, plan, (model, template)); planned=False when the goal won't need the planner."""
+        a = self._agent
+        async with self._workers:
+            live = [(j, f) for j, f in items if not f.done()]
+            self._started.update(j for j, _ in live)
+            try:
+                skip = await asyncio.to_thread(lambda: [self._skip(self._goals[j]) for j, _ in live])
+                need = []
+                for (j, f), s in zip(live, skip):
+                    if not s: need.append((j, f))
+                    elif not f.done(): f.set_result((False, None, None))
+                if not need: return
+                goals = [self._goals[j] for j, _ in need]
+                async with a._llm_slots:
+                    with tracing.span("planner.prefetch", goals=len(goals)):
+                        if len(goals) == 1:
+                            pl, model, template = await aroute(goals[0], a.cfg, priority=priority)
+                            plans, sources = [pl], [(model, template)]
+                        else:   # batches go straight to the code model; one request already covers them
+                            model, templates = a.cfg.code_model or a.cfg.model, []
+                            plans = await aplan_batch(goals, model, priority, max_goals=self._batch,
+                                                      max_chars=a.cfg.plan_batch_max_chars, templates=templates)
+                            sources = [(model, t) for t in templates]
+                for (_, f), pl, src in zip(need, plans, sources):
+                    if not f.done(): f.set_result((True, pl, src))
+            except asyncio.CancelledError:
+                for _, f in live: f.cancel()
+                raise
+            except Exception as e:
+                for _, f in live:
+                    if not f.done(): f.set_exception(e)
+
+    def take(self, i: int) -> Optional[asyncio.Future]:
+        """Goal i's prefetch, or None (not started yet -> cancelled; plan inline instead)."""
+        self._taken.add(i)
+        fut = self._futs.pop(i, None)
+        if fut is None or (i not in self._started and fut.cancel()):
+            return None
+        return fut
+
+    def close(self):
+        self._closed = True
+        for f in self._futs.values():
+            if f.done() and not f.cancelled(): f.exception()   # nobody will await it
+            f.cancel()
+        self._futs.clear()
+        for t in list(self._tasks): t.cancel()
+
+class AsyncAgent:
+    def __init__(self, cb: LogFn | None = None, on_token: LogFn | None = None, cfg: Optional[Config] = None):
+        self.cb = cb or (lambda m: None)
+        self.on_token = on_token  # planner output as it streams, in goal order (see _OrderedLog)
+        self.cfg = cfg or load_config()
+        self.goals: List[str] = []
+        self._serial: List[bool] = []   # parallel to goals: wait for previous goal
+        self._prefetch: Optional[_Prefetcher] = None
+
+    def _make_slots(self):
+        self._llm_slots = asyncio.Semaphore(max(1, self.cfg.llm_concurrency))
+        self._exec_slots = asyncio.Semaphore(max(1, self.cfg.exec_concurrency))
+
+    def _emit(self, msg: str, level="INFO"):
+        log(msg, level)
+        self.cb(msg)
+
+    def add_goal(self, g: str, serial: bool = False):
+        g = g.strip()
+        if g.lower().startswith("then "):
+            g = g[5:].strip(); serial = True
+        if not g: return
+        self.goals.append(g)
+        self._serial.append(serial)
+        memory.add_goal(g)   # write-behind: only queues the row
+        self._emit(f"Added goal: {g}" + (" (after previous)" if serial else ""))
+
+    async def clear_goals(self):
+        pf, self._prefetch = self._prefetch, None
+        if pf is not None:
+            pf.close()   # speculative plans for the cleared goals are dropped
+        self.goals.clear()
+        self._serial.clear()
+        await asyncio.to_thread(memory.clear_goals)
+        self._emit("Goals cleared.")
+
+    async def _run_extension(self, ext: Dict, emit: EmitFn, advance: Callable[[], None]):
+        advance()
+        async with self._exec_slots:
+            out = await XM.arun_extension(ext)
+        emit(out)
+
+    async def _handle_goal(self, goal: str, emit: Optional[EmitFn] = None, on_token: LogFn | None = None,
+                           pf: Optional[_Prefetcher] = None, i: int = 0) -> str:
+        """Run one goal; returns the stage that resolved it (action/extension/plan/none)."""
+        emit = emit or self._emit
+        cfg = self.cfg
+        advance = (lambda: pf.advance(i)) if pf is not None else (lambda: None)
+        # 1. Known action
+        act_result = await asyncio.to_thread(run_action, goal)
+        if act_result:
+            emit(f"Action result: {act_result}")
+            return "action"
+
+        # 2. Extension match
+        ext = await asyncio.to_thread(XM.find_matching_extension, goal)
+        if ext:
+            emit(f"Using learned extension: {ext['name']}")
+            await self._run_extension(ext, emit, advance)
+            return "extension"
+
+        # 2b. Paraphrase of a known action / extension
+        hit = await asyncio.to_thread(_route_intent, goal, cfg)
+        if hit:
+            kind, target, score = hit
+            if kind == "action":
+                out = await asyncio.to_thread(run_named_action, target.name, goal, cfg)
+                if out:
+                    emit(f"Action result ({target.name}, classifier {score:.2f}): {out}")
+                    return "action"
+            else:
+                emit(f"Using learned extension: {target['name']} (classifier {score:.2f})")
+                await self._run_extension(target, emit, advance)
+                return "extension"
+
+        # 3. Plan via LLM (cached plans first)
+        emit(f"Planning goal: {goal}")
+        with tracing.span("plan_cache.get"):
+            pl = await asyncio.to_thread(plan_cache.get, goal, plan_cache.plan_sources(cfg), cfg.plan_cache_ttl)
+        cached = pl is not None
+        fut = pf.take(i) if pf is not None and not cached else None
+        planned, pre, source = False, None, None
+        if fut is not None:
+            try:
+                planned, pre, source = await fut
+            except Exception as e:   # the prefetch failed; plan inline
+                emit(f"Prefetched plan failed ({e}); planning again.", "WARN")
+        if cached:
+            emit("Plan cache hit.")
+        elif planned:
+            pl = pre
+            emit("Using prefetched plan.")
+        else:
+            async with self._llm_slots:
+                pl, model, template = await aroute(goal, cfg, on_token)
+            source = (model, template)
+            if on_token: on_token("\n")
+        advance()
+        parsed = pl is not None
+        pl = pl or fallback_plan(goal)
+        emit(f"Planner intent: {pl.get('intent')} target={pl.get('target')}")
+        code = pl.get("python_code","") or ""
+        if code.strip():
+            emit("Running LLM-generated Python...")
+            async with self._exec_slots:
+                out = await arun_python(code)
+            emit(out)
+            if parsed and not cached and not _failed(out):
+                await asyncio.to_thread(plan_cache.put, goal, *source, pl, cfg.plan_cache_max)
+            # 4. Queue for extension approval (cached plans were queued when first made)
+            if not cached:
+                if await asyncio.to_thread(XM.queue_pending, goal, code):
+                    emit("Generated code queued for extension review.")
+            return "plan"
+        out, ok = await asyncio.to_thread(run_intent, pl, cfg)
+        if out:
+            emit(out)
+            if parsed and not cached and ok:
+                await asyncio.to_thread(plan_cache.put, goal, *source, pl, cfg.plan_cache_max)
+            return "plan"
+        emit("No code from planner; nothing to do.")
+        return "none"
+
+    async def _run_goal(self, i: int, goal: str, after: Optional[asyncio.Task], olog: _OrderedLog,
+                        pf: Optional[_Prefetcher], slots: asyncio.Semaphore):
+        emit = lambda msg, level="INFO": olog.write(i, msg, level)
+        on_token = olog.tokens(i)
+        t0 = None; stage = "error"
+        try:
+            if after is not None:
+                await asyncio.wait([after])
+            async with slots:
+                t0 = time.perf_counter()
+                emit(f"[DEBUG] Processing goal: {goal}")
+                stage = await self._handle_goal(goal, emit, on_token, pf, i)
+        except asyncio.CancelledError:
+            stage = "cancelled"
+            emit(f"Goal cancelled: {goal}", "WARN")
+            raise
+        except Exception as e:
+            emit(f"Goal failed: {goal}: {e}", "ERROR")
+        finally:
+            if pf is not None:
+                pf.advance(i)
+            dt = time.perf_counter() - t0 if t0 is not None else 0.0
+            tracing.record("goal", dt, stage=stage)
+            log("Goal finished", "DEBUG", batch_index=i, stage=stage, duration_ms=round(dt * 1e3, 1))
+            olog.finish(i)
+
+    async def process_goals(self):
+        batch = list(zip(self.goals, self._serial))
+        t0 = time.perf_counter()
+        self._make_slots()
+        workers = max(1, min(self.cfg.goal_workers, len(batch)))
+        olog = _OrderedLog(self._emit, len(batch), self.on_token)
+        pf = None
+        if len(batch) > 1 and (self.cfg.pipeline_depth > 0 or self.cfg.plan_batch_size > 1):
+            pf = self._prefetch = _Prefetcher(self, [g for g, _ in batch], self.cfg.pipeline_depth,
+                                              self.cfg.plan_batch_size)
+            if self.cfg.plan_batch_size > 1:
+                pf.advance(-1)   # plan the first batch together instead of goal by goal
+        slots = asyncio.Semaphore(workers)
+        tasks: List[asyncio.Task] = []
+        try:
+            prev: Optional[asyncio.Task] = None
+            for i, (g, serial) in enumerate(batch):
+                prev = asyncio.create_task(self._run_goal(i, g, prev if serial else None, olog, pf, slots))
+                tasks.append(prev)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            if pf is not None: pf.close()
+            for t in tasks: t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)   # let goals kill their code
+            self._emit(f"Goals cancelled ({sum(not t.cancelled() for t in tasks)} of {len(batch)} finished).", "WARN")
+            raise
+        finally:
+            if pf is not None:
+                pf.close()
+                if self._prefetch is pf: self._prefetch = None
+            self.goals.clear()
+            self._serial.clear()
+        self._emit(f"All goals complete ({len(batch)} in {time.perf_counter()-t0:.1f}s).")
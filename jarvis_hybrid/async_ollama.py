@@ -0,0 +1,290 @@
+"""
+Asyncio Ollama client (AsyncAgent, server)
+
+model_generate_stream() -> async generator of text chunks, HTTP first, CLI fallback
+
+Same contract as ollama_client.model_generate_stream, without a thread per
+request: AsyncOllamaClient speaks HTTP/1.1 over asyncio streams (keep-alive
+pool, chunked or Content-Length bodies, NDJSON lines) and the CLI fallback
+runs through asyncio.create_subprocess_exec. Requests take their slot from
+ollama_client's RequestScheduler, the same one blocking calls use, so
+cfg.ollama_max_inflight and the PRIORITY_* order are one budget.
+Cancelling the awaiting task, or aclose() on the stream, drops the socket
+or kills the CLI, which stops the generation.
+
+The client belongs to the running event loop. Address, pool size and
+timeout follow ollama_client.get_client(), so configure_client() applies
+here too.
+"""
+from __future__ import annotations
+import asyncio, json, shutil, subprocess, tempfile, weakref
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+from .logger import log
+from .ollama_client import PRIORITY_CHAT, OllamaHTTPClient, get_client, get_scheduler
+from . import tracing
+
+_Conn = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+# errors that mean a pooled keep-alive socket went stale before we used it
+_STALE = (ConnectionResetError, BrokenPipeError, ConnectionAbortedError, asyncio.IncompleteReadError)
+
+class _Idle:
+    """
+    Per-request read timeout: fails the reader with TimeoutError once `t`
+    seconds pass without progress (tick() per chunk). One timer per request
+    is much cheaper than wait_for() around every read.
+    """
+    def __init__(self, r: asyncio.StreamReader, t: float):
+        self.r, self.t = r, t
+        self.n = self._seen = 0
+        self._h = asyncio.get_running_loop().call_later(t, self._check)
+
+    def tick(self):
+        self.n += 1
+
+    def _check(self):
+        if self.n == self._seen:
+            self.r.set_exception(TimeoutError(f"no data from Ollama for {self.t:g} s"))
+        else:
+            self._seen = self.n
+            self._h = asyncio.get_running_loop().call_later(self.t, self._check)
+
+    def cancel(self):
+        self._h.cancel()
+
+class AsyncOllamaClient:
+    """
+    Pool of persistent HTTP/1.1 connections to one Ollama server, for one
+    event loop. At most `pool_size` requests are in flight; idle sockets are reused.
+    """
+    def __init__(self, base_url: str = "http://localhost:11434", pool_size: int = 4,
+                 timeout: float = 600.0, connect_timeout: float = 5.0):
+        u = urlsplit(base_url)
+        self.host = u.hostname or "localhost"
+        self.port = u.port or 11434
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._idle: List[_Conn] = []
+        self._slots = asyncio.Semaphore(self.pool_size)
+        self._closed = False
+
+    @classmethod
+    def like(cls, c: OllamaHTTPClient) -> "AsyncOllamaClient":
+        return cls(f"http://{c.host}:{c.port}", c.pool_size, c.timeout, c.connect_timeout)
+
+    # ---------- pool ----------
+    async def _connect(self) -> _Conn:
+        return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.connect_timeout)
+
+    def _release(self, conn: _Conn, keep: bool, idle: Optional[_Idle] = None):
+        if idle is not None: idle.cancel()
+        if keep and not self._closed:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+        self._slots.release()
+
+    def close(self):
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for _, w in idle: w.close()
+
+    # ---------- HTTP/1.1 ----------
+    @staticmethod
+    async def _exchange(conn: _Conn, data: bytes) -> Tuple[int, Dict[str, str]]:
+        r, w = conn
+        w.write(data)
+        await w.drain()
+        line = await r.readline()
+        if not line:
+            raise ConnectionResetError("connection closed by server")
+        status = int(line.split(None, 2)[1])
+        headers: Dict[str, str] = {}
+        while True:
+            h = await r.readline()
+            if h in (b"\r\n", b"\n", b""): break
+            k, _, v = h.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        return status, headers
+
+    @staticmethod
+    async def _body(r: asyncio.StreamReader, headers: Dict[str, str], idle: _Idle) -> AsyncIterator[bytes]:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                line = await r.readline()
+                if not line:
+                    raise ConnectionResetError("connection closed mid-response")
+                size = int(line.split(b";", 1)[0], 16)
+                if not size:
+                    while (await r.readline()) not in (b"\r\n", b"\n", b""): pass   # trailers
+                    return
+                idle.tick()
+                yield (await r.readexactly(size + 2))[:-2]
+        elif "content-length" in headers:
+            n = int(headers["content-length"])
+            if n: yield await r.readexactly(n)
+        else:   # body ends when the server closes
+            while True:
+                data = await r.read(65536)
+                if not data: return
+                idle.tick()
+                yield data
+
+    @staticmethod
+    def _reusable(headers: Dict[str, str]) -> bool:
+        framed = headers.get("transfer-encoding", "").lower() == "chunked" or "content-length" in headers
+        return framed and headers.get("connection", "").lower() != "close"
+
+    async def _send(self, path: str, payload: dict, timeout: Optional[float]) -> Tuple[_Conn, Dict[str, str], _Idle]:
+        body = json.dumps(payload).encode("utf-8")
+        data = (f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode("ascii") + body
+        t = self.timeout if timeout is None else timeout
+        await self._slots.acquire()
+        conn = self._idle.pop() if self._idle else None
+        reused = conn is not None
+        idle = None
+        try:
+            try:
+                if conn is None:
+                    conn = await self._connect()
+                idle = _Idle(conn[0], t)
+                status, headers = await self._exchange(conn, data)
+            except _STALE:
+                if not reused: raise
+                # server dropped the idle socket; retry once on a fresh one
+                idle.cancel(); conn[1].close(); conn = None
+                conn = await self._connect()
+                idle = _Idle(conn[0], t)
+                status, headers = await self._exchange(conn, data)
+            if status != 200:
+                detail = b"".join([c async for c in self._body(conn[0], headers, idle)])[:200]
+                raise RuntimeError(f"HTTP {status} from Ollama {path}: {detail.decode('utf-8', 'ignore')}")
+        except BaseException:
+            if idle is not None: idle.cancel()
+            if conn is not None: conn[1].close()
+            self._slots.release()
+            raise
+        return conn, headers, idle
+
+    # ---------- requests ----------
+    async def post_json(self, path: str, payload: dict, timeout: Optional[float] = None) -> dict:
+        conn, headers, idle = await self._send(path, payload, timeout)
+        keep = False
+        try:
+            raw = b"".join([c async for c in self._body(conn[0], headers, idle)])
+            keep = self._reusable(headers)
+        finally:
+            self._release(conn, keep, idle)
+        return json.loads(raw.decode("utf-8", "ignore"))
+
+    async def stream_json(self, path: str, payload: dict, timeout: Optional[float] = None) -> AsyncIterator[dict]:
+        """Yield one dict per NDJSON line. Closing the generator early drops the socket."""
+        conn, headers, idle = await self._send(path, payload, timeout)
+        keep, buf = False, b""
+        try:
+            async for data in self._body(conn[0], headers, idle):
+                *lines, buf = (buf + data).split(b"\n")
+                for line in lines:
+                    if not line.strip(): continue
+                    try:
+                        obj = json.loads(line)
+                    except ValueError:
+                        continue
+                    yield obj
+            keep = self._reusable(headers)
+        finally:
+            self._release(conn, keep, idle)
+
+    async def generate(self, model: str, prompt: str, timeout: Optional[float] = None) -> str:
+        obj = await self.post_json("/api/generate", {"model": model, "prompt": prompt, "stream": False}, timeout)
+        if obj.get("error"):
+            raise RuntimeError(obj["error"])
+        return obj.get("response", "")
+
+    async def generate_stream(self, model: str, prompt: str, timeout: Optional[float] = None,
+                              extra: Optional[dict] = None, meta: Optional[dict] = None) -> AsyncIterator[str]:
+        """Like OllamaHTTPClient.generate_stream()."""
+        payload = {"model": model, "prompt": prompt, "stream": True, **(extra or {})}
+        lines = self.stream_json("/api/generate", payload, timeout)
+        try:
+            async for obj in lines:
+                if obj.get("error"):
+                    raise RuntimeError(obj["error"])
+                tok = obj.get("response", "")
+                if tok: yield tok
+                if obj.get("done") and meta is not None:
+                    meta.update((k, v) for k, v in obj.items() if k not in ("response", "model"))
+        finally:
+            await lines.aclose()
+
+# per event loop: (sync client it mirrors, async client)
+_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+
+def get_async_client() -> AsyncOllamaClient:
+    """This event loop's client (call from a coroutine)."""
+    loop = asyncio.get_running_loop()
+    base = get_client()
+    st = _state.get(loop)
+    if st is None or st[0] is not base:
+        if st is not None: st[1].close()
+        st = _state[loop] = (base, AsyncOllamaClient.like(base))
+    return st[1]
+
+async def _cli_stream(model: str, prompt: str, extra: Optional[dict] = None,
+                      meta: Optional[dict] = None) -> AsyncIterator[str]:
+    """Yield `ollama run` stdout line by line. Raises if the CLI is missing or fails."""
+    if not shutil.which("ollama"):
+        raise FileNotFoundError("Ollama CLI not found.")
+    fmt = ["--format", extra["format"]] if extra and extra.get("format") else []
+    with tempfile.TemporaryFile() as errf:   # not a pipe: unread, it could fill and stall the CLI
+        proc = await asyncio.create_subprocess_exec("ollama", "run", *fmt, model, prompt,
+                                                    stdout=subprocess.PIPE, stderr=errf)
+        try:
+            async for line in proc.stdout:
+                yield line.decode("utf-8", "ignore")
+            if await proc.wait() != 0:
+                errf.seek(0)
+                raise subprocess.CalledProcessError(proc.returncode, "ollama run",
+                                                    stderr=errf.read().decode("utf-8", "ignore"))
+        finally:
+            if proc.returncode is None:
+                proc.kill(); await proc.wait()
+
+async def model_generate_stream(model: str, prompt: str, priority: int = PRIORITY_CHAT,
+                                context: Optional[List[int]] = None, meta: Optional[dict] = None,
+                                fmt: Optional[str] = None,
+                                cli_prompt: Optional[Callable[[], str]] = None) -> AsyncIterator[str]:
+    """
+    ollama_client.model_generate_stream() for asyncio: HTTP first, CLI
+    fallback, "[LLM unavailable]" last. The scheduler slot is held until the
+    stream ends; aclose() or cancelling the consumer cancels the generation.
+    cli_prompt is called in a thread.
+    """
+    extra = {k: v for k, v in (("context", context), ("format", fmt)) if v} or None
+    async with get_scheduler().aslot(priority):
+        with tracing.span("llm.stream", model=model, prompt_chars=len(prompt)) as sp:
+            log(f"Ollama prompt -> {model} ({len(prompt)} chars, stream)")
+            n = 0
+            for name, backend in (("HTTP", get_async_client().generate_stream), ("CLI", _cli_stream)):
+                if name == "CLI" and cli_prompt is not None: prompt = await asyncio.to_thread(cli_prompt)
+                chunks = backend(model, prompt, extra=extra, meta=meta)
+                try:
+                    async for tok in chunks:
+                        n += len(tok)
+                        yield tok
+                except (GeneratorExit, asyncio.CancelledError):
+                    log(f"Ollama response {n} chars (stream, stopped early)")
+                    sp.set(backend=name.lower(), response_chars=n, stopped="early")
+                    raise
+                except Exception as e:
+                    log(f"Ollama {name} stream failed: {e}", "WARN")
+                    if not n: continue
+                finally:
+                    await chunks.aclose()
+                log(f"Ollama response {n} chars (stream)")
+                sp.set(backend=name.lower(), response_chars=n)
+                return
+            sp.set(backend="none")
+    yield "[LLM unavailable]"
@@ -1,36 +1,283 @@
 """
 Chat with Assistant (multi-turn context)
+
+A ChatSession keeps the conversation on the Ollama server: each answer's
+`context` (the evaluated token state) is sent back with the next message, so
+only the new message is evaluated and the prompt stays one message long.
+When no context is available (CLI fallback, a resumed session for another
+model) or it outgrows cfg.chat_context_limit tokens, the prompt is rebuilt
+as text: a rolling summary of older turns plus as many recent turns as fit
+cfg.chat_token_budget. Older turns are folded into the summary in the
+background.
+
+Sessions (summary, context, turns with prompt size and latency) are stored
+in memory.db and can be resumed. aask() is the asyncio version of ask().
 """
 from __future__ import annotations
-from typing import List, Tuple
+import asyncio, json, threading, time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from . import async_ollama, memory
 from .config import load_config
-from .ollama_client import model_generate
+from .ollama_client import PRIORITY_BACKGROUND, model_generate, model_generate_stream
 from .logger import log
 
-MAX_TURNS = 12
+MAX_TURNS = 12   # hard cap on verbatim turns in a text prompt (the token budget usually binds first)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions(
+ id INTEGER PRIMARY KEY AUTOINCREMENT,
+ title TEXT NOT NULL,
+ model TEXT NOT NULL,
+ summary TEXT NOT NULL DEFAULT '',
+ summarized INTEGER NOT NULL DEFAULT 0,
+ context TEXT,
+ created_ts REAL NOT NULL,
+ updated_ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_turns(
+ id INTEGER PRIMARY KEY AUTOINCREMENT,
+ session_id INTEGER NOT NULL,
+ user TEXT NOT NULL,
+ assistant TEXT NOT NULL,
+ prompt_chars INTEGER NOT NULL,
+ prompt_tokens INTEGER,
+ first_token_ms REAL,
+ total_ms REAL,
+ ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_turns_session ON chat_turns(session_id, id);
+"""
+
+memory.register_schema(SCHEMA)
+
+SUMMARY_PROMPT = """Update the running summary of a conversation with the new exchanges below.
+Keep facts, names, decisions and open questions; drop small talk. Reply with the summary only.
+
+Current summary:
+{summary}
+
+New exchanges:
+{turns}
+
+Updated summary:"""
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def _turn_text(u: str, a: str) -> str:
+    return f"User: {u}\nAssistant: {a}"
+
+def _build_prompt(history: List[Tuple[str,str]], user: str, summary: str = "", budget: int = 0) -> str:
+    """Text prompt: summary + the most recent turns that fit budget tokens (0 = MAX_TURNS only)."""
+    tail = f"User: {user}\nAssistant:"
+    used = estimate_tokens(tail) + estimate_tokens(summary)
+    turns: List[str] = []
+    for u, a in reversed(history[-MAX_TURNS:]):
+        t = _turn_text(u, a)
+        if budget and used + estimate_tokens(t) > budget:
+            break
+        turns.append(t); used += estimate_tokens(t)
+    lines = [f"Summary of the earlier conversation: {summary}"] if summary else []
+    return "\n".join(lines + turns[::-1] + [tail])
+
+@dataclass
+class TurnStats:
+    prompt_chars: int
+    prompt_tokens: Optional[int]   # tokens the server evaluated for the prompt
+    first_token_ms: float
+    total_ms: float
+    used_context: bool
+
+class ChatSession:
+    def __init__(self, model: str, session_id: Optional[int] = None, cfg=None):
+        self.cfg = cfg or load_config()
+        self.model = model
+        self.history: List[Tuple[str, str]] = []
+        self.summary = ""
+        self.summarized = 0            # history[:summarized] is covered by summary
+        self.context: Optional[List[int]] = None
+        self.stats: List[TurnStats] = []
+        self._fold: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.id: Optional[int] = None      # row is created with the first turn
+        if session_id is not None:
+            self._load(session_id)
+
+    # -------- persistence --------
+    def _load(self, sid: int):
+        conn = memory.get_conn()
+        row = conn.execute("SELECT model, summary, summarized, context FROM chat_sessions WHERE id=?",
+                           (sid,)).fetchone()
+        if row is None:
+            raise KeyError(f"No chat session {sid}")
+        self.id = sid
+        self.summary, self.summarized = row[1], row[2]
+        # a context is only meaningful to the model that produced it
+        self.context = json.loads(row[3]) if row[3] and row[0] == self.model else None
+        self.history = [(u, a) for u, a in conn.execute(
+            "SELECT user, assistant FROM chat_turns WHERE session_id=? ORDER BY id", (sid,))]
+
+    def _save(self, user: str, answer: str, st: TurnStats):
+        now = time.time()
+        with memory.transaction() as conn:
+            if self.id is None:
+                self.id = conn.execute("INSERT INTO chat_sessions(title,model,created_ts,updated_ts) VALUES('',?,?,?)",
+                                       (self.model, now, now)).lastrowid
+            conn.execute(
+                "INSERT INTO chat_turns(session_id,user,assistant,prompt_chars,prompt_tokens,first_token_ms,total_ms,ts) "
+                "VALUES(?,?,?,?,?,?,?,?)",
+                (self.id, user, answer, st.prompt_chars, st.prompt_tokens, st.first_token_ms, st.total_ms, now))
+            conn.execute(
+                "UPDATE chat_sessions SET title=CASE WHEN title='' THEN ? ELSE title END, model=?, context=?, "
+                "updated_ts=? WHERE id=?",
+                (user[:60], self.model, json.dumps(self.context) if self.context else None, now, self.id))
+
+    # -------- rolling summary --------
+    def _fold_old_turns(self):
+        """Summarize turns that no longer fit the text budget (runs in the background)."""
+        keep = self.cfg.chat_token_budget // 2
+        with self._lock:
+            upto, used = len(self.history), 0
+            while upto > self.summarized:
+                t = estimate_tokens(_turn_text(*self.history[upto - 1]))
+                if used + t > keep: break
+                used += t; upto -= 1
+            old = self.history[self.summarized:upto]
+            summary = self.summary
+        if not old:
+            return
+        turns = "\n".join(_turn_text(u, a) for u, a in old)
+        new = model_generate(self.model, SUMMARY_PROMPT.replace("{summary}", summary or "(none)")
+                             .replace("{turns}", turns), priority=PRIORITY_BACKGROUND).strip()
+        if not new or new.startswith("[LLM unavailable]"):
+            return
+        with self._lock:
+            self.summary, self.summarized = new, self.summarized + len(old)
+        memory.get_conn().execute("UPDATE chat_sessions SET summary=?, summarized=? WHERE id=?",
+                                  (new, self.summarized, self.id))
+
+    def _maybe_fold(self):
+        if self.context and len(self.context) < self.cfg.chat_context_limit * 3 // 4:
+            return   # the server holds the history; summarize only as the context nears its limit
+        pending = self.history[self.summarized:]
+        if sum(estimate_tokens(_turn_text(u, a)) for u, a in pending) <= self.cfg.chat_token_budget:
+            return
+        if self._fold is None or not self._fold.is_alive():
+            self._fold = threading.Thread(target=self._fold_old_turns, name="chat-summary", daemon=True)
+            self._fold.start()
+
+    # -------- turns --------
+    def _prompt(self, user: str) -> Tuple[str, Optional[List[int]]]:
+        if self.context and self.cfg.chat_use_context and len(self.context) <= self.cfg.chat_context_limit:
+            return user, self.context
+        return self._text_prompt(user), None
+
+    def _text_prompt(self, user: str) -> str:
+        """Summary + recent turns + user, for a model without our context."""
+        if self._fold is not None:
+            self._fold.join()          # use the freshest summary for a rebuilt prompt
+        with self._lock:
+            recent, summary = self.history[self.summarized:], self.summary
+        return _build_prompt(recent, user, summary, self.cfg.chat_token_budget)
+
+    def _cli_prompt(self, user: str, sent: list):
+        """cli_prompt for a context turn: the CLI can't use the context, so it gets the full text."""
+        def build() -> str:
+            sent[:] = [self._text_prompt(user), None]
+            return sent[0]
+        return build
+
+    def ask(self, user: str, on_token=None) -> str:
+        prompt, ctx = self._prompt(user)
+        sent = [prompt, ctx]   # what was actually sent
+        meta: dict = {}; parts: List[str] = []
+        t0 = time.perf_counter(); first = None
+        for tok in model_generate_stream(self.model, prompt, context=ctx, meta=meta,
+                                         cli_prompt=self._cli_prompt(user, sent) if ctx else None):
+            if first is None: first = time.perf_counter()
+            if not parts: tok = tok.lstrip()
+            parts.append(tok)
+            if on_token: on_token(tok)
+        return self._finish(user, *sent, meta, parts, t0, first)
+
+    async def aask(self, user: str, on_token=None) -> str:
+        """ask() for asyncio callers; cancelling stops the generation and records nothing."""
+        prompt, ctx = await asyncio.to_thread(self._prompt, user)
+        sent = [prompt, ctx]   # what was actually sent
+        meta: dict = {}; parts: List[str] = []
+        t0 = time.perf_counter(); first = None
+        gen = async_ollama.model_generate_stream(self.model, prompt, context=ctx, meta=meta,
+                                                 cli_prompt=self._cli_prompt(user, sent) if ctx else None)
+        try:
+            async for tok in gen:
+                if first is None: first = time.perf_counter()
+                if not parts: tok = tok.lstrip()
+                parts.append(tok)
+                if on_token: on_token(tok)
+        finally:
+            await gen.aclose()
+        return await asyncio.to_thread(self._finish, user, *sent, meta, parts, t0, first)
+
+    def _finish(self, user: str, prompt: str, ctx, meta: dict, parts: List[str], t0: float, first) -> str:
+        end = time.perf_counter()
+        answer = "".join(parts).strip() or "(no response)"
+        self.context = meta.get("context") if self.cfg.chat_use_context else None
+        st = TurnStats(len(prompt), meta.get("prompt_eval_count"),
+                       ((first or end) - t0) * 1e3, (end - t0) * 1e3, ctx is not None)
+        self.stats.append(st)
+        log(f"[CHAT] turn {len(self.history) + 1}: prompt {st.prompt_chars} chars"
+            f"{'' if st.prompt_tokens is None else f' / {st.prompt_tokens} tok'}"
+            f"{' (context reused)' if st.used_context else ''}, first token {st.first_token_ms:.0f} ms, "
+            f"total {st.total_ms:.0f} ms")
+        with self._lock:
+            self.history.append((user, answer))
+        self._save(user, answer, st)
+        self._maybe_fold()
+        return answer
+
+def list_sessions(limit: int = 20):
+    """[(id, title, turns, updated_ts)] most recent first."""
+    return memory.get_conn().execute(
+        "SELECT s.id, s.title, (SELECT COUNT(*) FROM chat_turns t WHERE t.session_id=s.id), s.updated_ts "
+        "FROM chat_sessions s ORDER BY s.updated_ts DESC LIMIT ?", (limit,)).fetchall()
 
-def _build_prompt(history: List[Tuple[str,str]], user: str) -> str:
-    lines=[]
-    for u,a in history[-MAX_TURNS:]:
-        lines.append(f"User: {u}")
-        lines.append(f"Assistant: {a}")
-    lines.append(f"User: {user}")
-    lines.append("Assistant:")
-    return "\n".join(lines)
+def _print_stats(sess: ChatSession):
+    for i, st in enumerate(sess.stats, 1):
+        tok = "-" if st.prompt_tokens is None else st.prompt_tokens
+        print(f"  turn {i}: prompt {st.prompt_chars} chars / {tok} tok, "
+              f"first token {st.first_token_ms:.0f} ms, total {st.total_ms:.0f} ms"
+              f"{' [context]' if st.used_context else ''}")
 
 def chat_loop():
     cfg = load_config()
-    hist: List[Tuple[str,str]]=[]
+    sess = ChatSession(cfg.model, cfg=cfg)
     print("=== Jarvis Chat ===")
-    print("Type 'exit' to return.\n")
+    print("Type 'exit' to return. /sessions lists saved chats, /resume <id> continues one, /stats shows timings.")
+    print("Ctrl+C stops an answer.\n")
     while True:
         u = input("You: ").strip()
         if u.lower() in ("exit","quit","q"): break
         if not u: continue
+        if u == "/sessions":
+            for sid, title, n, ts in list_sessions():
+                print(f"  {sid}: {title or '(empty)'} ({n} turns, {time.strftime('%Y-%m-%d %H:%M', time.localtime(ts))})")
+            continue
+        if u.startswith("/resume"):
+            try:
+                sess = ChatSession(cfg.model, int(u.split()[1]), cfg=cfg)
+                print(f"Resumed session {sess.id} ({len(sess.history)} turns).")
+            except (IndexError, ValueError, KeyError) as e:
+                print(f"Cannot resume: {e}")
+            continue
+        if u == "/stats":
+            _print_stats(sess); continue
         log(f"[CHAT][USER] {u}")
-        prompt = _build_prompt(hist,u)
-        a = model_generate(cfg.model, prompt).strip()
-        if not a: a="(no response)"
-        print(f"Assistant: {a}\n")
+        print("Assistant: ", end="", flush=True)
+        try:
+            a = sess.ask(u, on_token=lambda t: print(t, end="", flush=True))
+        except KeyboardInterrupt:
+            print("\n(stopped)\n"); continue
+        if a == "(no response)": print(a, end="")
+        print("\n")
         log(f"[CHAT][ASSISTANT] {a}")
-        hist.append((u,a))
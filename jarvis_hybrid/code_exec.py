@@ -1,10 +1,41 @@
 """
 Execute Python code in subprocess.
+
+With cfg.use_worker_pool the code runs in a warm pooled interpreter
+(see worker_pool.py); otherwise, or if the pool can't start, in a fresh
+`python` subprocess. Both return stdout followed by stderr.
+
+arun_python() is the asyncio version: the subprocess is started with
+asyncio.create_subprocess_exec, and cancelling the awaiting task kills the
+code (pool worker or subprocess).
 """
 from __future__ import annotations
-import os, sys, tempfile, subprocess, uuid
+import asyncio, functools, os, sys, tempfile, subprocess, threading, uuid
+from .config import get_config
+from .logger import log
+from .tracing import span
+from .worker_pool import WorkerPool, get_pool
+
+def pool_from_config() -> WorkerPool | None:
+    cfg = get_config()
+    if not cfg.use_worker_pool:
+        return None
+    return get_pool(cfg.worker_pool_size, cfg.worker_preload)
 
 def run_python(code: str, timeout=60) -> str:
+    with span("exec.python", path="pool") as sp:
+        pool = pool_from_config()
+        if pool is not None:
+            try:
+                return pool.run_code(code, timeout=timeout, cwd=os.getcwd())
+            except TimeoutError as e:
+                return f"Execution error: {e}"
+            except Exception as e:
+                log(f"Worker pool unavailable, spawning: {e}", "WARN")
+        sp.set(path="subprocess")
+        return run_python_subprocess(code, timeout)
+
+def run_python_subprocess(code: str, timeout=60) -> str:
     with tempfile.TemporaryDirectory() as td:
         p = os.path.join(td, f"jarvis_{uuid.uuid4().hex}.py")
         open(p,"w",encoding="utf-8",errors="ignore").write(code)
@@ -17,3 +48,46 @@ def run_python(code: str, timeout=60) -> str:
             return (proc.stdout or "") + (proc.stderr or "")
         except Exception as e:
             return f"Execution error: {e}"
+
+# ------------------ asyncio ------------------
+async def in_pool(run, arg: str, timeout: float) -> str:
+    """Await pool.run_code / pool.run_file(arg) on a thread; cancelling kills the job's worker."""
+    cancel = threading.Event()
+    fut = asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(run, arg, timeout=timeout, cwd=os.getcwd(), cancel=cancel))
+    try:
+        return await fut
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+
+async def arun_subprocess(args: list, timeout: float, error: str = "Execution error") -> str:
+    """stdout + stderr of args; "<error>: ..." on failure or timeout. Killed when cancelled."""
+    try:
+        proc = await asyncio.create_subprocess_exec(*args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except Exception as e:
+        return f"{error}: {e}"
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        return f"{error}: timed out after {timeout} seconds"
+    finally:
+        if proc.returncode is None:
+            proc.kill(); await proc.wait()
+    return (out.decode("utf-8", "ignore") + err.decode("utf-8", "ignore")).replace("\r\n", "\n")
+
+async def arun_python(code: str, timeout=60) -> str:
+    with span("exec.python", path="pool") as sp:
+        pool = pool_from_config()
+        if pool is not None:
+            try:
+                return await in_pool(pool.run_code, code, timeout)
+            except TimeoutError as e:
+                return f"Execution error: {e}"
+            except Exception as e:
+                log(f"Worker pool unavailable, spawning: {e}", "WARN")
+        sp.set(path="subprocess")
+        with tempfile.TemporaryDirectory() as td:
+            p = os.path.join(td, f"jarvis_{uuid.uuid4().hex}.py")
+            open(p,"w",encoding="utf-8",errors="ignore").write(code)
+            return await arun_subprocess([sys.executable, p], timeout)
@@ -1,21 +1,71 @@
 """
 Jarvis Hybrid Config
+
+load_config() returns a fresh, mutable Config (for editing + save_config).
+get_config() returns a shared read-only snapshot that is re-read only when
+config.json's mtime changes; use it on hot paths.
 """
 from __future__ import annotations
-import json
+import json, threading
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 
 CONFIG_PATH = Path(__file__).resolve().parent.parent / "config.json"
 
 @dataclass
 class Config:
     model: str = "mistral"  # faster than llama3 typically
+    intent_classifier: bool = False     # offline n-gram classifier routes paraphrased actions/extensions
+    intent_threshold: float = 0.35      # min cosine similarity to route without the LLM
+    intent_margin: float = 0.1          # ...and lead over the second-best label
+    intent_min_examples: int = 2        # ...and distinct training phrases behind it
+    classifier_model: str = ""          # small model for intent/target first ("" = plan with one model)
+    code_model: str = ""                # model that writes code ("" = model)
     allowed_roots: List[str] = field(default_factory=list)
     console_echo: bool = True
     allow_system_actions: bool = True   # allow launching apps
     allow_web_open: bool = True         # open browser urls
+    ollama_url: str = "http://localhost:11434"
+    ollama_pool_size: int = 4           # max keep-alive connections to Ollama
+    ollama_timeout: float = 600.0       # per-request socket timeout (seconds)
+    ollama_max_inflight: int = 2        # concurrent requests to the local model
+    plan_cache_ttl: float = 7 * 24 * 3600   # seconds; 0 = never expire
+    plan_cache_max: int = 500               # LRU bound on cached plans
+    goal_workers: int = 4               # goals processed concurrently
+    llm_concurrency: int = 2            # concurrent planner calls
+    pipeline_depth: int = 2             # upcoming goals planned ahead while earlier ones run (0 = off)
+    plan_batch_size: int = 4            # goals planned per LLM request when several are queued (1 = off)
+    plan_batch_max_chars: int = 4000    # prompt budget per batched planning request
+    exec_concurrency: int = 4           # concurrent code/extension subprocesses
+    use_worker_pool: bool = True        # run code in pre-started interpreters (one job each)
+    worker_pool_size: int = 2
+    worker_preload: List[str] = field(default_factory=lambda: ["psutil", "requests"])
+    embed_backend: str = "ollama"       # "ollama" or "hash" (offline, deterministic)
+    embed_model: str = "nomic-embed-text"
+    embed_dims: int = 256               # keep the first N dims (Matryoshka models like nomic-embed-text); 0 = all
+    scan_ignore: List[str] = field(default_factory=lambda: [
+        "node_modules", ".git", "__pycache__", "dist", "build", ".venv", "venv", "env"])  # fnmatch on names
+    scan_workers: int = 8               # threads listing directories in Learning Mode
+    learn_chunk_chars: int = 6000       # per-prompt budget for Learning Mode chunks (~1.5k tokens)
+    learn_excerpt_chars: int = 600      # head of each key file included in its chunk
+    learn_workers: int = 2              # chunks summarized concurrently
+    chat_use_context: bool = True       # reuse Ollama's returned context (server KV cache) between turns
+    chat_context_limit: int = 3072      # tokens; beyond this the prompt is rebuilt from summary + recent turns
+    chat_token_budget: int = 1536       # tokens of verbatim history in a rebuilt prompt
+    log_format: str = "text"            # "text" or "json" (JSON lines with structured fields)
+    log_keep: int = 10                  # gzipped rotated logs kept...
+    log_max_age_days: float = 30.0      # ...and for at most this long
+    log_queue_max: int = 100_000        # records buffered before the overflow policy applies
+    log_overflow: str = "drop"          # "drop" new records or "block" the caller
+    trace_enabled: bool = False         # per-stage latency histograms (Latency Stats menu)
+    trace_export: str = "prom"          # "prom", "json" or "" -> logs/metrics.*
+    trace_export_interval: float = 30.0 # seconds between metric exports
+    server_host: str = "127.0.0.1"      # daemon (python -m jarvis_hybrid.server) listen address
+    server_port: int = 8765
+    server_workers: int = 16            # requests handled concurrently by the daemon
+    server_queue: int = 64              # requests waiting for a worker before 503
+    server_token: str = ""              # bearer token clients must send ("" = new one per run in server.token)
 
 def load_config() -> Config:
     if CONFIG_PATH.exists():
@@ -28,4 +78,35 @@ def load_config() -> Config:
     return cfg
 
 def save_config(cfg: Config):
+    global _snapshot
     CONFIG_PATH.write_text(json.dumps(asdict(cfg), indent=2), encoding="utf-8")
+    _snapshot = None
+
+# ------------------ cached snapshot ------------------
+# (mtime_ns, cfg, resolved lower-cased allowed roots)
+_snapshot: Optional[Tuple[Optional[int], Config, Tuple[str, ...]]] = None
+_snap_lock = threading.Lock()
+
+def _mtime() -> Optional[int]:
+    try:
+        return CONFIG_PATH.stat().st_mtime_ns
+    except OSError:
+        return None
+
+def _current():
+    global _snapshot
+    snap, m = _snapshot, _mtime()
+    if snap is None or snap[0] != m or m is None:
+        with _snap_lock:
+            cfg = load_config()
+            roots = tuple(str(Path(r).resolve()).lower() for r in cfg.allowed_roots)
+            snap = _snapshot = (_mtime(), cfg, roots)
+    return snap
+
+def get_config() -> Config:
+    """Shared snapshot of config.json; do not mutate it."""
+    return _current()[1]
+
+def resolved_roots() -> Tuple[str, ...]:
+    """allowed_roots resolved and lower-cased once per config change."""
+    return _current()[2]
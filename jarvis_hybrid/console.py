@@ -5,11 +5,15 @@ from __future__ import annotations
 import os
 from .agent import Agent
 from .config import load_config, save_config
-from .logger import set_console_echo
+from .logger import configure_logger, set_console_echo
 from .chat import chat_loop
-from .scan import scan_project_fast
-from .ollama_client import model_generate
+from .scan import check_root
+from .learning import learn_project
+from .ollama_client import scheduler_stats
+from .model_router import router
 from . import memory
+from . import plan_cache
+from . import tracing
 from . import extension_manager as XM
 
 def clear(): os.system("cls" if os.name=="nt" else "clear")
@@ -28,7 +32,8 @@ def menu():
     print("7. Toggle Log Echo")
     print("8. Chat with Assistant")
     print("9. Manage Learned Actions")  # NEW
-    print("10. Exit")
+    print("10. Latency Stats")
+    print("11. Exit")
 
 def settings_menu(cfg):
     while True:
@@ -37,6 +42,20 @@ def settings_menu(cfg):
         print("Console Echo:", cfg.console_echo)
         print("Allow System Actions:", cfg.allow_system_actions)
         print("Allow Web Open:", cfg.allow_web_open)
+        st = plan_cache.stats()
+        print(f"Plan Cache: {st['entries']} entries | hits={st['hits']} misses={st['misses']}")
+        q = scheduler_stats()
+        print(f"LLM Queue: {q['inflight']}/{q['max_inflight']} in flight, {q['queued']} waiting")
+        for name, c in q["by_priority"].items():
+            print(f"  {name}: {c['requests']} req, {c['coalesced']} coalesced, "
+                  f"wait avg {c['wait_avg_ms']:.0f} ms / max {c['wait_max_ms']:.0f} ms")
+        print(f"Planner Models: classifier={cfg.classifier_model or '(off)'} code={cfg.code_model or cfg.model}")
+        rs = router.stats()
+        for tier, t in rs["tiers"].items():
+            print(f"  {tier}: {t['model']} {t['calls']} calls, avg {t['avg_ms']:.0f} ms / "
+                  f"ewma {t['ewma_ms']:.0f} ms / max {t['max_ms']:.0f} ms")
+        if "classifier" in rs["tiers"]:
+            print(f"  escalated to code model: {rs['escalations']} (recent rate {rs['escalation_rate']:.0%})")
         print("\nAllowed Roots:")
         for i,r in enumerate(cfg.allowed_roots,1):
             print(f" {i}. {r}")
@@ -44,7 +63,9 @@ def settings_menu(cfg):
         print("2. Change Model")
         print("3. Toggle System Actions")
         print("4. Toggle Web Open")
-        print("5. Back")
+        print("5. Purge Plan Cache")
+        print("6. Set Classifier / Code Models")
+        print("7. Back")
         ch = input("> ").strip()
         if ch=="1":
             newr = input("Enter full folder path: ").strip()
@@ -56,6 +77,11 @@ def settings_menu(cfg):
         elif ch=="4":
             cfg.allow_web_open = not cfg.allow_web_open
         elif ch=="5":
+            print(f"Purged {plan_cache.purge()} cached plans."); pause()
+        elif ch=="6":
+            cfg.classifier_model = input("Classifier model (blank = off): ").strip()
+            cfg.code_model = input(f"Code model (blank = {cfg.model}): ").strip()
+        elif ch=="7":
             save_config(cfg); break
 
 def learning_mode(cfg):
@@ -64,23 +90,39 @@ def learning_mode(cfg):
     if not path: pause(); return
     if not any(path.lower().startswith(ar.lower()) for ar in cfg.allowed_roots):
         print("Path not allowed. Add in Settings."); pause(); return
-    print("Scanning...")
-    listing = scan_project_fast(path)
-    print("\nSummarizing...")
-    summary = model_generate(cfg.model, f'Summarize this project structure:\n{listing}\nSummary:')
+    err = check_root(path)
+    if err:
+        print(err); pause(); return
+    print("Scanning and summarizing...")
+    res = learn_project(path, cfg, on_progress=lambda d, n, label: print(f"  [{d}/{n}] {label}"))
+    print(f"\n{res.chunks} chunks: {res.reused} unchanged, {res.generated} summarized ({res.seconds:.1f}s)")
+    if not res.stored:
+        print("LLM unavailable: summary not saved."); pause(); return
     print("\n=== Summary ===\n")
-    print(summary)
-    memory.add_project_summary(path, summary)
+    print(res.summary)
     pause()
 
 def memory_search():
     clear(); banner()
-    q=input("Search memory: ").strip()
+    q=input('Search memory (words, "phrase", prefix*): ').strip()
     if not q: pause(); return
-    hits = memory.search_text(q)
+    hits = memory.search(q)
     print("\nResults:")
-    for sc,txt in hits:
-        print("-", txt[:120])
+    for h in hits:
+        where = f"summary {h['root']}" if h["kind"] == "summary" else "goal"
+        print(f"- [{where}] {h['snippet'][:160]}")
+    if not hits: print("(no matches)")
+    try:
+        from .vector_memory import search_summaries
+        related = search_summaries(q, 3)
+    except Exception:
+        related = []   # numpy / embedding model unavailable
+    seen = {h["id"] for h in hits if h["kind"] == "summary"}
+    related = [r for r in related if r["id"] not in seen]
+    if related:
+        print("\nRelated:")
+        for r in related:
+            print(f"- [{r['score']:.2f} {r['root']}] {r['text'][:160]}")
     pause()
 
 def manage_extensions_menu():
@@ -106,48 +148,70 @@ def manage_extensions_menu():
             pend = XM.list_pending()
             print("\nPending Extensions:")
             if pend:
-                for i,e in enumerate(pend):
-                    print(f"[{i}] goal={e['goal'][:60]}...")
+                for e in pend:
+                    print(f"[{e['id']}] goal={e['goal'][:60]}...")
             else:
                 print("(none)")
             pause()
         elif ch=="3":
-            pend = XM.list_pending()
+            pend = {e["id"]: e for e in XM.list_pending()}
             if not pend:
                 print("No pending."); pause(); continue
-            idx = input("Enter pending index to approve: ").strip()
-            if not idx.isdigit():
+            pid = input("Enter pending id to approve: ").strip()
+            if not pid.isdigit() or int(pid) not in pend:
                 print("Invalid."); pause(); continue
-            idx = int(idx)
-            goal = pend[idx]["goal"] if 0 <= idx < len(pend) else ""
+            goal = pend[int(pid)]["goal"]
             print(f"Goal: {goal}")
             trig_raw = input("Enter comma-separated triggers (keywords): ").strip()
             triggers = [t.strip() for t in trig_raw.split(",") if t.strip()] or [goal]
             name = input("Short name for extension: ").strip() or goal[:30]
-            msg = XM.promote_pending(idx, triggers, name=name)
+            msg = XM.promote_pending(int(pid), triggers, name=name)
             print(msg); pause()
         elif ch=="4":
-            pend = XM.list_pending()
-            if not pend:
+            if not XM.list_pending():
                 print("No pending."); pause(); continue
-            idx = input("Enter pending index to delete: ").strip()
-            if not idx.isdigit():
+            pid = input("Enter pending id to delete: ").strip()
+            if not pid.isdigit():
                 print("Invalid."); pause(); continue
-            idx = int(idx)
-            pend = XM.list_pending()
-            if 0 <= idx < len(pend):
-                pend.pop(idx)
-                XM.save_pending(pend)
-                print("Deleted."); pause()
-            else:
-                print("Out of range."); pause()
+            print("Deleted." if XM.delete_pending(int(pid)) else "No such id."); pause()
         elif ch=="5":
             break
 
+def latency_menu(cfg):
+    while True:
+        clear(); banner()
+        print(f"Tracing: {'on' if tracing.ENABLED else 'off'}"
+              + (f" (exporting {cfg.trace_export} every {cfg.trace_export_interval:.0f}s)" if cfg.trace_export else ""))
+        rows = tracing.snapshot()
+        if rows:
+            print(f"\n{'stage':<34}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+            for r in rows:
+                name = r["stage"] + "".join(f" {k}={v}" for k, v in r["labels"].items())
+                print(f"{name[:33]:<34}{r['count']:>7}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+                      f"{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}")
+        else:
+            print("\n(no samples yet" + ("" if tracing.ENABLED else "; enable tracing and run some goals") + ")")
+        print("\n1. Toggle Tracing")
+        print("2. Reset Stats")
+        print("3. Export Now")
+        print("4. Back")
+        ch = input("> ").strip()
+        if ch=="1":
+            cfg.trace_enabled = not tracing.ENABLED
+            tracing.configure(cfg.trace_enabled, cfg.trace_export, cfg.trace_export_interval)
+        elif ch=="2":
+            tracing.reset()
+        elif ch=="3":
+            print("Wrote", tracing.export(cfg.trace_export or "prom")); pause()
+        elif ch=="4":
+            break
+
 def main():
-    agent = Agent()
+    agent = Agent(on_token=lambda t: print(t, end="", flush=True))
     cfg = load_config()
     set_console_echo(cfg.console_echo)
+    configure_logger(cfg.log_format, cfg.log_keep, cfg.log_max_age_days, cfg.log_queue_max, cfg.log_overflow)
+    tracing.configure(cfg.trace_enabled, cfg.trace_export, cfg.trace_export_interval)
     while True:
         clear(); banner(); menu()
         ch = input("> ").strip()
@@ -160,7 +224,12 @@ def main():
             else: print("(none)")
             pause()
         elif ch=="3":
-            agent.process_goals(); pause()
+            print("Running goals (Ctrl+C cancels)...")
+            try:
+                agent.process_goals()
+            except KeyboardInterrupt:
+                print("\nCancelled.")
+            pause()
         elif ch=="4":
             learning_mode(cfg)
         elif ch=="5":
@@ -176,6 +245,8 @@ def main():
         elif ch=="9":
             manage_extensions_menu()
         elif ch=="10":
+            latency_menu(cfg)
+        elif ch=="11":
             save_config(cfg); break
 
 if __name__=="__main__":
@@ -5,35 +5,105 @@ Persist & reuse AI-generated Python actions ("extensions").
 
 Locations:
 - extensions/               -> folder of approved extension scripts
-- extensions/extension_index.json -> registry of extensions [{name, triggers, path, created_ts}]
+- memory.db `extensions`    -> registry {id, name, triggers, path, goal, created_ts}
+- memory.db `pending_extensions` -> AI-generated code awaiting user approval
 
-Pending:
-- extensions/pending_extensions.json -> queue of AI-generated code awaiting user approval.
+Pending code is keyed by a hash of its text: identical code is queued once,
+and not at all if an approved extension already has it. Promote and delete
+are single transactions. extension_index.json / pending_extensions.json from
+older versions are imported on first use and renamed to *.migrated.
 
 Usage:
     from . import extension_manager as XM
     ext = XM.find_matching_extension(goal)
     if ext: XM.run_extension(ext, context={...})
+    out = await XM.arun_extension(ext)             # from asyncio code (AsyncAgent)
 
-    XM.queue_pending(goal, code_str)
-    XM.promote_pending(idx, triggers=[...])  # user approves
+    if XM.queue_pending(goal, code_str): ...     # False: already pending/approved
+    XM.promote_pending(pending_id, triggers=[...])  # user approves
 
 Security:
 - Only runs scripts saved in extensions dir.
 - Paths normalized; no absolute injection.
 """
 from __future__ import annotations
-import json, os, subprocess, sys, time
+import hashlib, json, os, subprocess, sys, threading, time
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple
+from . import memory
+from .logger import log
+from .trigger_index import TriggerMatcher
+from .code_exec import arun_subprocess, in_pool, pool_from_config
+from .tracing import traced
 
 PKG_DIR = Path(__file__).resolve().parent
 EXT_DIR = PKG_DIR.parent / "extensions"
 EXT_DIR.mkdir(exist_ok=True)
 
+# pre-SQLite storage, migrated on first use
 INDEX_PATH = EXT_DIR / "extension_index.json"
 PENDING_PATH = EXT_DIR / "pending_extensions.json"
 
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS extensions(
+ id INTEGER PRIMARY KEY AUTOINCREMENT,
+ name TEXT NOT NULL,
+ triggers TEXT NOT NULL,
+ path TEXT NOT NULL UNIQUE,
+ code_hash TEXT,
+ goal TEXT NOT NULL DEFAULT '',
+ created_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS extensions_hash ON extensions(code_hash);
+CREATE TABLE IF NOT EXISTS pending_extensions(
+ id INTEGER PRIMARY KEY AUTOINCREMENT,
+ goal TEXT NOT NULL,
+ code TEXT NOT NULL,
+ code_hash TEXT NOT NULL UNIQUE,
+ created_ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extension_meta(
+ key TEXT PRIMARY KEY,
+ value INTEGER NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO extension_meta(key,value) VALUES('version',0);
+"""
+memory.register_schema(SCHEMA)
+
+_lock = threading.Lock()
+_migrated: set = set()   # (db path, ext dir) pairs already checked for JSON files
+_listeners: List[Callable[[Optional[Dict]], None]] = []
+
+def code_hash(code: str) -> str:
+    lines = [ln.rstrip() for ln in code.strip().splitlines()]
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+def _bump(conn):
+    """Registry changed: matchers built from an older version get rebuilt."""
+    conn.execute("UPDATE extension_meta SET value=value+1 WHERE key='version'")
+
+def add_listener(fn: Callable[[Optional[Dict]], None]):
+    """fn(ext) after an extension is promoted; fn(None) after the registry is replaced."""
+    _listeners.append(fn)
+
+def _notify(ext: Optional[Dict]):
+    for fn in list(_listeners):
+        try: fn(ext)
+        except Exception: pass
+
+def registry_version() -> int:
+    return _conn().execute("SELECT value FROM extension_meta WHERE key='version'").fetchone()[0]
+
+def _conn():
+    conn = memory.get_conn()
+    key = (str(memory.DB_PATH), str(EXT_DIR))
+    if key not in _migrated:
+        with _lock:
+            if key not in _migrated:
+                _migrate_json()
+                _migrated.add(key)
+    return conn
+
 # ------------------ persistence ------------------
 def _load_json(path: Path, default):
     if path.exists():
@@ -43,78 +113,153 @@ def _load_json(path: Path, default):
             return default
     return default
 
-def _save_json(path: Path, data):
-    path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+def _migrate_json():
+    idx, pend = _load_json(INDEX_PATH, []), _load_json(PENDING_PATH, [])
+    if not idx and not pend:
+        return
+    with memory.transaction() as conn:
+        for e in idx:
+            conn.execute("INSERT OR IGNORE INTO extensions(name,triggers,path,code_hash,created_ts) VALUES(?,?,?,?,?)",
+                         (e.get("name") or e.get("path", ""), json.dumps(e.get("triggers", [])),
+                          e.get("path", ""), _file_hash(e.get("path", "")), e.get("created_ts") or time.time()))
+        for p in pend:
+            _insert_pending(conn, p.get("goal", ""), p.get("code", ""), p.get("created_ts"))
+        _bump(conn)
+    for path in (INDEX_PATH, PENDING_PATH):
+        if path.exists():
+            os.replace(path, path.with_name(path.name + ".migrated"))
 
-def load_index() -> List[Dict]:
-    return _load_json(INDEX_PATH, [])
+def _file_hash(path: str) -> Optional[str]:
+    f = EXT_DIR / path
+    return code_hash(f.read_text(encoding="utf-8", errors="ignore")) if path and f.is_file() else None
 
-def save_index(idx: List[Dict]):
-    _save_json(INDEX_PATH, idx)
+def _row_ext(r) -> Dict:
+    return {"id": r[0], "name": r[1], "triggers": json.loads(r[2]), "path": r[3],
+            "goal": r[4], "created_ts": r[5], "code_hash": r[6]}
 
-def load_pending() -> List[Dict]:
-    return _load_json(PENDING_PATH, [])
+def load_index() -> List[Dict]:
+    rows = _conn().execute("SELECT id,name,triggers,path,goal,created_ts,code_hash "
+                           "FROM extensions ORDER BY id").fetchall()
+    return [_row_ext(r) for r in rows]
 
-def save_pending(pend: List[Dict]):
-    _save_json(PENDING_PATH, pend)
+def save_index(idx: List[Dict]):
+    """Replace the whole registry (the script files are left alone; missing code hashes are recomputed)."""
+    conn = _conn()
+    rows = [(e["name"], json.dumps(e.get("triggers", [])), e["path"], e.get("code_hash") or _file_hash(e["path"]),
+             e.get("goal", ""), e.get("created_ts") or time.time()) for e in idx]
+    with memory.transaction():
+        conn.execute("DELETE FROM extensions")
+        conn.executemany("INSERT INTO extensions(name,triggers,path,code_hash,goal,created_ts) VALUES(?,?,?,?,?,?)",
+                         rows)
+        _bump(conn)
+    _notify(None)
 
 # ------------------ queue pending ------------------
-def queue_pending(goal: str, code: str):
-    pend = load_pending()
-    pend.append({
-        "goal": goal,
-        "code": code,
-        "created_ts": time.time()
-    })
-    save_pending(pend)
+def _insert_pending(conn, goal: str, code: str, ts: Optional[float] = None) -> bool:
+    h = code_hash(code)
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO pending_extensions(goal,code,code_hash,created_ts) "
+        "SELECT ?,?,?,? WHERE NOT EXISTS (SELECT 1 FROM extensions WHERE code_hash=?)",
+        (goal, code, h, ts or time.time(), h))
+    return cur.rowcount > 0
+
+@traced("extension.queue")
+def queue_pending(goal: str, code: str) -> bool:
+    """Queue code for review; False if the same code is already pending or approved."""
+    if not code.strip():
+        return False
+    return _insert_pending(_conn(), goal, code)
 
 # ------------------ promote pending -> extension ------------------
-def promote_pending(i: int, triggers: List[str], name: Optional[str]=None) -> str:
-    pend = load_pending()
-    if i < 0 or i >= len(pend):
-        return "Invalid pending index."
-    item = pend.pop(i)
-    save_pending(pend)
-    code = item["code"]
-    goal = item["goal"]
-    if not name:
-        name = goal[:40]
-    # slug filename
-    safe = "".join(c if c.isalnum() else "_" for c in name)[:40] or "ext"
-    ext_path = EXT_DIR / f"{safe}.py"
-    ext_path.write_text(code, encoding="utf-8")
-
-    idx = load_index()
-    idx.append({
-        "name": name,
-        "triggers": triggers,
-        "path": str(ext_path.name),
-        "created_ts": time.time()
-    })
-    save_index(idx)
-    return f"Extension saved: {ext_path.name}"
+def _free_path(conn, safe: str) -> str:
+    name, n = f"{safe}.py", 1
+    while (EXT_DIR / name).exists() or conn.execute("SELECT 1 FROM extensions WHERE path=?", (name,)).fetchone():
+        n += 1; name = f"{safe}_{n}.py"
+    return name
+
+def promote_pending(pending_id: int, triggers: List[str], name: Optional[str]=None) -> str:
+    conn = _conn()
+    with memory.transaction():
+        row = conn.execute("SELECT goal, code, code_hash FROM pending_extensions WHERE id=?",
+                           (pending_id,)).fetchone()
+        if row is None:
+            return "Invalid pending id."
+        goal, code, h = row
+        name = name or goal[:40]
+        # slug filename
+        safe = "".join(c if c.isalnum() else "_" for c in name)[:40] or "ext"
+        fname = _free_path(conn, safe)
+        tmp = EXT_DIR / f".{fname}.tmp"
+        tmp.write_text(code, encoding="utf-8")
+        os.replace(tmp, EXT_DIR / fname)   # a failed commit below leaves only an unused file
+        ext_id = conn.execute("INSERT INTO extensions(name,triggers,path,code_hash,goal,created_ts) VALUES(?,?,?,?,?,?)",
+                              (name, json.dumps(triggers), fname, h, goal, time.time())).lastrowid
+        conn.execute("DELETE FROM pending_extensions WHERE id=?", (pending_id,))
+        _bump(conn)
+    _notify(get_extension(ext_id))
+    return f"Extension saved: {fname}"
+
+def delete_pending(pending_id: int) -> bool:
+    return _conn().execute("DELETE FROM pending_extensions WHERE id=?", (pending_id,)).rowcount > 0
 
 # ------------------ list extensions / pending ------------------
 def list_extensions() -> List[Dict]:
     return load_index()
 
+def get_extension(ext_id: int) -> Optional[Dict]:
+    r = _conn().execute("SELECT id,name,triggers,path,goal,created_ts,code_hash FROM extensions WHERE id=?", (ext_id,)).fetchone()
+    return _row_ext(r) if r else None
+
 def list_pending() -> List[Dict]:
-    return load_pending()
+    rows = _conn().execute("SELECT id,goal,code,created_ts FROM pending_extensions ORDER BY id").fetchall()
+    return [{"id": r[0], "goal": r[1], "code": r[2], "created_ts": r[3]} for r in rows]
 
 # ------------------ match goal to extension ------------------
+# compiled trigger automaton, rebuilt only when the registry version changes
+_matcher: Optional[Tuple[tuple, TriggerMatcher]] = None
+
+def _get_matcher() -> TriggerMatcher:
+    global _matcher
+    stamp = (str(memory.DB_PATH), registry_version())
+    m = _matcher
+    if m is None or m[0] != stamp:
+        pats = [(t, (pos, ext)) for pos, ext in enumerate(load_index())
+                for t in ext.get("triggers",[]) if t.strip()]
+        m = (stamp, TriggerMatcher(pats))
+        _matcher = m
+    return m[1]
+
+def find_matching_extensions(goal: str) -> List[Dict]:
+    """
+    All extensions with a trigger inside goal, most specific first:
+    longest matching trigger, then most triggers matched, then index order.
+    """
+    best: Dict[int, list] = {}
+    for trig, (pos, ext) in _get_matcher().find(goal):
+        b = best.setdefault(pos, [0, 0, ext])
+        b[0] = max(b[0], len(trig)); b[1] += 1
+    ranked = sorted(best.items(), key=lambda kv: (-kv[1][0], -kv[1][1], kv[0]))
+    return [b[2] for _, b in ranked]
+
+@traced("extension.match")
 def find_matching_extension(goal: str) -> Optional[Dict]:
-    g = goal.lower()
-    for ext in load_index():
-        for t in ext.get("triggers",[]):
-            if t.lower() in g:
-                return ext
-    return None
+    hits = find_matching_extensions(goal)
+    return hits[0] if hits else None
 
 # ------------------ run extension ------------------
+@traced("extension.run")
 def run_extension(ext: Dict, timeout=60) -> str:
     pyfile = EXT_DIR / ext["path"]
     if not pyfile.exists():
         return f"Extension file missing: {pyfile}"
+    pool = pool_from_config()
+    if pool is not None:
+        try:
+            return pool.run_file(str(pyfile), timeout=timeout, cwd=os.getcwd())
+        except TimeoutError as e:
+            return f"Extension run error: {e}"
+        except Exception as e:
+            log(f"Worker pool unavailable, spawning: {e}", "WARN")
     try:
         proc = subprocess.run(
             [sys.executable, str(pyfile)],
@@ -124,3 +269,19 @@ def run_extension(ext: Dict, timeout=60) -> str:
         return (proc.stdout or "") + (proc.stderr or "")
     except Exception as e:
         return f"Extension run error: {e}"
+
+@traced("extension.run")
+async def arun_extension(ext: Dict, timeout=60) -> str:
+    """run_extension() for asyncio callers; cancelling the awaiting task kills the script."""
+    pyfile = EXT_DIR / ext["path"]
+    if not pyfile.exists():
+        return f"Extension file missing: {pyfile}"
+    pool = pool_from_config()
+    if pool is not None:
+        try:
+            return await in_pool(pool.run_file, str(pyfile), timeout)
+        except TimeoutError as e:
+            return f"Extension run error: {e}"
+        except Exception as e:
+            log(f"Worker pool unavailable, spawning: {e}", "WARN")
+    return await arun_subprocess([sys.executable, str(pyfile)], timeout, "Extension run error")
@@ -0,0 +1,224 @@
+"""
+Offline intent classifier: routes paraphrases of known actions/extensions
+without the LLM.
+
+Text -> character 3/4/5-gram counts hashed into DIM buckets (L2-normalized)
+-> cosine similarity with one centroid per label ("action:<name>",
+"ext:<id>"). A goal is routed only when
+- the best score reaches cfg.intent_threshold and beats the runner-up by
+  cfg.intent_margin,
+- the label has at least cfg.intent_min_examples distinct phrases, and
+- one of those phrases covers the goal: all of its words appear in it
+  (one typo allowed per word) and leave at most one of the goal's words
+  unexplained, so "open power settings" is not open_powershell and
+  "create notes summarizing the meeting" is not create_note.
+
+Training examples:
+- built-in actions: phrases from their patterns (actions.action_examples)
+- approved extensions: triggers, name and the goal that produced them
+- memory.db goals: the last TRAIN_GOALS goals that an action or extension
+  trigger matches, labelled with that match
+
+Centroids are running sums, so a promoted extension is added without
+retraining (extension_manager listener); any other registry change
+(version counter) rebuilds the model on next use. Needs numpy.
+"""
+from __future__ import annotations
+import re, threading, zlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from . import memory
+from . import extension_manager as XM
+from .actions import action_examples, get_action, match_action
+from .config import Config, get_config
+from .tracing import span
+
+DIM = 1 << 13
+NGRAMS = (3, 4, 5)
+TRAIN_GOALS = 5000
+MAX_EXAMPLES = 64       # word sets kept per label for the coverage check
+_WORD = re.compile(r"\w+")
+# words that carry no intent ("please open ...", "can you ... now")
+_STOP = frozenset("a an the my me i to of in on for and or with please can could would you go ahead "
+                  "want just quickly now this that it up".split())
+
+def featurize(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """(bucket indices, L2-normalized weights) of text's hashed character n-grams."""
+    t = " " + " ".join(_WORD.findall(text.lower())) + " "
+    hs = [zlib.crc32(t[i:i + n].encode()) & (DIM - 1) for n in NGRAMS for i in range(len(t) - n + 1)]
+    if not hs:
+        return np.zeros(0, np.intp), np.zeros(0, np.float32)
+    idx, cnt = np.unique(np.array(hs, dtype=np.intp), return_counts=True)
+    w = cnt.astype(np.float32)
+    return idx, w / np.linalg.norm(w)
+
+def content_words(text: str) -> Tuple[str, ...]:
+    return tuple(w for w in _WORD.findall(text.lower()) if w not in _STOP)
+
+def _close(a: str, b: str) -> bool:
+    """Equal, or (both 4+ chars) one substitution, insertion/deletion or adjacent swap apart."""
+    if a == b:
+        return True
+    if min(len(a), len(b)) < 4 or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        d = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(d) == 1 or (len(d) == 2 and d[1] == d[0] + 1 and a[d[0]] == b[d[1]] and a[d[1]] == b[d[0]])
+    if len(a) > len(b): a, b = b, a
+    i = next((k for k in range(len(a)) if a[k] != b[k]), len(a))
+    return a[i:] == b[i + 1:]
+
+def covers(example: Tuple[str, ...], goal: Tuple[str, ...]) -> bool:
+    """Every word of `example` is in the goal (give or take a typo) and at most one goal word is left over."""
+    if not example or not all(any(_close(e, g) for g in goal) for e in example):
+        return False
+    left = sum(not any(_close(g, e) for e in example) for g in goal)
+    return left <= 1 and len(goal) - left > left
+
+class IntentClassifier:
+    """
+    Nearest-centroid model over hashed n-gram vectors, stored sparse: per
+    label the summed weights of the buckets it uses, and for scoring a
+    postings index (bucket -> labels, normalized weights) rebuilt after adds.
+    """
+    def __init__(self):
+        self.labels: List[str] = []
+        self._row: Dict[str, int] = {}
+        self._sums: List[Tuple[np.ndarray, np.ndarray]] = []   # per label: (buckets, summed weights)
+        self._examples: List[set] = []                          # per label: distinct content-word tuples
+        self._index: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None   # (indptr, rows, weights)
+        self._lock = threading.Lock()
+        self.ext_version: Optional[int] = None
+
+    def add(self, label: str, texts: List[str]):
+        with self._lock:
+            r = self._row.get(label)
+            if r is None:
+                r = self._row[label] = len(self.labels)
+                self.labels.append(label)
+                self._sums.append((np.zeros(0, np.intp), np.zeros(0, np.float32)))
+                self._examples.append(set())
+            idxs, ws = [self._sums[r][0]], [self._sums[r][1]]
+            for t in texts:
+                idx, w = featurize(t)
+                if not len(idx): continue
+                idxs.append(idx); ws.append(w)
+                words = content_words(t)
+                if words and len(self._examples[r]) < MAX_EXAMPLES: self._examples[r].add(words)
+            buckets, inv = np.unique(np.concatenate(idxs), return_inverse=True)
+            self._sums[r] = (buckets, np.bincount(inv, weights=np.concatenate(ws)).astype(np.float32))
+            self._index = None
+
+    def _postings(self):
+        if self._index is None:
+            rows = np.concatenate([np.full(len(b), r, np.int32) for r, (b, _) in enumerate(self._sums)] or [[]])
+            buckets = np.concatenate([b for b, _ in self._sums] or [[]]).astype(np.intp)
+            vals = np.concatenate([w / (np.linalg.norm(w) or 1.0) for _, w in self._sums] or [[]]).astype(np.float32)
+            order = np.argsort(buckets, kind="stable")
+            indptr = np.zeros(DIM + 1, np.int64)
+            np.cumsum(np.bincount(buckets, minlength=DIM), out=indptr[1:])
+            self._index = (indptr, rows[order], vals[order])
+        return self._index
+
+    def predict(self, text: str) -> Tuple[Optional[str], float, float]:
+        """(best label, its cosine score, margin over the runner-up)."""
+        idx, w = featurize(text)
+        with self._lock:
+            if not len(idx) or not self.labels:
+                return None, 0.0, 0.0
+            indptr, rows, vals = self._postings()
+            labels = self.labels
+        starts = indptr[idx]
+        lens = indptr[idx + 1] - starts
+        if not lens.sum():
+            return None, 0.0, 0.0
+        pos = np.repeat(starts - (np.cumsum(lens) - lens), lens) + np.arange(lens.sum())
+        scores = np.bincount(rows[pos], weights=vals[pos] * np.repeat(w, lens), minlength=len(labels))
+        if len(scores) == 1:
+            return labels[0], float(scores[0]), float(scores[0])
+        top2 = np.argpartition(-scores, 1)[:2]
+        a, b = sorted(top2, key=lambda i: -scores[i])
+        return labels[a], float(scores[a]), float(scores[a] - scores[b])
+
+    def support(self, label: str) -> int:
+        """Distinct training phrases behind a label."""
+        r = self._row.get(label)
+        return 0 if r is None else len(self._examples[r])
+
+    def explains(self, label: str, text: str) -> bool:
+        """Some training phrase of `label` covers `text` (see covers())."""
+        r = self._row.get(label)
+        goal = content_words(text)
+        with self._lock:
+            examples = list(self._examples[r]) if r is not None else []
+        return any(covers(ex, goal) for ex in examples)
+
+def _ext_texts(ext: Dict) -> List[str]:
+    return [t for t in ext.get("triggers", []) if t.strip()] + [ext.get("name", ""), ext.get("goal", "")]
+
+def train(cfg: Optional[Config] = None) -> IntentClassifier:
+    cfg = cfg or get_config()
+    model = IntentClassifier()
+    model.ext_version = XM.registry_version()
+    for name, phrases in action_examples().items():
+        model.add(f"action:{name}", phrases)
+    for ext in XM.list_extensions():
+        model.add(f"ext:{ext['id']}", [t for t in _ext_texts(ext) if t])
+    memory.flush()
+    goals = memory.get_conn().execute("SELECT text FROM goals ORDER BY id DESC LIMIT ?", (TRAIN_GOALS,)).fetchall()
+    for (g,) in goals:
+        hit = match_action(g, cfg)
+        if hit is not None:
+            if not hit[0].regex.groupindex: model.add(f"action:{hit[0].name}", [g])
+            continue
+        ext = XM.find_matching_extension(g)
+        if ext is not None:
+            model.add(f"ext:{ext['id']}", [g])
+    return model
+
+_model: Optional[Tuple[str, IntentClassifier]] = None   # (db path, model)
+_train_lock = threading.Lock()
+
+def get_classifier(cfg: Optional[Config] = None) -> IntentClassifier:
+    global _model
+    path = str(memory.DB_PATH)
+    m = _model
+    if m is None or m[0] != path or m[1].ext_version != XM.registry_version():
+        with _train_lock:
+            m = _model
+            if m is None or m[0] != path or m[1].ext_version != XM.registry_version():
+                with span("intent.train"):
+                    m = _model = (path, train(cfg))
+    return m[1]
+
+def _on_extension(ext: Optional[Dict]):
+    global _model
+    m = _model
+    if m is None or m[0] != str(memory.DB_PATH):
+        return
+    if ext is None:
+        _model = None          # registry replaced: retrain on next use
+        return
+    m[1].add(f"ext:{ext['id']}", [t for t in _ext_texts(ext) if t])
+    m[1].ext_version = XM.registry_version()
+
+XM.add_listener(_on_extension)
+
+def route(goal: str, cfg: Optional[Config] = None):
+    """("action", Action, score) / ("extension", ext, score) when confident, else None."""
+    cfg = cfg or get_config()
+    model = get_classifier(cfg)
+    with span("intent.classify"):
+        label, score, margin = model.predict(goal)
+    if label is None or score < cfg.intent_threshold or margin < cfg.intent_margin:
+        return None
+    if model.support(label) < cfg.intent_min_examples or not model.explains(label, goal):
+        return None
+    kind, _, key = label.partition(":")
+    if kind == "action":
+        act = get_action(key)
+        if act is None or (act.gate and not getattr(cfg, act.gate, False)):
+            return None
+        return "action", act, score
+    ext = XM.get_extension(int(key))
+    return ("extension", ext, score) if ext else None
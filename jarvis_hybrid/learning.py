@@ -0,0 +1,252 @@
+"""
+Learning Mode pipeline: map-reduce project summarization.
+
+The scanned project is cut into chunks that fit the model's context: files
+are grouped per directory (small sibling directories share a chunk), each
+chunk lists its files and includes the head of its key text files (README,
+entry points, manifests, and the largest sources). Chunks are summarized
+concurrently at background priority, then the chunk summaries are reduced,
+in rounds if they don't fit one prompt, into the project summary.
+
+Every summary (chunk or reduce step) is stored in memory.db per root, keyed
+by a hash of its prompt (for chunks, plus the size and mtime of each of
+their files, from the scan manifest), so re-learning a mostly unchanged
+project only calls the model for the chunks whose files changed. A chunk
+already summarized under another root is copied, not regenerated.
+"""
+from __future__ import annotations
+import hashlib, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from . import memory
+from .config import Config, get_config
+from .logger import log
+from .ollama_client import PRIORITY_BACKGROUND, model_generate
+from .scan import FileEntry, ProjectScan
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunk_summaries(
+ root TEXT NOT NULL,
+ hash TEXT NOT NULL,
+ label TEXT NOT NULL,
+ summary TEXT NOT NULL,
+ created_ts REAL NOT NULL,
+ used_ts REAL NOT NULL,
+ PRIMARY KEY(root, hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chunk_summaries_root ON chunk_summaries(root, used_ts);
+CREATE INDEX IF NOT EXISTS chunk_summaries_hash ON chunk_summaries(hash);
+"""
+
+def _migrate(conn):
+    # chunk_summaries used to be keyed on hash alone, so two roots sharing a
+    # chunk fought over one row and one root's prune could delete the other's
+    pk = [r[1] for r in conn.execute("PRAGMA table_info(chunk_summaries)") if r[5]]
+    if pk != ["hash"]:
+        return
+    conn.executescript(
+        "BEGIN; DROP INDEX IF EXISTS chunk_summaries_root; DROP INDEX IF EXISTS chunk_summaries_hash;"
+        " ALTER TABLE chunk_summaries RENAME TO chunk_summaries_v1;" + SCHEMA +
+        " INSERT OR IGNORE INTO chunk_summaries(root,hash,label,summary,created_ts,used_ts)"
+        " SELECT root,hash,label,summary,created_ts,used_ts FROM chunk_summaries_v1;"
+        " DROP TABLE chunk_summaries_v1; COMMIT;")
+
+memory.register_schema(SCHEMA)
+memory.register_schema(_migrate)
+
+MAP_PROMPT = """You are documenting a software project. Below is one part of it: a directory
+listing (path | kind | size) and the beginning of some files.
+Summarize in a few sentences what this part does, its main modules and how they fit together.
+
+Part: {label}
+{body}
+Summary:"""
+
+REDUCE_PROMPT = """Below are summaries of parts of one software project.
+{task}
+
+{body}
+Summary:"""
+REDUCE_FINAL = "Write an architecture summary of the whole project: purpose, main components, how they interact."
+REDUCE_STEP = "Combine them into one shorter summary that keeps every component they mention."
+
+KEY_NAMES = {"readme", "readme.md", "readme.txt", "readme.rst", "main.py", "__main__.py", "app.py",
+             "__init__.py", "setup.py", "pyproject.toml", "package.json", "cargo.toml", "go.mod",
+             "requirements.txt", "manage.py", "index.js", "index.ts", "main.go", "main.rs", "program.cs"}
+SOURCES_PER_DIR = 2        # largest text files excerpted besides the key files
+EXCERPT_MAX_FILE = 200_000 # don't excerpt text files bigger than this
+
+@dataclass
+class Chunk:
+    label: str
+    body: str
+    stamp: str = ""   # size/mtime of the chunk's files, so edits the prompt doesn't show still count
+
+    @property
+    def prompt(self) -> str:
+        return MAP_PROMPT.replace("{label}", self.label).replace("{body}", self.body)
+
+@dataclass
+class LearnResult:
+    summary: str
+    chunks: int
+    reused: int
+    generated: int
+    seconds: float
+    stored: bool = False   # saved as the project summary (not when the LLM was unavailable)
+
+def _excerpt(root: str, e: FileEntry, n: int) -> str:
+    try:
+        with open(os.path.join(root, e.path), encoding="utf-8", errors="ignore") as fh:
+            return fh.read(n)
+    except OSError:
+        return ""
+
+def _dir_text(root: str, d: str, files: List[FileEntry], excerpt_chars: int) -> str:
+    lines = [f"{e.path} | {e.kind} | {e.size} bytes" for e in files]
+    text = [e for e in files if e.kind == "text" and 0 < e.size <= EXCERPT_MAX_FILE]
+    key = [e for e in text if os.path.basename(e.path).lower() in KEY_NAMES]
+    rest = sorted((e for e in text if e not in key), key=lambda e: -e.size)[:SOURCES_PER_DIR]
+    for e in key + rest:
+        ex = _excerpt(root, e, excerpt_chars).strip()
+        if ex:
+            lines.append(f"\n--- {e.path} ---\n{ex}")
+    return "\n".join(lines)
+
+def make_chunks(root: str, entries: List[FileEntry], cfg: Config) -> List[Chunk]:
+    """Directory-ordered chunks of at most ~cfg.learn_chunk_chars characters."""
+    by_dir: Dict[str, List[FileEntry]] = {}
+    for e in sorted(entries):
+        by_dir.setdefault(e.path.rpartition("/")[0], []).append(e)
+    budget = max(1000, cfg.learn_chunk_chars)
+    chunks: List[Chunk] = []
+    labels: List[str] = []; parts: List[str] = []; stamps: List[str] = []; size = 0
+    def close():
+        nonlocal labels, parts, stamps, size
+        if parts:
+            chunks.append(Chunk(", ".join(labels[:3]) + (" ..." if len(labels) > 3 else ""), "\n\n".join(parts),
+                                ",".join(stamps)))
+        labels, parts, stamps, size = [], [], [], 0
+    for d in sorted(by_dir):
+        text = _dir_text(root, d, by_dir[d], cfg.learn_excerpt_chars)
+        stamp = _stamp(by_dir[d])
+        while len(text) > budget:          # a single huge directory: split it
+            close()
+            cut = text.rfind("\n", 0, budget)
+            cut = cut if cut > 0 else budget
+            chunks.append(Chunk(d or "/", text[:cut], stamp)); text = text[cut:].lstrip("\n")
+        if size + len(text) > budget:
+            close()
+        labels.append(d or "/"); parts.append(text); stamps.append(stamp); size += len(text)
+    close()
+    return chunks
+
+def _stamp(files: List[FileEntry]) -> str:
+    h = hashlib.sha1()
+    for e in files:
+        h.update(f"{e.path}\x00{e.size}\x00{e.mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def _hash(model: str, prompt: str, stamp: str = "") -> str:
+    return hashlib.sha1(f"{model}\x00{prompt}\x00{stamp}".encode("utf-8")).hexdigest()
+
+class _Summaries:
+    """chunk_summaries access for one run (used_ts marks rows still needed)."""
+    def __init__(self, root: str, model: str, started: float, workers: int):
+        self.root, self.model, self.started = root, model, started
+        self.workers = max(1, workers)
+        self.reused = self.generated = 0
+        self._lock = threading.Lock()
+
+    def get(self, h: str, label: str) -> Optional[str]:
+        conn = memory.get_conn()
+        row = conn.execute("SELECT summary FROM chunk_summaries WHERE root=? AND hash=?", (self.root, h)).fetchone()
+        if row:
+            conn.execute("UPDATE chunk_summaries SET used_ts=? WHERE root=? AND hash=?", (self.started, self.root, h))
+            return row[0]
+        row = conn.execute("SELECT summary FROM chunk_summaries WHERE hash=? LIMIT 1", (h,)).fetchone()
+        if row:   # same chunk under another root: copy it to this one
+            self._put(h, label, row[0])
+            return row[0]
+        return None
+
+    def _put(self, h: str, label: str, summary: str):
+        memory.get_conn().execute(
+            "INSERT OR REPLACE INTO chunk_summaries(root,hash,label,summary,created_ts,used_ts) VALUES(?,?,?,?,?,?)",
+            (self.root, h, label, summary, time.time(), self.started))
+
+    def summarize(self, label: str, prompt: str, stamp: str = "") -> str:
+        h = _hash(self.model, prompt, stamp)
+        cached = self.get(h, label)
+        if cached is not None:
+            with self._lock: self.reused += 1
+            return cached
+        out = model_generate(self.model, prompt, priority=PRIORITY_BACKGROUND).strip()
+        with self._lock: self.generated += 1
+        if out and not out.startswith("[LLM unavailable]"):
+            self._put(h, label, out)
+        return out
+
+    def prune(self) -> int:
+        """Drop this root's summaries that the current run no longer uses."""
+        return memory.get_conn().execute(
+            "DELETE FROM chunk_summaries WHERE root=? AND used_ts<?", (self.root, self.started)).rowcount
+
+def _group(blocks: List[str], budget: int) -> List[List[str]]:
+    groups: List[List[str]] = [[]]; size = 0
+    for b in blocks:
+        if groups[-1] and size + len(b) > budget:
+            groups.append([]); size = 0
+        groups[-1].append(b); size += len(b)
+    return groups
+
+def _reduce(store: _Summaries, parts: List[Tuple[str, str]], budget: int) -> str:
+    """Hierarchical reduce: merge budget-sized groups until one prompt holds everything."""
+    rnd = 0
+    while True:
+        blocks = [f"[{label}]\n{s}" for label, s in parts]
+        groups = _group(blocks, budget)
+        if len(groups) == 1 or len(groups) == len(blocks):   # fits, or can't shrink by merging
+            body = "\n\n".join(blocks)
+            return store.summarize("project", REDUCE_PROMPT.replace("{task}", REDUCE_FINAL).replace("{body}", body))
+        rnd += 1
+        def step(ig):
+            i, g = ig
+            prompt = REDUCE_PROMPT.replace("{task}", REDUCE_STEP).replace("{body}", "\n\n".join(g))
+            return (f"group {rnd}.{i}", store.summarize(f"reduce {rnd}.{i}", prompt))
+        with ThreadPoolExecutor(store.workers) as ex:
+            parts = list(ex.map(step, enumerate(groups, 1)))
+
+def learn_project(root: str, cfg: Optional[Config] = None, store_summary: bool = True,
+                  on_progress: Optional[Callable[[int, int, str], None]] = None) -> LearnResult:
+    """
+    Summarize the project at root (caller checks it is allowed, see scan.check_root).
+    on_progress(done, total, label) is called as chunks finish.
+    """
+    cfg = cfg or get_config()
+    t0 = time.perf_counter(); started = time.time()
+    sc = ProjectScan(root, cfg=cfg, stat_files=True)   # chunk stamps need current sizes/mtimes
+    entries = list(sc)
+    chunks = make_chunks(sc.root, entries, cfg)
+    store = _Summaries(sc.root, cfg.model, started, cfg.learn_workers)
+    done = 0
+    def work(c: Chunk) -> Tuple[str, str]:
+        return c.label, store.summarize(c.label, c.prompt, c.stamp)
+    parts: List[Tuple[str, str]] = []
+    with ThreadPoolExecutor(store.workers) as ex:
+        for label, s in ex.map(work, chunks):
+            parts.append((label, s)); done += 1
+            if on_progress: on_progress(done, len(chunks), label)
+    summary = _reduce(store, parts, max(1000, cfg.learn_chunk_chars)) if parts else "(empty project)"
+    store.prune()
+    failed = summary.startswith("[LLM unavailable]")
+    if store_summary and not failed:
+        memory.add_project_summary(root, summary)
+    res = LearnResult(summary, len(chunks), store.reused, store.generated, time.perf_counter() - t0,
+                      store_summary and not failed)
+    if failed:
+        log(f"Learning {root} failed: LLM unavailable; no summary stored", "ERROR")
+    else:
+        log(f"Learned {root}: {res.chunks} chunks, {res.reused} reused, {res.generated} model calls, {res.seconds:.1f}s")
+    return res
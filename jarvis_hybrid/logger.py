@@ -1,58 +1,217 @@
 """
 Jarvis Hybrid Logger
 Batched async logging -> logs/jarvis.log
+
+log() only appends a (time, level, msg, fields) record to an in-memory
+buffer; a writer thread formats and writes batches through one open file
+handle and tracks the file size itself. Past MAX_BYTES the file is renamed
+and a background thread gzips it, keeping at most `keep` archives no older
+than `max_age_days`.
+
+Format "text" (default) gives `2024-01-01 12:00:00 [INFO] msg k=v ...`;
+"json" gives one JSON object per line with the keyword fields of log()
+(e.g. batch_index=3, stage="plan", duration_ms=12.5) as keys.
+
+The buffer holds at most `max_queue` records. When full, "drop" discards new
+records (a count of dropped lines is logged later) and "block" makes log()
+wait for the writer.
 """
 from __future__ import annotations
-import queue, threading, time
+import atexit, gzip, json, shutil, threading, time
 from pathlib import Path
 from datetime import datetime
+from typing import List, Optional, Tuple
 
-LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
-LOG_DIR.mkdir(exist_ok=True)
+LOG_DIR = Path(__file__).resolve().parent.parent / "logs"   # see set_log_dir()
 LOG_FILE = LOG_DIR / "jarvis.log"
 MAX_BYTES = 5 * 1024 * 1024
 
-_q: "queue.Queue[str]" = queue.Queue()
+_settings = {"format": "text", "keep": 10, "max_age_days": 30.0, "max_queue": 100_000, "overflow": "drop"}
+
+_buf: List[Tuple[float, str, str, dict]] = []
+_lock = threading.Lock()
+_has_work = threading.Condition(_lock)
+_space = threading.Condition(_lock)
+_written = threading.Condition(_lock)
+_seq = [0, 0]        # records queued, records written
+_dropped = 0
 _echo = True
 _stop = False
 
+def set_log_dir(path) -> Path:
+    """Write logs (and default metric exports) under `path` from now on; returns the previous dir."""
+    global LOG_DIR, LOG_FILE
+    flush_logger()
+    with _lock:
+        old, LOG_DIR = LOG_DIR, Path(path)
+        LOG_FILE = LOG_DIR / "jarvis.log"     # the writer reopens on its next batch...
+        _has_work.notify()
+        # ...and closes the old file right away, so it can be deleted
+        _written.wait_for(lambda: not _sink.stale() or not _thread.is_alive(), 5)
+    return old
+
 def set_console_echo(v: bool):
     global _echo
     _echo = v
 
-def _rotate():
-    if LOG_FILE.exists() and LOG_FILE.stat().st_size > MAX_BYTES:
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        LOG_FILE.rename(LOG_FILE.with_name(f"jarvis_{ts}.log"))
+def configure_logger(fmt: Optional[str] = None, keep: Optional[int] = None,
+                     max_age_days: Optional[float] = None, max_queue: Optional[int] = None,
+                     overflow: Optional[str] = None):
+    """Change format ("text"|"json"), retention, queue bound or overflow policy ("drop"|"block")."""
+    new = {"format": fmt, "keep": keep, "max_age_days": max_age_days,
+           "max_queue": max_queue, "overflow": overflow}
+    with _lock:
+        _settings.update((k, v) for k, v in new.items() if v is not None)
+
+# ------------------ formatting (writer thread) ------------------
+_sec: Tuple[int, str] = (-1, "")
+
+def _stamp(ts: float) -> str:
+    global _sec
+    s = int(ts)
+    if s != _sec[0]:
+        _sec = (s, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s)))
+    return _sec[1]
+
+def _format_text(ts: float, level: str, msg: str, fields: dict) -> str:
+    if fields:
+        return f"{_stamp(ts)} [{level}] {msg} {' '.join([f'{k}={v}' for k, v in fields.items()])}\n"
+    return f"{_stamp(ts)} [{level}] {msg}\n"
+
+_json = json.JSONEncoder(ensure_ascii=False, default=str).encode
+
+def _format_json(ts: float, level: str, msg: str, fields: dict) -> str:
+    rec = {"ts": f"{_stamp(ts)}.{int(ts % 1 * 1000):03d}", "level": level, "msg": msg}
+    if fields: rec.update(fields)
+    return _json(rec) + "\n"
+
+# ------------------ rotation ------------------
+_archive_lock = threading.Lock()
+
+def _archive(path: Path):
+    """gzip a rotated log, then apply count/age retention (background thread)."""
+    with _archive_lock:
+        try:
+            with open(path, "rb") as src, gzip.open(f"{path}.gz", "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            path.unlink()
+        except OSError:
+            pass
+        old = sorted(path.parent.glob("jarvis_*.log.gz"), key=lambda p: p.name, reverse=True)
+        cutoff = time.time() - _settings["max_age_days"] * 86400
+        for i, p in enumerate(old):
+            try:
+                if i >= _settings["keep"] or p.stat().st_mtime < cutoff:
+                    p.unlink()
+            except OSError:
+                pass
+
+class _Sink:
+    """The open log file and its size (writer thread only; follows LOG_FILE)."""
+    def __init__(self):
+        self.fh = None
+        self.path: Optional[Path] = None
+        self.size = 0
+
+    def open(self):
+        if self.fh is not None: self.fh.close()
+        self.path = LOG_FILE
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fh = open(self.path, "ab", buffering=1 << 16)
+        self.size = self.fh.tell()
+
+    def write(self, data: bytes):
+        if self.fh is None or self.path != LOG_FILE:
+            self.open()
+        if self.size and self.size + len(data) > MAX_BYTES:
+            self.rotate()
+        self.fh.write(data)
+        self.size += len(data)
+
+    def rotate(self):
+        self.fh.close()
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        dst = self.path.with_name(f"jarvis_{ts}.log")
+        try:
+            self.path.rename(dst)
+            threading.Thread(target=_archive, args=(dst,), name="log-archive", daemon=True).start()
+        except OSError:
+            pass   # e.g. file held open elsewhere on Windows; keep appending
+        self.open()
+
+    def flush(self):
+        if self.fh is not None:
+            self.fh.flush()
+
+    def stale(self) -> bool:
+        return self.fh is not None and self.path != LOG_FILE
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close(); self.fh = None
+
+_sink = _Sink()
 
 def _writer():
-    global _stop
-    buf = []
-    last = time.time()
-    while not _stop or not _q.empty():
+    global _dropped
+    while True:
+        with _lock:
+            while not _buf and not _stop and not _sink.stale():
+                _has_work.wait()          # idle: no polling
+            batch = _buf[:]
+            del _buf[:]
+            dropped, _dropped = _dropped, 0
+            fmt = _format_json if _settings["format"] == "json" else _format_text
+            _space.notify_all()
+            if not batch and _stop:
+                return
+        if dropped:
+            batch.append((time.time(), "WARN", f"Logger queue full: dropped {dropped} messages", {}))
+        lines = [fmt(*rec) for rec in batch]
         try:
-            ln = _q.get(timeout=0.25)
-            buf.append(ln)
-        except queue.Empty:
+            if lines:
+                _sink.write("".join(lines).encode("utf-8", "ignore"))
+                _sink.flush()
+            elif _sink.stale():
+                _sink.close()             # set_log_dir(): let go of the old file now
+        except OSError:
             pass
-        if buf and (len(buf) >= 100 or time.time() - last > 0.5):
-            _rotate()
-            with open(LOG_FILE, "a", encoding="utf-8", errors="ignore") as fh:
-                fh.writelines(buf)
-            if _echo:
-                for l in buf:
-                    print(l, end="")
-            buf.clear()
-            last = time.time()
-
-_thread = threading.Thread(target=_writer, daemon=True)
+        if _echo:
+            print("".join(lines) if fmt is _format_text else "".join(_format_text(*rec) for rec in batch), end="")
+        with _lock:
+            _seq[1] += len(batch) - (1 if dropped else 0)
+            _written.notify_all()
+
+_thread = threading.Thread(target=_writer, name="logger", daemon=True)
 _thread.start()
 
-def log(msg: str, level: str="INFO"):
-    ts = time.strftime("%Y-%m-%d %H:%M:%S")
-    _q.put(f"{ts} [{level}] {msg}\n")
+def log(msg: str, level: str="INFO", **fields):
+    global _dropped
+    rec = (time.time(), level, msg, fields)
+    with _lock:
+        if len(_buf) >= _settings["max_queue"] and not _stop:
+            if _settings["overflow"] != "block":
+                _dropped += 1
+                return
+            while len(_buf) >= _settings["max_queue"] and not _stop:
+                _space.wait()
+        _buf.append(rec); _seq[0] += 1
+        if len(_buf) == 1:
+            _has_work.notify()
+
+def flush_logger(timeout: float = 5.0) -> bool:
+    """Wait until everything logged so far is written; False on timeout."""
+    with _lock:
+        target = _seq[0]
+        return _written.wait_for(lambda: _seq[1] >= target or not _thread.is_alive(), timeout)
 
 def close_logger():
+    """Write everything still queued and stop the writer."""
     global _stop
-    _stop = True
-    _thread.join(timeout=2)
+    with _lock:
+        _stop = True
+        _has_work.notify_all(); _space.notify_all()
+    _thread.join(timeout=5)
+    _sink.close()
+
+atexit.register(close_logger)
@@ -1,10 +1,24 @@
 """
 Jarvis Hybrid Memory (SQLite)
+
+Goals and project summaries are mirrored into FTS5 tables (kept in sync by
+triggers) so search() can rank by BM25 and return snippets. Queries accept
+plain words, "quoted phrases" and prefix* terms. If the SQLite build lacks
+FTS5, search falls back to a substring scan.
+
+Connections: each thread reuses one tuned connection per database file
+(WAL, synchronous=NORMAL, mmap, larger page cache, statement cache);
+schemas are applied lazily on first use. add_goal / add_project_summary are
+write-behind: rows are queued and a background thread commits them in
+batches (one transaction per batch). Every read flushes the queue first, so
+callers always see their own writes; flush() forces it. Committed summaries
+are also embedded for semantic search (vector_memory) when numpy is present.
 """
 from __future__ import annotations
-import sqlite3, time
+import atexit, re, sqlite3, threading, time
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+from .tracing import span, traced
 
 DB_PATH = Path(__file__).resolve().parent.parent / "memory.db"
 
@@ -22,38 +36,265 @@ CREATE TABLE IF NOT EXISTS project_summaries(
 );
 """
 
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS project_summaries_fts USING fts5(
+ root, summary, content='project_summaries', content_rowid='id', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS project_summaries_ai AFTER INSERT ON project_summaries BEGIN
+ INSERT INTO project_summaries_fts(rowid, root, summary) VALUES (new.id, new.root, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS project_summaries_ad AFTER DELETE ON project_summaries BEGIN
+ INSERT INTO project_summaries_fts(project_summaries_fts, rowid, root, summary) VALUES ('delete', old.id, old.root, old.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS project_summaries_au AFTER UPDATE ON project_summaries BEGIN
+ INSERT INTO project_summaries_fts(project_summaries_fts, rowid, root, summary) VALUES ('delete', old.id, old.root, old.summary);
+ INSERT INTO project_summaries_fts(rowid, root, summary) VALUES (new.id, new.root, new.summary);
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS goals_fts USING fts5(
+ text, content='goals', content_rowid='id', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS goals_ai AFTER INSERT ON goals BEGIN
+ INSERT INTO goals_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS goals_ad AFTER DELETE ON goals BEGIN
+ INSERT INTO goals_fts(goals_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS goals_au AFTER UPDATE ON goals BEGIN
+ INSERT INTO goals_fts(goals_fts, rowid, text) VALUES ('delete', old.id, old.text);
+ INSERT INTO goals_fts(rowid, text) VALUES (new.id, new.text);
+END;
+"""
+FTS_VERSION = 1   # PRAGMA user_version once the FTS tables exist and are populated
+
+HAS_FTS = True
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",   # 256 MB
+    "PRAGMA cache_size=-16000",     # ~16 MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+WRITE_BATCH = 256        # flush once this many writes are queued
+WRITE_DELAY = 0.2        # ...or after this many seconds
+WRITE_RETRY = 1.0        # wait before retrying a failed flush (e.g. database is locked)
+
+# ------------------ connections ------------------
+_schemas: List[Callable[[sqlite3.Connection], None]] = []
+_applied: Dict[str, int] = {}      # db path -> number of _schemas applied
+_schema_lock = threading.Lock()
+_local = threading.local()
+
 def connect():
+    """A new, untuned connection the caller must close (prefer get_conn())."""
     return sqlite3.connect(DB_PATH)
 
+def register_schema(sql_or_fn):
+    """Add DDL (script string or fn(conn)) applied lazily to every database opened."""
+    fn = sql_or_fn if callable(sql_or_fn) else (lambda c, sql=sql_or_fn: c.executescript(sql))
+    with _schema_lock:
+        _schemas.append(fn)
+
+def _ensure_schema(conn: sqlite3.Connection, path: str):
+    if _applied.get(path, 0) == len(_schemas):
+        return
+    with _schema_lock:
+        for fn in _schemas[_applied.get(path, 0):]:
+            fn(conn)
+        _applied[path] = len(_schemas)
+
+def get_conn() -> sqlite3.Connection:
+    """This thread's shared connection to DB_PATH (autocommit; do not close)."""
+    path = str(DB_PATH)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, isolation_level=None, cached_statements=256, check_same_thread=False)
+        for p in PRAGMAS:
+            conn.execute(p)
+        conns[path] = conn
+    _ensure_schema(conn, path)
+    return conn
+
+class transaction:
+    """with memory.transaction() as conn: ... -> BEGIN IMMEDIATE / COMMIT (ROLLBACK on error)."""
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn = get_conn()
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+    def __exit__(self, et, ev, tb):
+        self.conn.execute("ROLLBACK" if et else "COMMIT")
+        return False
+
+def _migrate(conn):
+    global HAS_FTS
+    cur = conn.cursor()
+    if cur.execute("PRAGMA user_version").fetchone()[0] >= FTS_VERSION:
+        return
+    try:
+        cur.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError:   # SQLite built without FTS5
+        HAS_FTS = False
+        return
+    # index rows written before the FTS tables existed
+    cur.execute("BEGIN")
+    cur.execute("INSERT INTO project_summaries_fts(project_summaries_fts) VALUES('rebuild')")
+    cur.execute("INSERT INTO goals_fts(goals_fts) VALUES('rebuild')")
+    cur.execute(f"PRAGMA user_version={FTS_VERSION}")
+    cur.execute("COMMIT")
+
+register_schema(SCHEMA)
+register_schema(_migrate)
+
 def init_db():
-    conn = connect(); cur = conn.cursor(); cur.executescript(SCHEMA); conn.commit(); conn.close()
-init_db()
+    """Create tables now (they are otherwise created on first use)."""
+    get_conn()
+
+# ------------------ write-behind ------------------
+_wq: List[Tuple[str, tuple, Optional[Callable[[int], None]]]] = []
+_wq_lock = threading.Lock()        # guards _wq
+_flush_lock = threading.Lock()     # one batch commit at a time, in queue order
+_has_work = threading.Event()
+_full = threading.Event()
+_flusher: threading.Thread | None = None
+
+def _enqueue(sql: str, params: tuple, on_commit: Optional[Callable[[int], None]] = None):
+    """Queue a write; on_commit(lastrowid) runs after its batch commits."""
+    global _flusher
+    with _wq_lock:
+        _wq.append((sql, params, on_commit))
+        n = len(_wq)
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="memory-writer", daemon=True)
+            _flusher.start()
+    _has_work.set()
+    if n >= WRITE_BATCH:
+        _full.set()
+
+def _flush_loop():
+    while True:
+        _has_work.wait()             # idle until something is queued
+        _full.wait(WRITE_DELAY)      # then give the batch a moment to grow
+        _has_work.clear(); _full.clear()
+        try:
+            flush()
+        except Exception:
+            time.sleep(WRITE_RETRY)   # rows went back to the queue; retry them
+            _has_work.set()
+
+def flush():
+    """Commit all queued writes in one transaction."""
+    with _flush_lock:
+        with _wq_lock:
+            batch = _wq[:]
+            del _wq[:]
+        if not batch:
+            return
+        done = []
+        try:
+            with span("memory.flush", rows=len(batch)), transaction() as conn:
+                for sql, params, on_commit in batch:
+                    rowid = conn.execute(sql, params).lastrowid
+                    if on_commit: done.append((on_commit, rowid))
+        except Exception:
+            with _wq_lock:
+                _wq[:0] = batch
+            raise
+    for fn, rowid in done:
+        try: fn(rowid)
+        except Exception: pass
+
+atexit.register(lambda: flush())
+
+SQL_ADD_GOAL = "INSERT INTO goals(text,ts) VALUES(?,?)"
+SQL_ADD_SUMMARY = "INSERT INTO project_summaries(root,summary,ts) VALUES(?,?,?)"
 
 def add_goal(text: str):
-    conn = connect(); cur = conn.cursor()
-    cur.execute("INSERT INTO goals(text,ts) VALUES(?,?)",(text,time.time()))
-    conn.commit(); conn.close()
+    _enqueue(SQL_ADD_GOAL, (text, time.time()))
 
 def list_goals():
-    conn = connect(); cur = conn.cursor()
-    cur.execute("SELECT id,text,ts FROM goals ORDER BY id DESC")
-    rows = cur.fetchall(); conn.close(); return rows
+    flush()
+    return get_conn().execute("SELECT id,text,ts FROM goals ORDER BY id DESC").fetchall()
 
 def clear_goals():
-    conn = connect(); cur = conn.cursor()
-    cur.execute("DELETE FROM goals"); conn.commit(); conn.close()
+    flush()
+    get_conn().execute("DELETE FROM goals")
+
+def _index_vector(summary: str):
+    try:
+        from .vector_memory import index_summary_async   # optional: needs numpy
+    except ImportError:
+        return None
+    return lambda rowid: index_summary_async(rowid, summary)
 
 def add_project_summary(root: str, summary: str):
-    conn = connect(); cur = conn.cursor()
-    cur.execute("INSERT INTO project_summaries(root,summary,ts) VALUES(?,?,?)",(root,summary,time.time()))
-    conn.commit(); conn.close()
+    _enqueue(SQL_ADD_SUMMARY, (root, summary, time.time()), _index_vector(summary))
+
+# ------------------ search ------------------
+_TERM = re.compile(r'"([^"]+)"|(\S+)')
+
+def fts_query(q: str) -> str:
+    """User text -> FTS5 MATCH expression: words ANDed, "phrases" kept, trailing * = prefix."""
+    parts = []
+    for phrase, word in _TERM.findall(q):
+        if phrase:
+            parts.append('"' + phrase.replace('"', "") + '"')
+            continue
+        toks = re.findall(r"\w+", word)
+        parts += [f'"{t}"' for t in toks]
+        if toks and word.endswith("*"):
+            parts[-1] += "*"
+    return " ".join(parts)
+
+def _scan_search(q: str, topk: int) -> List[Dict]:
+    rows = get_conn().execute("SELECT id,root,summary,ts FROM project_summaries").fetchall()
+    ql = q.lower(); hits = []
+    for id_, root, txt, ts in rows:
+        n = txt.lower().count(ql)
+        if n:
+            hits.append({"kind": "summary", "id": id_, "root": root, "text": txt,
+                         "snippet": txt[:120], "score": float(n), "ts": ts})
+    hits.sort(key=lambda h: -h["score"])
+    for n, h in enumerate(hits, 1): h["rank"] = n
+    return hits[:topk]
+
+@traced("memory.search")
+def search(q: str, topk: int = 10, kinds: Tuple[str, ...] = ("summary", "goal")) -> List[Dict]:
+    """
+    Ranked hits across project summaries and goals:
+    [{kind, id, root, text, snippet, score, rank, ts}]. score = -bm25 and
+    rank (1 = best) are within the hit's kind: bm25 from different FTS tables
+    isn't comparable, so kinds are interleaved by rank (ties in kinds order).
+    """
+    flush()
+    if not HAS_FTS:
+        return _scan_search(q, topk) if "summary" in kinds else []
+    expr = fts_query(q)
+    if not expr:
+        return []
+    cur = get_conn().cursor(); hits = []
+    try:
+        if "summary" in kinds:
+            cur.execute(
+                "SELECT s.id, s.root, s.summary, s.ts, bm25(project_summaries_fts), "
+                "snippet(project_summaries_fts, 1, '[', ']', '...', 16) "
+                "FROM project_summaries_fts JOIN project_summaries s ON s.id = project_summaries_fts.rowid "
+                "WHERE project_summaries_fts MATCH ? ORDER BY rank LIMIT ?", (expr, topk))
+            hits += [{"kind": "summary", "id": r[0], "root": r[1], "text": r[2], "ts": r[3],
+                      "score": -r[4], "rank": n, "snippet": r[5]} for n, r in enumerate(cur.fetchall(), 1)]
+        if "goal" in kinds:
+            cur.execute(
+                "SELECT g.id, g.text, g.ts, bm25(goals_fts), snippet(goals_fts, 0, '[', ']', '...', 16) "
+                "FROM goals_fts JOIN goals g ON g.id = goals_fts.rowid "
+                "WHERE goals_fts MATCH ? ORDER BY rank LIMIT ?", (expr, topk))
+            hits += [{"kind": "goal", "id": r[0], "root": None, "text": r[1], "ts": r[2],
+                      "score": -r[3], "rank": n, "snippet": r[4]} for n, r in enumerate(cur.fetchall(), 1)]
+    finally:
+        cur.close()
+    hits.sort(key=lambda h: (h["rank"], kinds.index(h["kind"])))
+    return hits[:topk]
 
 def search_text(q: str, topk=10):
-    conn = connect(); cur = conn.cursor()
-    cur.execute("SELECT summary FROM project_summaries")
-    rows = cur.fetchall(); conn.close()
-    ql = q.lower(); scored=[]
-    for (txt,) in rows:
-        scored.append((txt.lower().count(ql), txt))
-    scored.sort(reverse=True, key=lambda x:x[0])
-    return scored[:topk]
+    """[(score, summary)] for project summaries, best first."""
+    return [(h["score"], h["text"]) for h in search(q, topk, kinds=("summary",))]
@@ -0,0 +1,80 @@
+"""
+Two-tier planner routing statistics.
+
+The planner can ask a small classifier model for intent + target first and
+call the code model only when code is needed ("escalation"). That pays off
+while
+
+    classifier latency + escalation rate * code latency < code latency
+
+ModelRouter keeps an EWMA of each model's call latency and of the
+escalation rate, and use_classifier() applies that test. Until both models
+have been measured it says yes; when it says no, every EXPLORE_EVERY-th
+goal still goes through the classifier so its numbers stay current.
+"""
+from __future__ import annotations
+import threading, time
+from contextlib import contextmanager
+from typing import Dict
+
+ALPHA = 0.2          # EWMA weight of the newest sample
+EXPLORE_EVERY = 20
+
+class ModelRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lat: Dict[str, float] = {}        # model -> EWMA seconds per call
+        self._tiers: Dict[str, dict] = {}       # tier -> counters
+        self._escalation = 0.5
+        self._escalations = 0
+        self._skipped = 0
+
+    def _observe(self, tier: str, model: str, secs: float):
+        with self._lock:
+            old = self._lat.get(model)
+            self._lat[model] = secs if old is None else old + ALPHA * (secs - old)
+            t = self._tiers.setdefault(tier, {"model": model, "calls": 0, "total_s": 0.0, "max_s": 0.0})
+            t["model"] = model; t["calls"] += 1; t["total_s"] += secs; t["max_s"] = max(t["max_s"], secs)
+
+    @contextmanager
+    def timed(self, tier: str, model: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(tier, model, time.perf_counter() - t0)
+
+    def escalated(self, yes: bool):
+        with self._lock:
+            self._escalation += ALPHA * ((1.0 if yes else 0.0) - self._escalation)
+            self._escalations += yes
+
+    def use_classifier(self, classifier: str, code: str) -> bool:
+        with self._lock:
+            lc, lk = self._lat.get(classifier), self._lat.get(code)
+            if lc is None or lk is None or lc + self._escalation * lk < lk:
+                self._skipped = 0
+                return True
+            self._skipped += 1
+            if self._skipped >= EXPLORE_EVERY:
+                self._skipped = 0
+                return True
+            return False
+
+    def stats(self) -> dict:
+        """Per tier: model, calls, avg/ewma/max ms; plus escalation rate."""
+        with self._lock:
+            out = {}
+            for tier, t in self._tiers.items():
+                n = t["calls"]
+                out[tier] = {"model": t["model"], "calls": n,
+                             "avg_ms": t["total_s"] / n * 1e3 if n else 0.0,
+                             "ewma_ms": self._lat.get(t["model"], 0.0) * 1e3, "max_ms": t["max_s"] * 1e3}
+            return {"tiers": out, "escalation_rate": self._escalation, "escalations": self._escalations}
+
+    def reset(self):
+        with self._lock:
+            self._lat.clear(); self._tiers.clear()
+            self._escalation = 0.5; self._escalations = 0; self._skipped = 0
+
+router = ModelRouter()
@@ -1,50 +1,549 @@
 """
 Ollama Client - HTTP first, CLI fallback
+
+model_generate()        -> full completion as one string (blocking)
+model_generate_stream() -> generator of text chunks as the model produces them
+
+HTTP calls share one OllamaHTTPClient: a thread-safe pool of keep-alive
+http.client connections (size/timeouts from config.json).
+
+Every request first takes a slot from the RequestScheduler, which caps
+requests in flight to the local server (cfg.ollama_max_inflight) and admits
+waiters by priority: PRIORITY_CHAT > PRIORITY_PLANNER > PRIORITY_BACKGROUND.
+The asyncio client (async_ollama) takes its slots from the same scheduler,
+so the cap and the priority order hold across threads and event loops.
+Identical concurrent model_generate() calls (and planner JSON requests, via
+arun) are coalesced into one request, queued at the most urgent priority
+among them.
 """
 from __future__ import annotations
-import json, shutil, subprocess
-from typing import Optional
-from urllib import request, error
+import asyncio, contextlib, contextvars, heapq, http.client, itertools, json, shutil, socket, subprocess, tempfile, threading, time
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from urllib.parse import urlsplit
+from .config import load_config
 from .logger import log
+from . import tracing
+
+# errors that mean a pooled keep-alive socket went stale before we used it
+_STALE = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+          BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+class OllamaHTTPClient:
+    """
+    Pool of persistent HTTP/1.1 connections to one Ollama server.
+    At most `pool_size` requests are in flight; idle sockets are reused.
+    Safe to share between threads.
+    """
+    def __init__(self, base_url: str = "http://localhost:11434", pool_size: int = 4,
+                 timeout: float = 600.0, connect_timeout: float = 5.0):
+        u = urlsplit(base_url)
+        self.host = u.hostname or "localhost"
+        self.port = u.port or 11434
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+
+    # ---------- pool ----------
+    def _acquire(self, timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        self._slots.acquire()
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        reused = conn is not None
+        try:
+            if conn is None:
+                conn = self._connect()
+            conn.sock.settimeout(timeout)
+        except BaseException:
+            self._slots.release()
+            raise
+        return conn, reused
+
+    def _connect(self) -> http.client.HTTPConnection:
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _release(self, conn: http.client.HTTPConnection, keep: bool):
+        if keep:
+            with self._lock:
+                self._idle.append(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for c in idle: c.close()
+
+    def _send(self, path: str, payload: dict, timeout: Optional[float]):
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        t = self.timeout if timeout is None else timeout
+        conn, reused = self._acquire(t)
+        try:
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+            except _STALE:
+                if not reused: raise
+                # server dropped the idle socket; retry once on a fresh one
+                conn.close()
+                conn = self._connect(); conn.sock.settimeout(t)
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+        except BaseException:
+            self._release(conn, False)
+            raise
+        if resp.status != 200:
+            detail = resp.read().decode("utf-8", "ignore")[:200]
+            self._release(conn, not resp.will_close)
+            raise RuntimeError(f"HTTP {resp.status} from Ollama {path}: {detail}")
+        return conn, resp
+
+    # ---------- requests ----------
+    def post_json(self, path: str, payload: dict, timeout: Optional[float] = None) -> dict:
+        conn, resp = self._send(path, payload, timeout)
+        try:
+            raw = resp.read()
+        except BaseException:
+            self._release(conn, False)
+            raise
+        self._release(conn, not resp.will_close)
+        return json.loads(raw.decode("utf-8", "ignore"))
+
+    def stream_json(self, path: str, payload: dict, timeout: Optional[float] = None) -> Iterator[dict]:
+        """Yield one dict per NDJSON line. Closing the generator early drops the socket."""
+        conn, resp = self._send(path, payload, timeout)
+        keep = False
+        try:
+            for line in resp:
+                line = line.strip()
+                if not line: continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+            keep = not resp.will_close
+        finally:
+            self._release(conn, keep)
+
+    def generate(self, model: str, prompt: str, timeout: Optional[float] = None) -> str:
+        obj = self.post_json("/api/generate", {"model": model, "prompt": prompt, "stream": False}, timeout)
+        if obj.get("error"):
+            raise RuntimeError(obj["error"])
+        return obj.get("response","")
+
+    def generate_stream(self, model: str, prompt: str, timeout: Optional[float] = None,
+                        extra: Optional[dict] = None, meta: Optional[dict] = None) -> Iterator[str]:
+        """
+        extra: additional request fields (e.g. "context"); meta: filled with the
+        final chunk's fields (context, prompt_eval_count, eval_count, durations).
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True, **(extra or {})}
+        for obj in self.stream_json("/api/generate", payload, timeout):
+            if obj.get("error"):
+                raise RuntimeError(obj["error"])
+            tok = obj.get("response","")
+            if tok: yield tok
+            if obj.get("done") and meta is not None:
+                meta.update((k, v) for k, v in obj.items() if k not in ("response", "model"))
+
+    def embed(self, model: str, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """One vector per text via /api/embed (falls back to the older /api/embeddings)."""
+        try:
+            obj = self.post_json("/api/embed", {"model": model, "input": texts}, timeout)
+            if obj.get("error"): raise RuntimeError(obj["error"])
+            return obj["embeddings"]
+        except RuntimeError as e:
+            if "HTTP 404" not in str(e): raise
+        out = []
+        for t in texts:
+            obj = self.post_json("/api/embeddings", {"model": model, "prompt": t}, timeout)
+            if obj.get("error"): raise RuntimeError(obj["error"])
+            out.append(obj["embedding"])
+        return out
+
+_client: Optional[OllamaHTTPClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> OllamaHTTPClient:
+    """Shared client, built from config.json on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                cfg = load_config()
+                _client = OllamaHTTPClient(cfg.ollama_url, cfg.ollama_pool_size, cfg.ollama_timeout)
+    return _client
+
+def configure_client(base_url: Optional[str] = None, pool_size: Optional[int] = None,
+                     timeout: Optional[float] = None) -> OllamaHTTPClient:
+    """Replace the shared client (e.g. after settings change). Unset args come from config."""
+    global _client
+    cfg = load_config()
+    new = OllamaHTTPClient(base_url or cfg.ollama_url, pool_size or cfg.ollama_pool_size,
+                           cfg.ollama_timeout if timeout is None else timeout)
+    with _client_lock:
+        old, _client = _client, new
+    if old: old.close()
+    return new
+
+# ------------------ request scheduling ------------------
+PRIORITY_CHAT, PRIORITY_PLANNER, PRIORITY_BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_PLANNER: "planner", PRIORITY_BACKGROUND: "background"}
+
+R = TypeVar("R")
+
+class _Flight:
+    def __init__(self, priority: int):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.priority = priority          # most urgent caller sharing this flight
+        self.ticket: Optional[_Ticket] = None
+        self.wakers: List[Callable[[], bool]] = []   # coroutines waiting for the result
+
+    def outcome(self):
+        if self.error is not None: raise self.error
+        return self.result
+
+# a leader that stopped for these reasons leaves its followers to try again
+_ABANDONED = (asyncio.CancelledError, KeyboardInterrupt, GeneratorExit)
+
+# the run()/arun() flight this thread or task is leading; its first slot is the flight's ticket
+_leading: contextvars.ContextVar[Optional[_Flight]] = contextvars.ContextVar("jarvis_leading_flight", default=None)
+
+class _Ticket:
+    """A waiter in the admission heap; its priority rises if a more urgent caller coalesces onto it."""
+    __slots__ = ("priority", "seq", "waiting", "wake")
+    def __init__(self, priority: int, seq: int, wake: Optional[Callable[[], bool]] = None):
+        self.priority, self.seq, self.waiting, self.wake = priority, seq, True, wake
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+def _grant(fut: "asyncio.Future"):
+    if not fut.done(): fut.set_result(None)
+
+def _waker(loop: asyncio.AbstractEventLoop, fut: "asyncio.Future") -> Callable[[], bool]:
+    def wake() -> bool:
+        try:
+            loop.call_soon_threadsafe(_grant, fut)
+            return True
+        except RuntimeError:   # loop closed: nobody left to take the slot
+            return False
+    return wake
+
+class RequestScheduler:
+    """
+    Admits at most max_inflight requests at once, lowest priority value first,
+    FIFO within a class. Threads take slots with slot(), coroutines on any
+    event loop with aslot(); both wait in the same queue.
+    """
+    def __init__(self, max_inflight: int = 2):
+        self.max_inflight = max(1, int(max_inflight))
+        self._cv = threading.Condition()
+        self._waiting: List[_Ticket] = []   # heap
+        self._seq = itertools.count()
+        self._inflight = 0
+        self._flights: Dict[tuple, _Flight] = {}
+        self._stats: Dict[int, dict] = {}
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+    def _stat(self, priority: int) -> dict:
+        return self._stats.setdefault(priority, {"requests": 0, "coalesced": 0, "wait_total": 0.0, "wait_max": 0.0})
+
+    def _enqueue(self, priority: int, wake: Optional[Callable[[], bool]] = None) -> _Ticket:
+        # caller holds _cv
+        fl = _leading.get()
+        if fl is not None and fl.ticket is None:
+            ticket = fl.ticket = _Ticket(min(priority, fl.priority), next(self._seq), wake)
+        else:
+            ticket = _Ticket(priority, next(self._seq), wake)
+        heapq.heappush(self._waiting, ticket)
+        self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        # caller holds _cv: hand free slots to the best waiters
+        granted = False
+        while self._waiting and self._inflight < self.max_inflight:
+            t = heapq.heappop(self._waiting)
+            t.waiting = False
+            if t.wake is not None and not t.wake():
+                continue
+            self._inflight += 1
+            granted = True
+        if granted: self._cv.notify_all()
+
+    def _withdraw(self, ticket: _Ticket):
+        # caller holds _cv: a waiter gave up (Ctrl+C, task cancelled)
+        if ticket.waiting:
+            self._waiting.remove(ticket); heapq.heapify(self._waiting)
+            ticket.waiting = False
+        else:
+            self._release()
+
+    def _release(self):
+        self._inflight -= 1
+        self._dispatch()
+
+    def _admitted(self, priority: int, t0: float):
+        waited = time.perf_counter() - t0
+        tracing.record("llm.queue_wait", waited, priority=PRIORITY_NAMES.get(priority, str(priority)))
+        with self._cv:
+            st = self._stat(priority)
+            st["requests"] += 1; st["wait_total"] += waited; st["wait_max"] = max(st["wait_max"], waited)
+
+    @contextlib.contextmanager
+    def slot(self, priority: int = PRIORITY_PLANNER):
+        t0 = time.perf_counter()
+        with self._cv:
+            ticket = self._enqueue(priority)
+            try:
+                while ticket.waiting:
+                    self._cv.wait()
+            except BaseException:
+                self._withdraw(ticket)
+                raise
+        self._admitted(priority, t0)
+        try:
+            yield
+        finally:
+            with self._cv:
+                self._release()
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, priority: int = PRIORITY_PLANNER):
+        """slot() for a coroutine: waits without blocking its event loop."""
+        t0 = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._cv:
+            ticket = self._enqueue(priority, _waker(loop, fut))
+        try:
+            await fut
+        except BaseException:
+            with self._cv:
+                self._withdraw(ticket)
+            raise
+        self._admitted(priority, t0)
+        try:
+            yield
+        finally:
+            with self._cv:
+                self._release()
+
+    def _join(self, key: tuple, priority: int) -> Tuple[_Flight, bool]:
+        """The flight for key and whether the caller leads it."""
+        with self._cv:
+            fl = self._flights.get(key)
+            if fl is None:
+                fl = self._flights[key] = _Flight(priority)
+                return fl, True
+            self._stat(priority)["coalesced"] += 1
+            if priority < fl.priority:
+                fl.priority = priority
+                t = fl.ticket
+                if t is not None and t.waiting and priority < t.priority:
+                    t.priority = priority
+                    heapq.heapify(self._waiting)
+            return fl, False
+
+    def _land(self, key: tuple, fl: _Flight):
+        with self._cv:
+            self._flights.pop(key, None)
+            fl.done.set()
+            wakers, fl.wakers = fl.wakers, []
+        for w in wakers: w()
+
+    def run(self, key: tuple, priority: int, fn: Callable[[], R], hold_slot: bool = True) -> R:
+        """
+        Run fn in a slot; concurrent calls with the same key share one run and
+        its result. A caller that joins with a more urgent priority raises the
+        leader's place in the queue. hold_slot=False: fn takes its own slot().
+        """
+        while True:
+            fl, leader = self._join(key, priority)
+            if leader: break
+            fl.done.wait()
+            if not isinstance(fl.error, _ABANDONED): return fl.outcome()
+        tok = _leading.set(fl)
+        try:
+            if hold_slot:
+                with self.slot(priority):
+                    fl.result = fn()
+            else:
+                fl.result = fn()
+            return fl.result
+        except BaseException as e:
+            fl.error = e
+            raise
+        finally:
+            _leading.reset(tok)
+            self._land(key, fl)
+
+    async def arun(self, key: tuple, priority: int, fn: Callable[[], Awaitable[R]]) -> R:
+        """run() for a coroutine function that takes its own aslot(); shares flights with run()."""
+        while True:
+            fl, leader = self._join(key, priority)
+            if leader: break
+            loop = asyncio.get_running_loop()
+            fut = loop.create_future()
+            with self._cv:
+                if not fl.done.is_set(): fl.wakers.append(_waker(loop, fut))
+                else: fut.set_result(None)
+            await fut
+            if not isinstance(fl.error, _ABANDONED): return fl.outcome()
+        tok = _leading.set(fl)
+        try:
+            fl.result = await fn()
+            return fl.result
+        except BaseException as e:
+            fl.error = e
+            raise
+        finally:
+            _leading.reset(tok)
+            self._land(key, fl)
+
+    def stats(self) -> dict:
+        with self._cv:
+            return format_stats(self._stats, [t.priority for t in self._waiting], self._inflight, self.max_inflight)
+
+def format_stats(stats: Dict[int, dict], waiting: List[int], inflight: int, max_inflight: int) -> dict:
+    """Scheduler counters (per priority) and the priorities now waiting -> stats() dict."""
+    queued: Dict[int, int] = {}
+    for p in waiting: queued[p] = queued.get(p, 0) + 1
+    by = {}
+    for p, st in stats.items():
+        n = st["requests"]
+        by[PRIORITY_NAMES.get(p, str(p))] = {
+            "requests": n, "coalesced": st["coalesced"], "queued": queued.get(p, 0),
+            "wait_avg_ms": st["wait_total"] / n * 1e3 if n else 0.0,
+            "wait_max_ms": st["wait_max"] * 1e3,
+        }
+    return {"inflight": inflight, "max_inflight": max_inflight, "queued": len(waiting), "by_priority": by}
+
+_scheduler: Optional[RequestScheduler] = None
+
+def get_scheduler() -> RequestScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _client_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler(load_config().ollama_max_inflight)
+    return _scheduler
+
+def scheduler_stats() -> dict:
+    """Queue depth, in-flight count and wait times per priority class."""
+    return get_scheduler().stats()
+
+def _ollama_http_stream(model: str, prompt: str, extra: Optional[dict] = None,
+                        meta: Optional[dict] = None) -> Iterator[str]:
+    """Yield response tokens from Ollama's NDJSON stream. Raises on transport errors."""
+    yield from get_client().generate_stream(model, prompt, extra=extra, meta=meta)
 
 def _ollama_http(model: str, prompt: str) -> Optional[str]:
-    data = json.dumps({"model": model, "prompt": prompt, "stream": False}).encode("utf-8")
-    req = request.Request(OLLAMA_URL, data=data, headers={"Content-Type":"application/json"})
     try:
-        with request.urlopen(req, timeout=600) as resp:
-            body = resp.read().decode("utf-8","ignore")
-        try:
-            obj = json.loads(body)
-            return obj.get("response","").strip()
-        except Exception:
-            return body.strip()
+        return get_client().generate(model, prompt).strip()
     except Exception as e:
         log(f"Ollama HTTP failed: {e}","WARN")
         return None
 
-def _ollama_cli(model: str, prompt: str) -> Optional[str]:
+def _ollama_cli_stream(model: str, prompt: str, extra: Optional[dict] = None,
+                       meta: Optional[dict] = None) -> Iterator[str]:
+    """Yield `ollama run` stdout line by line. Raises if the CLI is missing or fails."""
     if not shutil.which("ollama"):
-        log("Ollama CLI not found.","WARN")
-        return None
-    try:
-        res = subprocess.run(
-            ["ollama","run",model,prompt],
-            capture_output=True, text=True, check=True,
+        raise FileNotFoundError("Ollama CLI not found.")
+    fmt = ["--format", extra["format"]] if extra and extra.get("format") else []
+    # stderr (progress spinner) goes to a file: an unread pipe could fill and stall the CLI
+    with tempfile.TemporaryFile() as errf:
+        proc = subprocess.Popen(
+            ["ollama","run",*fmt,model,prompt],
+            stdout=subprocess.PIPE, stderr=errf, text=True,
             encoding="utf-8", errors="ignore"
         )
-        return res.stdout.strip()
+        try:
+            for line in proc.stdout:
+                yield line
+            if proc.wait() != 0:
+                errf.seek(0)
+                raise subprocess.CalledProcessError(proc.returncode, "ollama run",
+                                                    stderr=errf.read().decode("utf-8", "ignore"))
+        finally:
+            if proc.poll() is None:
+                proc.kill(); proc.wait()
+
+def _ollama_cli(model: str, prompt: str) -> Optional[str]:
+    try:
+        return "".join(_ollama_cli_stream(model, prompt)).strip()
+    except FileNotFoundError as e:
+        log(str(e),"WARN")
+        return None
     except Exception as e:
         log(f"Ollama CLI error: {e}","ERROR")
         return None
 
-def model_generate(model: str, prompt: str) -> str:
-    log(f"Ollama prompt -> {model} ({len(prompt)} chars)")
-    out = _ollama_http(model, prompt)
-    if out is None:
-        out = _ollama_cli(model, prompt)
-    if out is None:
-        out = "[LLM unavailable]"
-    log(f"Ollama response {len(out)} chars")
-    return out
+def model_generate_stream(model: str, prompt: str, priority: int = PRIORITY_CHAT,
+                          context: Optional[List[int]] = None, meta: Optional[dict] = None,
+                          fmt: Optional[str] = None, cli_prompt: Optional[Callable[[], str]] = None) -> Iterator[str]:
+    """
+    Stream a completion: HTTP first, CLI fallback, "[LLM unavailable]" last.
+    A backend is only abandoned if it fails before producing its first chunk;
+    a failure mid-stream ends the stream with what was already yielded.
+    The scheduler slot is held until the stream ends or is closed.
+
+    context: Ollama's token context from a previous response, so the server
+    reuses it instead of re-evaluating history (HTTP only; the CLI ignores
+    it; cli_prompt, if given, builds the self-contained prompt it gets
+    instead). meta, if given, receives the final chunk's fields; "context" is
+    only present when the HTTP backend answered. fmt="json" selects Ollama's
+    JSON output mode. Closing the generator early cancels the generation.
+    """
+    extra = {k: v for k, v in (("context", context), ("format", fmt)) if v} or None
+    with get_scheduler().slot(priority), \
+            tracing.span("llm.stream", model=model, prompt_chars=len(prompt)) as sp:
+        log(f"Ollama prompt -> {model} ({len(prompt)} chars, stream)")
+        n = 0
+        for name, backend in (("HTTP", _ollama_http_stream), ("CLI", _ollama_cli_stream)):
+            try:
+                if name == "CLI" and cli_prompt is not None: prompt = cli_prompt()
+                for tok in backend(model, prompt, extra, meta):
+                    n += len(tok)
+                    yield tok
+            except GeneratorExit:
+                log(f"Ollama response {n} chars (stream, stopped early)")
+                sp.set(backend=name.lower(), response_chars=n, stopped="early")
+                raise
+            except Exception as e:
+                log(f"Ollama {name} stream failed: {e}", "WARN")
+                if not n: continue
+            log(f"Ollama response {n} chars (stream)")
+            sp.set(backend=name.lower(), response_chars=n)
+            return
+        sp.set(backend="none")
+    yield "[LLM unavailable]"
+
+def _generate(model: str, prompt: str) -> str:
+    with tracing.span("llm.generate", model=model, prompt_chars=len(prompt)) as sp:
+        log(f"Ollama prompt -> {model} ({len(prompt)} chars)")
+        out, backend = _ollama_http(model, prompt), "http"
+        if out is None:
+            out, backend = _ollama_cli(model, prompt), "cli"
+        if out is None:
+            out, backend = "[LLM unavailable]", "none"
+        log(f"Ollama response {len(out)} chars")
+        sp.set(backend=backend, response_chars=len(out))
+        return out
+
+def model_generate(model: str, prompt: str, priority: int = PRIORITY_PLANNER) -> str:
+    return get_scheduler().run((model, prompt), priority, lambda: _generate(model, prompt))
+
+def model_embed(model: str, texts: List[str], priority: int = PRIORITY_BACKGROUND) -> List[List[float]]:
+    """Embedding vectors for texts (HTTP only; raises if Ollama is unreachable)."""
+    with get_scheduler().slot(priority), tracing.span("llm.embed", model=model, texts=len(texts)):
+        return get_client().embed(model, texts)
@@ -0,0 +1,109 @@
+"""
+Planner result cache (SQLite, stored in memory.db)
+
+Key = producing model + hash of the prompt template it answered + normalized
+goal (lower-cased, punctuation and whitespace folded), so "Check disk
+space!" and "check  disk space" share an entry and editing a template
+invalidates the plans it produced. Lookups try each (model, template) that
+may have planned the goal (classifier tier first, see plan_sources()).
+Entries expire after a TTL and the table is trimmed to the most recently
+used N rows (LRU). Only plans that parsed and ran cleanly should be put().
+"""
+from __future__ import annotations
+import hashlib, json, re, threading, time
+from typing import Dict, List, Optional, Sequence, Tuple
+from . import memory
+from .planner import BATCH_PROMPT_TEMPLATE, CLASSIFY_PROMPT, PROMPT_TEMPLATE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plan_cache(
+ key TEXT PRIMARY KEY,
+ model TEXT NOT NULL,
+ goal TEXT NOT NULL,
+ plan TEXT NOT NULL,
+ created_ts REAL NOT NULL,
+ used_ts REAL NOT NULL,
+ hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS plan_cache_used ON plan_cache(used_ts);
+"""
+
+memory.register_schema(SCHEMA)
+
+_stats: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_lock = threading.Lock()
+
+def _count(name: str, n: int = 1):
+    with _lock:
+        _stats[name] += n
+
+def normalize_goal(goal: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", goal.lower()).split())
+
+_hashes: Dict[str, str] = {}
+
+def template_hash(template: str) -> str:
+    h = _hashes.get(template)
+    if h is None:
+        h = _hashes[template] = hashlib.sha1(template.encode("utf-8")).hexdigest()[:12]
+    return h
+
+def cache_key(goal: str, model: str, template: str) -> str:
+    raw = f"{model}\x00{template_hash(template)}\x00{normalize_goal(goal)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def plan_sources(cfg) -> List[Tuple[str, str]]:
+    """(model, prompt template) pairs whose plans may be cached for cfg, in lookup order."""
+    code = cfg.code_model or cfg.model
+    return [(m, t) for m, t in ((cfg.classifier_model, CLASSIFY_PROMPT), (code, PROMPT_TEMPLATE),
+                                (code, BATCH_PROMPT_TEMPLATE)) if m]
+
+def _lookup(conn, goal: str, sources: Sequence[Tuple[str, str]]):
+    """(key, plan, created_ts) of the first source with an entry, or None."""
+    keys = [cache_key(goal, m, t) for m, t in sources]
+    rows = dict((r[0], r[1:]) for r in conn.execute(
+        f"SELECT key,plan,created_ts FROM plan_cache WHERE key IN ({','.join('?' * len(keys))})", keys))
+    return next(((k, *rows[k]) for k in keys if k in rows), None)
+
+def get(goal: str, sources: Sequence[Tuple[str, str]], ttl: float) -> Optional[dict]:
+    now = time.time()
+    conn = memory.get_conn()
+    row = _lookup(conn, goal, sources)
+    if row and ttl > 0 and now - row[2] > ttl:
+        conn.execute("DELETE FROM plan_cache WHERE key=?", (row[0],))
+        _count("evictions"); row = None
+    if row is None:
+        _count("misses"); return None
+    conn.execute("UPDATE plan_cache SET used_ts=?, hits=hits+1 WHERE key=?", (now, row[0]))
+    _count("hits")
+    return json.loads(row[1])
+
+def contains(goal: str, sources: Sequence[Tuple[str, str]], ttl: float) -> bool:
+    """get() would hit (no stats or LRU update)."""
+    row = _lookup(memory.get_conn(), goal, sources)
+    return row is not None and (ttl <= 0 or time.time() - row[2] <= ttl)
+
+def put(goal: str, model: str, template: str, plan: dict, max_entries: int):
+    """Cache plan under the model and prompt template that produced it."""
+    now = time.time()
+    with memory.transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO plan_cache(key,model,goal,plan,created_ts,used_ts,hits) VALUES(?,?,?,?,?,?,0)",
+            (cache_key(goal, model, template), model, normalize_goal(goal), json.dumps(plan), now, now))
+        evicted = 0
+        if max_entries > 0:
+            evicted = conn.execute(
+                "DELETE FROM plan_cache WHERE key IN "
+                "(SELECT key FROM plan_cache ORDER BY used_ts DESC LIMIT -1 OFFSET ?)", (max_entries,)).rowcount
+    if evicted > 0: _count("evictions", evicted)
+    _count("stores")
+
+def purge() -> int:
+    return memory.get_conn().execute("DELETE FROM plan_cache").rowcount
+
+def stats() -> Dict[str, int]:
+    n = memory.get_conn().execute("SELECT COUNT(*) FROM plan_cache").fetchone()[0]
+    with _lock:
+        out = dict(_stats)
+    out["entries"] = n
+    return out
@@ -1,9 +1,43 @@
 """
 Planner - interpret user goal into structured plan.
+
+Plans are requested in Ollama's JSON mode and streamed through
+ObjectScanner; generation is cancelled as soon as the top-level object
+closes, so trailing text is neither generated nor parsed. The object is
+checked against the plan schema (validate_plan). Only output with no
+complete, decodable object is retried (PLAN_RETRIES). Identical requests
+in flight at once (the same goal twice, a prefetch and its goal) share one
+stream through the scheduler, unless the caller streams tokens to the user.
+
+aroute_plan() is what the agent calls for a single goal. With
+cfg.classifier_model set, a small model first answers intent + target
+(CLASSIFY_PROMPT); the code model (cfg.code_model, default cfg.model) is
+called only when the intent needs code or can't be run directly
+(actions.intent_runnable). model_router decides per call whether the
+classifier is paying for itself.
+
+aplan_batch() plans several goals with one request: the goals are numbered in
+a single prompt (the instructions are sent once) and the model returns
+{"plans": [...]}, matched to goals by "id" (by position only for an
+id-less list of the right length). Batches are cut to BATCH_MAX_CHARS of
+prompt; a reply without a usable list is retried as two halves, and goals
+whose element is missing or invalid are planned one by one.
+
+The implementation is asyncio (async_ollama streams), as AsyncAgent uses
+it: atry_plan(), aclassify(), aroute_plan(), aplan_batch(). try_plan(),
+plan(), classify(), route_plan() and plan_batch() run those on the agent's
+event loop (agent.run_sync) for blocking callers.
 """
 from __future__ import annotations
 import json
-from .ollama_client import model_generate
+from typing import Callable, List, Optional, Tuple
+from . import async_ollama
+from .ollama_client import PRIORITY_PLANNER, get_scheduler
+from .actions import intent_runnable
+from .config import Config, get_config
+from .logger import log
+from .model_router import router
+from .tracing import traced
 
 PROMPT_TEMPLATE = """You are an automation agent on Windows.
 Classify the user goal and return JSON:
@@ -16,11 +50,257 @@ Goal: {goal}
 Return ONLY JSON.
 """
 
-def plan(goal: str, model: str) -> dict:
-    prompt = PROMPT_TEMPLATE.format(goal=goal)
-    out = model_generate(model, prompt)
+INTENTS = ("open_url", "open_app", "create_file", "read_file", "system_info", "python", "other")
+CODE_INTENTS = ("python", "other")   # always need the code model
+
+CLASSIFY_PROMPT = """Classify the user goal for an automation agent on Windows.
+Return JSON:
+{
+ "intent": "open_url|open_app|create_file|read_file|system_info|python|other",
+ "target": "URL, app name or file path the goal refers to, or null"
+}
+Use "python" for anything that needs code to be written.
+Goal: {goal}
+Return ONLY JSON.
+"""
+PLAN_RETRIES = 1   # extra attempts when the output holds no valid JSON object
+
+BATCH_PROMPT_TEMPLATE = """You are an automation agent on Windows.
+Classify each numbered user goal below and return a JSON object whose
+"plans" list has exactly one entry per goal, in the same order:
+{"plans": [
+ {"id": 1,
+  "intent": "open_url|open_app|create_file|read_file|system_info|python|other",
+  "target": "string or null",
+  "python_code": "optional python code to achieve goal if needed"}
+]}
+Goals:
+{goals}
+Return ONLY JSON.
+"""
+
+BATCH_MAX_CHARS = 4000   # prompt budget per batch request
+
+def fallback_plan(goal: str) -> dict:
+    return {"intent":"other","target":goal,"python_code":""}
+
+class ObjectScanner:
+    """Incremental brace matcher: feed() text until it returns the first complete top-level {...}."""
+    def __init__(self):
+        self.buf: List[str] = []
+        self._chars = 0
+        self._start = -1    # offset of the opening brace
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        base = self._chars
+        self.buf.append(chunk); self._chars += len(chunk)
+        for i, ch in enumerate(chunk):
+            if self._in_str:
+                if self._esc: self._esc = False
+                elif ch == "\\": self._esc = True
+                elif ch == '"': self._in_str = False
+            elif ch == '"':
+                if self._depth: self._in_str = True
+            elif ch == "{":
+                if not self._depth: self._start = base + i
+                self._depth += 1
+            elif ch == "}" and self._depth:
+                self._depth -= 1
+                if not self._depth:
+                    return "".join(self.buf)[self._start:base + i + 1]
+        return None
+
+    def text(self) -> str:
+        return "".join(self.buf)
+
+def validate_plan(obj) -> Optional[dict]:
+    """
+    The plan schema: intent a string (one not in INTENTS becomes "other"),
+    target str or null, python_code str (may be absent). None otherwise.
+    """
+    if not isinstance(obj, dict):
+        return None
+    intent = obj.get("intent")
+    target = obj.get("target")
+    code = obj.get("python_code")
+    if not isinstance(intent, str) or not isinstance(target, (str, type(None))) \
+            or not isinstance(code, (str, type(None))):
+        return None
+    return {"intent": intent if intent in INTENTS else "other", "target": target, "python_code": code or ""}
+
+async def _stream_object(model: str, prompt: str, priority: int,
+                         on_token: Optional[Callable[[str], None]] = None) -> Optional[str]:
+    """
+    Text of the first JSON object in the reply; the stream is closed right
+    after it. Identical concurrent requests share one stream unless the
+    caller wants the tokens. Raises ConnectionError when no backend answered.
+    """
+    if on_token is None:
+        return await get_scheduler().arun(("json", model, prompt), priority,
+                                          lambda: _scan_stream(model, prompt, priority, None))
+    return await _scan_stream(model, prompt, priority, on_token)
+
+async def _scan_stream(model: str, prompt: str, priority: int,
+                       on_token: Optional[Callable[[str], None]]) -> Optional[str]:
+    sc = ObjectScanner()
+    gen = async_ollama.model_generate_stream(model, prompt, priority=priority, fmt="json")
     try:
-        start = out.index("{")
-        return json.loads(out[start:])
-    except Exception:
-        return {"intent":"other","target":goal,"python_code":""}
+        async for tok in gen:
+            if on_token: on_token(tok)
+            obj = sc.feed(tok)
+            if obj is not None:
+                return obj
+    finally:
+        await gen.aclose()
+    if sc.text().startswith("[LLM unavailable]"):
+        raise ConnectionError("LLM unavailable")
+    return None
+
+async def _request_json(model: str, prompt: str, priority: int,
+                        on_token: Optional[Callable[[str], None]] = None):
+    """Decoded first JSON object of the reply, retried only when none could be decoded (ConnectionError passes)."""
+    for attempt in range(1 + PLAN_RETRIES):
+        text = await _stream_object(model, prompt, priority, on_token)
+        if text is not None:
+            try:
+                return json.loads(text)
+            except ValueError:
+                pass
+        if attempt < PLAN_RETRIES:
+            log("Planner output was not valid JSON; retrying", "WARN")
+    return None
+
+@traced("planner.plan")
+async def atry_plan(goal: str, model: str, on_token: Optional[Callable[[str], None]] = None,
+                    priority: int = PRIORITY_PLANNER) -> Optional[dict]:
+    """The plan for goal, or None when the model output isn't a valid plan object."""
+    try:
+        return validate_plan(await _request_json(model, PROMPT_TEMPLATE.replace("{goal}", goal), priority, on_token))
+    except ConnectionError:
+        return None
+
+@traced("planner.classify")
+async def aclassify(goal: str, model: str, priority: int = PRIORITY_PLANNER) -> Optional[dict]:
+    """Intent + target only (python_code ""), from a small model."""
+    try:
+        return validate_plan(await _request_json(model, CLASSIFY_PROMPT.replace("{goal}", goal), priority))
+    except ConnectionError:
+        return None
+
+def _settled(pl: Optional[dict], cfg: Config) -> bool:
+    """A classifier answer that needs no code model."""
+    return pl is not None and pl["intent"] not in CODE_INTENTS and intent_runnable(pl, cfg)
+
+async def aroute(goal: str, cfg: Optional[Config] = None, on_token: Optional[Callable[[str], None]] = None,
+                 priority: int = PRIORITY_PLANNER) -> Tuple[Optional[dict], str, str]:
+    """aroute_plan() plus the model and prompt template whose answer was used."""
+    cfg = cfg or get_config()
+    code_model = cfg.code_model or cfg.model
+    cls = cfg.classifier_model
+    if cls and cls != code_model and router.use_classifier(cls, code_model):
+        with router.timed("classifier", cls):
+            pl = await aclassify(goal, cls, priority)
+        done = _settled(pl, cfg)
+        router.escalated(not done)
+        if done:
+            return pl, cls, CLASSIFY_PROMPT
+    with router.timed("code", code_model):
+        return await atry_plan(goal, code_model, on_token, priority), code_model, PROMPT_TEMPLATE
+
+async def aroute_plan(goal: str, cfg: Optional[Config] = None, on_token: Optional[Callable[[str], None]] = None,
+                      priority: int = PRIORITY_PLANNER) -> Optional[dict]:
+    """atry_plan() through the classifier tier when one is configured and worth it."""
+    return (await aroute(goal, cfg, on_token, priority))[0]
+
+def _batch_prompt(goals: List[str]) -> str:
+    lines = "\n".join(f"{i}. {' '.join(g.split())}" for i, g in enumerate(goals, 1))
+    return BATCH_PROMPT_TEMPLATE.replace("{goals}", lines)
+
+def _plan_id(pl, n: int) -> Optional[int]:
+    k = pl.get("id") if isinstance(pl, dict) else None
+    if isinstance(k, str) and k.strip().isdigit(): k = int(k)
+    return k - 1 if isinstance(k, int) and not isinstance(k, bool) and 1 <= k <= n else None
+
+def _parse_batch(obj, n: int) -> Optional[List[Optional[dict]]]:
+    """
+    Plans by "id"; by position only when the list has exactly n entries and
+    none carries an id. Goals left without a plan are None (planned alone
+    by the caller); None if the reply has no plan list.
+    """
+    arr = obj.get("plans") if isinstance(obj, dict) else None
+    if not isinstance(arr, list):
+        return None
+    plans: List[Optional[dict]] = [None] * n
+    by_id = any(isinstance(pl, dict) and "id" in pl for pl in arr)
+    if not by_id and len(arr) != n:
+        return plans   # can't tell which goal an entry answers
+    for pos, pl in enumerate(arr):
+        k = _plan_id(pl, n) if by_id else pos
+        if k is not None and plans[k] is None:
+            plans[k] = validate_plan(pl)
+    return plans
+
+def _split(goals: List[str], max_chars: int, max_goals: int) -> List[List[str]]:
+    base = len(BATCH_PROMPT_TEMPLATE)
+    out, cur, size = [], [], base
+    for g in goals:
+        n = len(g) + 6
+        if cur and (size + n > max_chars or len(cur) >= max_goals):
+            out.append(cur); cur, size = [], base
+        cur.append(g); size += n
+    if cur: out.append(cur)
+    return out
+
+@traced("planner.plan_batch")
+async def _plan_chunk(goals: List[str], model: str, priority: int) -> List[Tuple[Optional[dict], str]]:
+    """(plan, prompt template it came from) per goal."""
+    if len(goals) == 1:
+        return [(await atry_plan(goals[0], model, priority=priority), PROMPT_TEMPLATE)]
+    try:
+        plans = _parse_batch(await _request_json(model, _batch_prompt(goals), priority), len(goals))
+    except ConnectionError:   # no model to split for
+        return [(None, BATCH_PROMPT_TEMPLATE)] * len(goals)
+    if plans is None:   # no usable list (e.g. cut off mid-way): smaller batches
+        half = len(goals) // 2
+        return await _plan_chunk(goals[:half], model, priority) + await _plan_chunk(goals[half:], model, priority)
+    return [(pl, BATCH_PROMPT_TEMPLATE) if pl is not None else (await atry_plan(g, model, priority=priority), PROMPT_TEMPLATE)
+            for g, pl in zip(goals, plans)]
+
+async def aplan_batch(goals: List[str], model: str, priority: int = PRIORITY_PLANNER,
+                      max_goals: int = 8, max_chars: int = BATCH_MAX_CHARS,
+                      templates: Optional[List[str]] = None) -> List[Optional[dict]]:
+    """
+    atry_plan() for each goal, using as few requests as the prompt budget
+    allows. templates, if given, receives the prompt template of each plan.
+    """
+    out: List[Tuple[Optional[dict], str]] = []
+    for chunk in _split(goals, max_chars, max(1, max_goals)):
+        out.extend(await _plan_chunk(chunk, model, priority))
+    if templates is not None: templates.extend(t for _, t in out)
+    return [pl for pl, _ in out]
+
+# ------------------ blocking front ends ------------------
+def _run(coro):
+    from .agent import run_sync   # the agent's event loop; agent imports this module
+    return run_sync(coro)
+
+def try_plan(goal: str, model: str, on_token: Optional[Callable[[str], None]] = None,
+             priority: int = PRIORITY_PLANNER) -> Optional[dict]:
+    return _run(atry_plan(goal, model, on_token, priority))
+
+def plan(goal: str, model: str, on_token: Optional[Callable[[str], None]] = None) -> dict:
+    return try_plan(goal, model, on_token) or fallback_plan(goal)
+
+def classify(goal: str, model: str, priority: int = PRIORITY_PLANNER) -> Optional[dict]:
+    return _run(aclassify(goal, model, priority))
+
+def route_plan(goal: str, cfg: Optional[Config] = None, on_token: Optional[Callable[[str], None]] = None,
+               priority: int = PRIORITY_PLANNER) -> Optional[dict]:
+    return _run(aroute_plan(goal, cfg, on_token, priority))
+
+def plan_batch(goals: List[str], model: str, priority: int = PRIORITY_PLANNER,
+               max_goals: int = 8, max_chars: int = BATCH_MAX_CHARS) -> List[Optional[dict]]:
+    return _run(aplan_batch(goals, model, priority, max_goals, max_chars))
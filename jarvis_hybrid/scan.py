@@ -1,36 +1,236 @@
 """
 Fast scan for Learning Mode.
+
+ProjectScan walks a root with os.scandir, listing directories in parallel on
+a thread pool, and yields FileEntry tuples as directories complete. The
+result is kept as a manifest in memory.db (scan_files / scan_dirs). On a
+rescan, a directory whose mtime is unchanged is not listed again: its files
+come from the manifest and only its subdirectories are stat'ed. Adding,
+removing or renaming an entry changes the directory's mtime, so the file set
+stays exact; in-place edits to a file in an unchanged directory are only
+seen with stat_files=True (its known files are stat'ed, still no listing)
+or deep=True (everything is listed). After iteration, .added / .removed /
+.changed hold the differences from the previous scan.
+
+Names (or relative paths) matching any fnmatch pattern in cfg.scan_ignore
+are skipped.
 """
 from __future__ import annotations
-import os
+import fnmatch, hashlib, os, queue, re, time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from .config import load_config
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from . import memory
+from .config import Config, get_config, resolved_roots
 from .logger import log
 
 TEXT_EXT = {".py",".md",".txt",".json",".yaml",".yml",".ini",".cfg",".toml",".xml",".html",".js",".css",".ts",".csv",".sql",".java",".cs",".cpp",".c",".hpp",".h",".go",".rs",".php",".ps1",".bat",".sh"}
+TEXT_MAX_BYTES = 5_000_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scan_roots(
+ root TEXT PRIMARY KEY,
+ ignore_hash TEXT NOT NULL,
+ ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scan_dirs(
+ root TEXT NOT NULL,
+ path TEXT NOT NULL,
+ mtime_ns INTEGER NOT NULL,
+ PRIMARY KEY(root, path)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS scan_files(
+ root TEXT NOT NULL,
+ path TEXT NOT NULL,
+ size INTEGER NOT NULL,
+ mtime_ns INTEGER NOT NULL,
+ kind TEXT NOT NULL,
+ PRIMARY KEY(root, path)
+) WITHOUT ROWID;
+"""
+
+memory.register_schema(SCHEMA)
+
+class FileEntry(NamedTuple):
+    path: str        # relative to the root, "/"-separated
+    size: int
+    mtime_ns: int
+    kind: str        # "text" | "binary"
+
+def file_kind(name: str, size: int) -> str:
+    return "text" if os.path.splitext(name)[1].lower() in TEXT_EXT and size < TEXT_MAX_BYTES else "binary"
+
+def _ignore_regex(patterns: List[str]) -> "re.Pattern[str]":
+    return re.compile("|".join(fnmatch.translate(os.path.normcase(p)) for p in patterns) or "(?!)")
+
+def _parent(rel: str) -> str:
+    return rel.rpartition("/")[0]
+
+class ProjectScan:
+    """Iterate to scan; summary counts and diffs are filled in when iteration ends."""
+    def __init__(self, root: str, deep: bool = False, cfg: Optional[Config] = None, stat_files: bool = False):
+        cfg = cfg or get_config()
+        self.root = str(Path(root).resolve())
+        self.deep = deep
+        self.stat_files = stat_files
+        self.workers = max(1, int(cfg.scan_workers))
+        self._ignore = _ignore_regex(list(cfg.scan_ignore))
+        self._ignore_hash = hashlib.sha1("\0".join(cfg.scan_ignore).encode("utf-8")).hexdigest()[:12]
+        self.added: List[FileEntry] = []
+        self.removed: List[str] = []
+        self.changed: List[FileEntry] = []
+        self.files = 0
+        self.dirs_listed = 0
+        self.dirs_reused = 0
+        self.seconds = 0.0
+        self.first_scan = True
+        self._prev_dirs: Dict[str, int] = {}
+        self._prev_files: Dict[str, FileEntry] = {}
+        self._files_by_dir: Dict[str, List[FileEntry]] = {}
+        self._subdirs: Dict[str, List[str]] = {}
 
-def scan_project_fast(root_path: str) -> str:
-    cfg = load_config()
+    # -------- manifest --------
+    def _load(self):
+        conn = memory.get_conn()
+        row = conn.execute("SELECT ignore_hash FROM scan_roots WHERE root=?", (self.root,)).fetchone()
+        if row is None or row[0] != self._ignore_hash:
+            return   # never scanned, or ignore rules changed: list everything
+        self.first_scan = False
+        self._prev_dirs = dict(conn.execute("SELECT path, mtime_ns FROM scan_dirs WHERE root=?", (self.root,)))
+        for d in self._prev_dirs:
+            if d: self._subdirs.setdefault(_parent(d), []).append(d)
+        for path, size, mt, kind in conn.execute(
+                "SELECT path, size, mtime_ns, kind FROM scan_files WHERE root=?", (self.root,)):
+            e = self._prev_files[path] = FileEntry(path, size, mt, kind)
+            self._files_by_dir.setdefault(_parent(path), []).append(e)
+
+    def _save(self, dirs: Dict[str, int]):
+        gone_dirs = [(self.root, d) for d in self._prev_dirs if d not in dirs]
+        new_dirs = [(self.root, d, m) for d, m in dirs.items() if self._prev_dirs.get(d) != m]
+        with memory.transaction() as conn:
+            if self.first_scan:
+                conn.execute("DELETE FROM scan_files WHERE root=?", (self.root,))
+                conn.execute("DELETE FROM scan_dirs WHERE root=?", (self.root,))
+            conn.executemany("DELETE FROM scan_dirs WHERE root=? AND path=?", gone_dirs)
+            conn.executemany("INSERT OR REPLACE INTO scan_dirs(root,path,mtime_ns) VALUES(?,?,?)", new_dirs)
+            conn.executemany("DELETE FROM scan_files WHERE root=? AND path=?",
+                             [(self.root, p) for p in self.removed])
+            conn.executemany("INSERT OR REPLACE INTO scan_files(root,path,size,mtime_ns,kind) VALUES(?,?,?,?,?)",
+                             [(self.root,) + tuple(e) for e in self.added + self.changed])
+            conn.execute("INSERT OR REPLACE INTO scan_roots(root,ignore_hash,ts) VALUES(?,?,?)",
+                         (self.root, self._ignore_hash, time.time()))
+
+    # -------- walking (pool threads) --------
+    def _abs(self, rel: str) -> str:
+        return os.path.join(self.root, rel) if rel else self.root
+
+    def _list_dir(self, rel: str, mtime: int) -> Tuple[str, int, List[FileEntry], List[Tuple[str, int]], bool]:
+        if not self.deep and self._prev_dirs.get(rel) == mtime:
+            subdirs = []
+            for d in self._subdirs.get(rel, ()):
+                try: subdirs.append((d, os.stat(self._abs(d)).st_mtime_ns))
+                except OSError: pass
+            files = self._files_by_dir.get(rel, [])
+            if self.stat_files:
+                files = [f for f in map(self._restat, files) if f is not None]
+            return rel, mtime, files, subdirs, True
+        files, subdirs = [], []
+        prefix = rel + "/" if rel else ""
+        try:
+            it = os.scandir(self._abs(rel))
+        except OSError as e:
+            log(f"Scan: cannot list {self._abs(rel)}: {e}", "WARN")
+            return rel, mtime, files, subdirs, False
+        with it:
+            for ent in it:
+                child = prefix + ent.name
+                if self._ignore.match(os.path.normcase(ent.name)) or self._ignore.match(os.path.normcase(child)):
+                    continue
+                try:
+                    if ent.is_dir(follow_symlinks=False):
+                        subdirs.append((child, ent.stat(follow_symlinks=False).st_mtime_ns))
+                    elif ent.is_file():
+                        st = ent.stat()
+                        files.append(FileEntry(child, st.st_size, st.st_mtime_ns, file_kind(ent.name, st.st_size)))
+                except OSError:
+                    continue
+        return rel, mtime, files, subdirs, False
+
+    def _restat(self, e: FileEntry) -> Optional[FileEntry]:
+        try:
+            st = os.stat(self._abs(e.path))
+        except OSError:
+            return None
+        if st.st_size == e.size and st.st_mtime_ns == e.mtime_ns:
+            return e
+        return FileEntry(e.path, st.st_size, st.st_mtime_ns, file_kind(e.path, st.st_size))
+
+    def __iter__(self) -> Iterator[FileEntry]:
+        t0 = time.perf_counter()
+        self._load()
+        root_mtime = os.stat(self.root).st_mtime_ns
+        results: "queue.Queue" = queue.Queue()
+        def visit(rel: str, mtime: int):
+            try: results.put(self._list_dir(rel, mtime))
+            except BaseException as e: results.put(e)
+        dirs: Dict[str, int] = {}
+        seen = set()
+        prev = self._prev_files
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="scan") as ex:
+            ex.submit(visit, "", root_mtime); outstanding = 1
+            while outstanding:
+                r = results.get(); outstanding -= 1
+                if isinstance(r, BaseException):
+                    raise r
+                rel, mtime, files, subdirs, reused = r
+                dirs[rel] = mtime
+                if reused: self.dirs_reused += 1
+                else: self.dirs_listed += 1
+                for d, m in subdirs:
+                    ex.submit(visit, d, m); outstanding += 1
+                for e in files:
+                    seen.add(e.path)
+                    if not reused or self.stat_files:
+                        old = prev.get(e.path)
+                        if old is None: self.added.append(e)
+                        elif old != e: self.changed.append(e)
+                    yield e
+        self.files = len(seen)
+        self.removed = [p for p in prev if p not in seen]
+        self._save(dirs)
+        self.seconds = time.perf_counter() - t0
+
+    def summary(self) -> str:
+        s = f"{self.files} files in {self.seconds:.2f}s ({self.dirs_listed} dirs listed, {self.dirs_reused} unchanged)"
+        if not self.first_scan:
+            s += f"; {len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed"
+        return s
+
+def check_root(root_path: str) -> Optional[str]:
+    """Error message if root_path cannot be scanned, else None."""
     root = Path(root_path)
-    if not root.exists():
+    if not root.is_dir():
         return f"Path not found: {root_path}"
-    allowed = any(str(root).lower().startswith(str(Path(ar)).lower()) for ar in cfg.allowed_roots)
-    if not allowed:
+    rp = str(root.resolve()).lower()
+    if not any(rp.startswith(ar) for ar in resolved_roots()):
         return f"Path not allowed: {root_path}"
-    listing=[]
-    for dirpath, dirs, files in os.walk(root):
-        # ignore hidden dirs and heavy known names
-        dirs[:] = [d for d in dirs if d not in ("node_modules",".git","__pycache__", "dist","build",".venv","venv","env")]
-        for fn in files:
-            p = Path(dirpath)/fn
-            try:
-                size = p.stat().st_size
-            except Exception:
-                continue
-            kind = "binary"
-            if p.suffix.lower() in TEXT_EXT and size < 5_000_000:
-                kind = "text"
-            rel = p.relative_to(root)
-            listing.append(f"{rel} | {kind} | {size} bytes")
-            # no DB indexing here; done in learning_mode
-    return "\n".join(listing[:5000])
+    return None
+
+def scan_project(root_path: str, deep: bool = False) -> Iterator[str]:
+    """'rel | kind | size bytes' lines, produced while the scan runs."""
+    err = check_root(root_path)
+    if err:
+        yield err; return
+    for e in ProjectScan(root_path, deep):
+        yield f"{e.path} | {e.kind} | {e.size} bytes"
+
+def scan_project_fast(root_path: str, max_entries: int = 5000) -> str:
+    """Listing as one string (first max_entries lines, with a note when cut)."""
+    err = check_root(root_path)
+    if err:
+        return err
+    entries = sorted(ProjectScan(root_path))   # stable order for the prompt
+    lines = [f"{e.path} | {e.kind} | {e.size} bytes" for e in entries[:max_entries]]
+    if len(entries) > max_entries:
+        lines.append(f"... ({len(entries) - max_entries} more files not listed)")
+    return "\n".join(lines)
@@ -0,0 +1,440 @@
+"""
+Jarvis Hybrid daemon: one warm process serving a local HTTP/JSON API.
+
+    python -m jarvis_hybrid.server [--host 127.0.0.1] [--port 8765] [--unix PATH]
+
+    GET  /health                                   queue depth, Ollama scheduler stats
+    POST /goals    {"goals": [...], "stream"?}     run goals -> {"log": [...]}
+    POST /chat     {"message", "session"?, "stream"?}   -> {"session", "answer"}
+    GET  /memory/search?q=...&k=10                 memory.search hits
+    GET  /extensions                               approved extensions
+    GET  /extensions/pending                       pending extensions
+    POST /extensions/approve {"id", "triggers"?, "name"?}
+
+"stream": true answers with NDJSON lines ({"log": ...} / {"token": ...},
+then a final {"done": true, ...}). A client that disconnects mid-stream
+cancels its goals or chat turn.
+
+Requests wait on a bounded queue (cfg.server_queue) for one of
+cfg.server_workers handler tasks; a full queue answers 503 at once
+(/health skips the queue). DB,
+config, extension index, intent model, worker pool and Ollama keep-alive
+connections are loaded once and shared by every client.
+
+/goals runs generated code, so only local, non-browser clients get in:
+- every request needs "Authorization: Bearer <token>". The token is
+  cfg.server_token, or if that is empty a fresh one per run, written to
+  server.token (mode 0600) next to config.json and removed on exit;
+- requests with an Origin header (a web page) are refused, as is a Host
+  other than localhost / the listen address (DNS rebinding);
+- POST bodies must be Content-Type: application/json, which a page can't
+  send without a CORS preflight.
+"""
+from __future__ import annotations
+import argparse, asyncio, hmac, json, os, secrets, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from . import async_ollama, config, memory, ollama_client, tracing
+from . import extension_manager as XM
+from .async_agent import AsyncAgent
+from .chat import ChatSession
+from .code_exec import pool_from_config
+from .config import Config, load_config
+from .logger import close_logger, configure_logger, log, set_console_echo
+
+MAX_BODY = 1 << 20
+KEEPALIVE_S = 60.0          # idle keep-alive connections are closed after this
+MAX_SESSIONS = 100          # chat sessions kept in memory (LRU)
+LOCAL_HOSTS = {"localhost", "127.0.0.1", "::1"}
+_REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 415: "Unsupported Media Type",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+class HTTPError(Exception):
+    def __init__(self, status: int, msg: str):
+        super().__init__(msg)
+        self.status = status
+
+class _Request:
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        u = urlsplit(target)
+        self.method, self.path, self.headers, self.body = method, u.path.rstrip("/") or "/", headers, body
+        self.query = {k: v[-1] for k, v in parse_qs(u.query).items()}
+
+    def json(self) -> dict:
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "body must be a JSON object")
+        return data
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+async def _read_request(r: asyncio.StreamReader) -> Optional[_Request]:
+    line = await asyncio.wait_for(r.readline(), KEEPALIVE_S)
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers: Dict[str, str] = {}
+    while True:
+        h = await r.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+    if "transfer-encoding" in headers:
+        raise HTTPError(400, "chunked request bodies are not supported; send Content-Length")
+    try:
+        n = int(headers.get("content-length") or 0)
+    except ValueError:
+        n = -1
+    if n < 0:
+        raise HTTPError(400, "bad Content-Length")
+    if n > MAX_BODY:
+        raise HTTPError(413, f"body over {MAX_BODY} bytes")
+    return _Request(method.upper(), target, headers, await r.readexactly(n) if n else b"")
+
+def _hostname(host: str) -> str:
+    """Host header without the port ("[::1]:8765" -> "::1")."""
+    if host.startswith("["):
+        return host[1:host.find("]")]
+    return host.rsplit(":", 1)[0] if host.count(":") == 1 else host
+
+def write_token_file(token: str) -> Path:
+    path = config.CONFIG_PATH.with_name("server.token")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+        fh.write(token)
+    os.chmod(path, 0o600)   # in case it already existed with wider permissions
+    return path
+
+def _head(status: int, keep: bool, extra: str) -> bytes:
+    return (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n{extra}"
+            f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n").encode("latin-1")
+
+async def _write_json(w: asyncio.StreamWriter, status: int, obj, keep: bool, extra: str = ""):
+    body = json.dumps(obj).encode()
+    w.write(_head(status, keep, f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n{extra}") + body)
+    await w.drain()
+
+async def _write_stream(w: asyncio.StreamWriter, lines: AsyncIterator[dict], keep: bool):
+    w.write(_head(200, keep, "Content-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n"))
+    try:
+        try:
+            async for obj in lines:
+                data = json.dumps(obj).encode() + b"\n"
+                w.write(b"%x\r\n%s\r\n" % (len(data), data))
+                await w.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            raise
+        except Exception as e:   # headers are out: report the error as the last line
+            log(f"[SERVER] stream failed: {e}", "ERROR")
+            data = json.dumps({"error": str(e), "done": True}).encode() + b"\n"
+            w.write(b"%x\r\n%s\r\n" % (len(data), data))
+        w.write(b"0\r\n\r\n")
+        await w.drain()
+    finally:
+        await lines.aclose()   # client gone: cancels the goals / chat turn behind the stream
+
+class JarvisServer:
+    ROUTES = {
+        ("GET", "/health"): "health",
+        ("POST", "/goals"): "goals",
+        ("POST", "/chat"): "chat",
+        ("GET", "/memory/search"): "memory_search",
+        ("GET", "/extensions"): "extensions",
+        ("GET", "/extensions/pending"): "pending",
+        ("POST", "/extensions/approve"): "approve",
+    }
+
+    def __init__(self, cfg: Optional[Config] = None):
+        self.cfg = cfg or load_config()
+        self.token = self.cfg.server_token or secrets.token_urlsafe(32)
+        self.token_file: Optional[Path] = None
+        self._hosts = set(LOCAL_HOSTS)
+        self.address: Optional[Tuple] = None
+        self.handled = self.rejected = 0
+        self._sessions: "OrderedDict[int, Tuple[ChatSession, asyncio.Lock]]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+
+    # -------- startup --------
+    def warm(self):
+        """Load everything a request would otherwise pay for on first use."""
+        memory.init_db()
+        XM.list_extensions()
+        pool_from_config()
+        if self.cfg.intent_classifier:
+            try:
+                from .intent_classifier import get_classifier   # optional: needs numpy
+                get_classifier(self.cfg)
+            except ImportError:
+                pass
+
+    async def serve(self, host: Optional[str] = None, port: Optional[int] = None, unix: Optional[str] = None,
+                    ready: Optional[threading.Event] = None):
+        """Run until cancelled. `ready` is set once the socket is bound (self.address)."""
+        await asyncio.to_thread(self.warm)
+        host = host or self.cfg.server_host
+        if host not in ("", "0.0.0.0", "::"):
+            self._hosts.add(host)
+        if not self.cfg.server_token:
+            self.token_file = write_token_file(self.token)
+        self._queue = asyncio.Queue(max(1, self.cfg.server_queue))
+        workers = [asyncio.create_task(self._worker()) for _ in range(max(1, self.cfg.server_workers))]
+        if unix:
+            if os.path.exists(unix): os.unlink(unix)   # stale socket from a previous run
+            srv = await asyncio.start_unix_server(self._conn, path=unix)
+        else:
+            srv = await asyncio.start_server(self._conn, host, self.cfg.server_port if port is None else port)
+        self.address = srv.sockets[0].getsockname()
+        log(f"[SERVER] listening on {self.address} ({len(workers)} workers, queue {self._queue.maxsize})")
+        if ready is not None: ready.set()
+        try:
+            async with srv:
+                await srv.serve_forever()
+        finally:
+            for t in workers: t.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            async_ollama.get_async_client().close()
+            if unix and os.path.exists(unix): os.unlink(unix)
+            if self.token_file is not None and self.token_file.exists(): self.token_file.unlink()
+
+    # -------- connections / queue --------
+    async def _conn(self, r: asyncio.StreamReader, w: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    req = await _read_request(r)
+                except HTTPError as e:
+                    await _write_json(w, e.status, {"error": str(e)}, False)
+                    break
+                if req is None:
+                    break
+                if req.path == "/health":   # probes see a full queue instead of waiting in it
+                    await self._respond(req, w, req.keep_alive)
+                    continue
+                done = asyncio.get_running_loop().create_future()
+                try:
+                    self._queue.put_nowait((req, w, done))
+                except asyncio.QueueFull:
+                    self.rejected += 1
+                    await _write_json(w, 503, {"error": "server busy"}, req.keep_alive, "Retry-After: 1\r\n")
+                    if req.keep_alive: continue
+                    break
+                if not await done:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            w.close()
+
+    async def _worker(self):
+        while True:
+            req, w, done = await self._queue.get()
+            keep = req.keep_alive
+            try:
+                await self._respond(req, w, keep)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                keep = False
+            except Exception as e:
+                log(f"[SERVER] {req.method} {req.path} failed: {e}", "ERROR")
+                keep = False
+            finally:
+                self.handled += 1
+                if not done.done(): done.set_result(keep)
+
+    async def _respond(self, req: _Request, w: asyncio.StreamWriter, keep: bool):
+        try:
+            self._check(req)
+            name = self.ROUTES.get((req.method, req.path))
+            if name is None:
+                known = any(p == req.path for _, p in self.ROUTES)
+                raise HTTPError(405 if known else 404, f"{req.method} {req.path}")
+            with tracing.span(f"server.{name}"):
+                res = await getattr(self, f"_{name}")(req)
+        except HTTPError as e:
+            return await _write_json(w, e.status, {"error": str(e)}, keep)
+        except Exception as e:
+            log(f"[SERVER] {req.method} {req.path}: {e}", "ERROR")
+            return await _write_json(w, 500, {"error": str(e)}, keep)
+        if isinstance(res, dict):
+            await _write_json(w, 200, res, keep)
+        else:
+            await _write_stream(w, res, keep)
+
+    def _check(self, req: _Request):
+        if "origin" in req.headers:
+            raise HTTPError(403, "browser requests are not accepted")
+        if _hostname(req.headers.get("host", "localhost")).lower() not in self._hosts:
+            raise HTTPError(403, "Host must be localhost")
+        if not hmac.compare_digest(req.headers.get("authorization", "").encode(), f"Bearer {self.token}".encode()):
+            raise HTTPError(401, "missing or wrong bearer token")
+        if req.method == "POST" and req.headers.get("content-type", "").split(";")[0].strip().lower() != "application/json":
+            raise HTTPError(415, "POST bodies must be Content-Type: application/json")
+
+    # -------- endpoints (dict = JSON reply, async generator = NDJSON stream) --------
+    async def _health(self, req: _Request):
+        return {"ok": True, "queued": self._queue.qsize(), "queue_max": self._queue.maxsize,
+                "workers": self.cfg.server_workers, "handled": self.handled, "rejected": self.rejected,
+                "chat_sessions": len(self._sessions), "ollama": ollama_client.scheduler_stats()}
+
+    async def _goals(self, req: _Request):
+        body = req.json()
+        goals = body.get("goals")
+        if isinstance(goals, str): goals = [goals]
+        if not goals or not all(isinstance(g, str) for g in goals):
+            raise HTTPError(400, '"goals" must be a non-empty list of strings')
+        lines: asyncio.Queue = asyncio.Queue()
+        agent = AsyncAgent(cb=lines.put_nowait, cfg=self.cfg)
+        for g in goals:
+            agent.add_goal(g)
+        if not body.get("stream"):
+            await agent.process_goals()
+            out = []
+            while not lines.empty(): out.append(lines.get_nowait())
+            return {"log": out}
+        return self._goal_stream(agent, lines)
+
+    @staticmethod
+    async def _goal_stream(agent: AsyncAgent, lines: asyncio.Queue):
+        task = asyncio.create_task(agent.process_goals())
+        try:
+            while True:
+                get = asyncio.ensure_future(lines.get())
+                await asyncio.wait((get, task), return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    break
+                yield {"log": get.result()}
+            while not lines.empty():
+                yield {"log": lines.get_nowait()}
+            await task
+            yield {"done": True}
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _session(self, sid) -> Tuple[ChatSession, asyncio.Lock]:
+        if sid is None:
+            return ChatSession(self.cfg.model, cfg=self.cfg), asyncio.Lock()
+        if not isinstance(sid, int):
+            raise HTTPError(400, '"session" must be an integer id')
+        hit = self._sessions.get(sid)
+        if hit is None:
+            try:
+                sess = await asyncio.to_thread(ChatSession, self.cfg.model, sid, self.cfg)
+            except KeyError as e:
+                raise HTTPError(404, str(e.args[0]))
+            hit = self._sessions.setdefault(sid, (sess, asyncio.Lock()))
+        self._sessions.move_to_end(sid)
+        return hit
+
+    def _remember(self, sess: ChatSession, lock: asyncio.Lock):
+        if sess.id is not None and sess.id not in self._sessions:
+            self._sessions[sess.id] = (sess, lock)
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+
+    async def _chat(self, req: _Request):
+        body = req.json()
+        msg = body.get("message")
+        if not isinstance(msg, str) or not msg.strip():
+            raise HTTPError(400, '"message" must be a non-empty string')
+        sess, lock = await self._session(body.get("session"))
+        if not body.get("stream"):
+            async with lock:   # one turn at a time per session
+                answer = await sess.aask(msg)
+            self._remember(sess, lock)
+            return {"session": sess.id, "answer": answer}
+        return self._chat_stream(sess, lock, msg)
+
+    async def _chat_stream(self, sess: ChatSession, lock: asyncio.Lock, msg: str):
+        async with lock:
+            tokens: asyncio.Queue = asyncio.Queue()
+            task = asyncio.create_task(sess.aask(msg, on_token=tokens.put_nowait))
+            try:
+                while True:
+                    get = asyncio.ensure_future(tokens.get())
+                    await asyncio.wait((get, task), return_when=asyncio.FIRST_COMPLETED)
+                    if not get.done():
+                        get.cancel()
+                        break
+                    yield {"token": get.result()}
+                while not tokens.empty():
+                    yield {"token": tokens.get_nowait()}
+                answer = await task
+            finally:
+                if not task.done():
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+        self._remember(sess, lock)
+        yield {"done": True, "session": sess.id, "answer": answer}
+
+    async def _memory_search(self, req: _Request):
+        q = req.query.get("q", "").strip()
+        if not q:
+            raise HTTPError(400, "missing ?q=")
+        try:
+            k = max(1, min(100, int(req.query.get("k", 10))))
+        except ValueError:
+            raise HTTPError(400, "k must be an integer")
+        return {"hits": await asyncio.to_thread(memory.search, q, k)}
+
+    async def _extensions(self, req: _Request):
+        return {"extensions": await asyncio.to_thread(XM.list_extensions)}
+
+    async def _pending(self, req: _Request):
+        return {"pending": await asyncio.to_thread(XM.list_pending)}
+
+    async def _approve(self, req: _Request):
+        body = req.json()
+        pid, triggers, name = body.get("id"), body.get("triggers"), body.get("name")
+        if not isinstance(pid, int):
+            raise HTTPError(400, '"id" must be a pending extension id')
+        if isinstance(triggers, str): triggers = [triggers]
+        if triggers is not None and not all(isinstance(t, str) for t in triggers):
+            raise HTTPError(400, '"triggers" must be a list of strings')
+        pend = {e["id"]: e for e in await asyncio.to_thread(XM.list_pending)}
+        if pid not in pend:
+            raise HTTPError(404, f"no pending extension {pid}")
+        triggers = [t.strip() for t in triggers or [] if t.strip()] or [pend[pid]["goal"]]
+        msg = await asyncio.to_thread(XM.promote_pending, pid, triggers, name or pend[pid]["goal"][:30])
+        return {"message": msg}
+
+def main():
+    ap = argparse.ArgumentParser(description="Jarvis Hybrid daemon (local HTTP/JSON API)")
+    ap.add_argument("--host", help="listen address (default: cfg.server_host)")
+    ap.add_argument("--port", type=int, help="listen port (default: cfg.server_port)")
+    ap.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    a = ap.parse_args()
+    cfg = load_config()
+    set_console_echo(cfg.console_echo)
+    configure_logger(cfg.log_format, cfg.log_keep, cfg.log_max_age_days, cfg.log_queue_max, cfg.log_overflow)
+    tracing.configure(cfg.trace_enabled, cfg.trace_export, cfg.trace_export_interval)
+    if a.unix and not hasattr(asyncio, "start_unix_server"):
+        ap.error("Unix sockets are not available on this platform")
+    server = JarvisServer(cfg)
+    if not cfg.server_token:
+        print(f"Bearer token for this run: {config.CONFIG_PATH.with_name('server.token')}")
+    try:
+        asyncio.run(server.serve(a.host, a.port, a.unix))
+    except KeyboardInterrupt:
+        log("[SERVER] stopped")
+    finally:
+        memory.flush()
+        close_logger()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Per-stage latency tracing.
+
+    with span("llm.generate", model=m) as sp:
+        ...
+        sp.set(backend="http", response_chars=len(out))
+
+Each finished span records its duration under its stage. String attributes
+become labels (a separate series per value, e.g. backend="http"); numeric
+attributes are summed per series. Every series keeps Prometheus-style
+cumulative buckets, count/sum/max and a fixed-size reservoir sample for
+p50/p95/p99.
+
+Tracing is off unless configure() enables it (cfg.trace_enabled). While off,
+span() returns a shared no-op object and @traced calls the function
+directly, so instrumented code pays one global check per call.
+
+When enabled with an export format, a background thread rewrites
+logs/metrics.prom (Prometheus text) or logs/metrics.json every
+cfg.trace_export_interval seconds.
+"""
+from __future__ import annotations
+import atexit, bisect, functools, inspect, json, os, random, threading, time
+from typing import Dict, List, Optional, Tuple
+from . import logger
+
+ENABLED = False
+RESERVOIR = 2048
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+class _Series:
+    __slots__ = ("count", "total", "max", "buckets", "sample", "sums")
+    def __init__(self):
+        self.count = 0; self.total = 0.0; self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sample: List[float] = []
+        self.sums: Dict[str, float] = {}
+
+    def add(self, secs: float, nums: Dict[str, float]):
+        self.count += 1; self.total += secs
+        if secs > self.max: self.max = secs
+        self.buckets[bisect.bisect_left(BUCKETS, secs)] += 1
+        if len(self.sample) < RESERVOIR:
+            self.sample.append(secs)
+        else:
+            j = random.randrange(self.count)   # reservoir sampling (Algorithm R)
+            if j < RESERVOIR: self.sample[j] = secs
+        for k, v in nums.items():
+            self.sums[k] = self.sums.get(k, 0.0) + v
+
+_series: Dict[Key, _Series] = {}
+_lock = threading.Lock()
+
+def record(stage: str, secs: float, /, **attrs):
+    """Add one observation directly (for durations measured elsewhere)."""
+    if not ENABLED:
+        return
+    labels, nums = [], {}
+    for k, v in attrs.items():
+        if isinstance(v, (int, float)) and not isinstance(v, bool): nums[k] = v
+        elif v is not None: labels.append((k, str(v)))
+    key = (stage, tuple(sorted(labels)))
+    with _lock:
+        s = _series.get(key)
+        if s is None: s = _series[key] = _Series()
+        s.add(secs, nums)
+
+class _Span:
+    __slots__ = ("stage", "attrs", "t0")
+    def __init__(self, stage: str, attrs: dict):
+        self.stage = stage; self.attrs = attrs
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+    def __exit__(self, et, ev, tb):
+        if et is not None: self.attrs["error"] = et.__name__
+        record(self.stage, time.perf_counter() - self.t0, **self.attrs)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+    def set(self, **attrs): pass
+    def __enter__(self): return self
+    def __exit__(self, et, ev, tb): return False
+
+_NULL = _NullSpan()
+
+def span(stage: str, /, **attrs):
+    return _Span(stage, attrs) if ENABLED else _NULL
+
+def traced(stage: str):
+    """Decorator form of span() for a whole function (or coroutine function)."""
+    def deco(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def awrapper(*a, **kw):
+                if not ENABLED:
+                    return await fn(*a, **kw)
+                with _Span(stage, {}):
+                    return await fn(*a, **kw)
+            return awrapper
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not ENABLED:
+                return fn(*a, **kw)
+            with _Span(stage, {}):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+# ------------------ reporting ------------------
+def _pct(sorted_xs: List[float], q: float) -> float:
+    if not sorted_xs: return 0.0
+    return sorted_xs[min(len(sorted_xs) - 1, int(q * len(sorted_xs)))]
+
+def snapshot() -> List[dict]:
+    """One dict per series: stage, labels, count, mean/p50/p95/p99/max in ms, sums."""
+    with _lock:
+        items = [(k, s.count, s.total, s.max, list(s.buckets), sorted(s.sample), dict(s.sums))
+                 for k, s in _series.items()]
+    out = []
+    for (stage, labels), n, total, mx, buckets, xs, sums in sorted(items):
+        out.append({"stage": stage, "labels": dict(labels), "count": n,
+                    "mean_ms": total / n * 1e3 if n else 0.0, "p50_ms": _pct(xs, 0.50) * 1e3,
+                    "p95_ms": _pct(xs, 0.95) * 1e3, "p99_ms": _pct(xs, 0.99) * 1e3, "max_ms": mx * 1e3,
+                    "total_s": total, "buckets": buckets, "sums": sums})
+    return out
+
+def reset():
+    with _lock:
+        _series.clear()
+
+def _label_str(d: dict) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in d.items())
+
+def prometheus_text() -> str:
+    lines = ["# TYPE jarvis_stage_seconds histogram"]
+    sums = ["# TYPE jarvis_stage_attr_total counter"]
+    for r in snapshot():
+        base = _label_str({"stage": r["stage"], **r["labels"]})
+        acc = 0
+        for le, c in zip(BUCKETS + ("+Inf",), r["buckets"]):
+            acc += c
+            lines.append(f'jarvis_stage_seconds_bucket{{{base},le="{le}"}} {acc}')
+        lines.append(f"jarvis_stage_seconds_sum{{{base}}} {r['total_s']:.6f}")
+        lines.append(f"jarvis_stage_seconds_count{{{base}}} {r['count']}")
+        for k, v in r["sums"].items():
+            sums.append(f'jarvis_stage_attr_total{{{base},attr="{k}"}} {v:g}')
+    return "\n".join(lines + sums) + "\n"
+
+def export(fmt: str = "prom", path: Optional[str] = None) -> str:
+    """Write metrics atomically to path (default logs/metrics.prom|json); returns the path."""
+    if not path:
+        logger.LOG_DIR.mkdir(parents=True, exist_ok=True)
+        path = str(logger.LOG_DIR / ("metrics.json" if fmt == "json" else "metrics.prom"))
+    if fmt == "json":
+        data = json.dumps([{k: v for k, v in r.items() if k != "buckets"} for r in snapshot()], indent=1)
+    else:
+        data = prometheus_text()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh: fh.write(data)
+    os.replace(tmp, path)
+    return path
+
+_exporter: Optional[threading.Thread] = None
+_export_cfg = {"fmt": "", "interval": 30.0}
+_wake = threading.Event()
+
+def _export_loop():
+    while True:
+        _wake.wait(_export_cfg["interval"]); _wake.clear()
+        if ENABLED and _export_cfg["fmt"]:
+            try: export(_export_cfg["fmt"])
+            except OSError: pass
+
+def configure(enabled: bool, export_fmt: str = "", interval: float = 30.0):
+    """Turn tracing on/off; export_fmt "prom"|"json" also writes metrics every interval seconds."""
+    global ENABLED, _exporter
+    ENABLED = bool(enabled)
+    _export_cfg.update(fmt=export_fmt or "", interval=max(1.0, float(interval)))
+    if ENABLED and export_fmt and _exporter is None:
+        _exporter = threading.Thread(target=_export_loop, name="metrics-export", daemon=True)
+        _exporter.start()
+    _wake.set()
+
+@atexit.register
+def _final_export():
+    if ENABLED and _export_cfg["fmt"]:
+        try: export(_export_cfg["fmt"])
+        except OSError: pass
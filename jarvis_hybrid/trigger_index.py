@@ -0,0 +1,60 @@
+"""
+Multi-pattern substring matcher (Aho-Corasick) for extension triggers.
+
+Built once from (trigger, payload) pairs; find() scans the goal text a
+single time regardless of how many triggers exist.
+"""
+from __future__ import annotations
+from collections import deque
+from typing import Dict, Generic, Iterable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class TriggerMatcher(Generic[T]):
+    def __init__(self, patterns: Iterable[Tuple[str, T]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        self._pats: List[Tuple[str, T]] = []
+        for pat, payload in patterns:
+            pat = pat.lower()
+            if not pat: continue
+            node = 0
+            for ch in pat:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({}); self._fail.append(0); self._out.append([])
+                node = nxt
+            self._out[node].append(len(self._pats))
+            self._pats.append((pat, payload))
+        self._build()
+
+    def _build(self):
+        q = deque(self._goto[0].values())
+        while q:
+            node = q.popleft()
+            for ch, nxt in self._goto[node].items():
+                q.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self._pats)
+
+    def find(self, text: str) -> List[Tuple[str, T]]:
+        """Every pattern occurring in text (case-insensitive), each reported once."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0; seen = set()
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                seen.update(out[node])
+        return [self._pats[i] for i in sorted(seen)]
@@ -0,0 +1,304 @@
+"""
+Semantic memory: embeddings of project summaries + cosine top-k search.
+
+Vectors live next to memory.db in memory_vectors.npy, a contiguous
+(capacity x dim) float32 matrix opened memory-mapped, with row ids in
+memory_vectors.ids.npy and the row count / embedder in memory_vectors.json.
+Rows are L2-normalized, so cosine similarity is a dot product; search is a
+blocked matrix product plus argpartition and never reads the SQLite text.
+
+Embedders: OllamaEmbedder (cfg.embed_model via /api/embed) or HashEmbedder,
+a deterministic offline stand-in for tests and machines without a model.
+Ollama vectors are cut to cfg.embed_dims: nomic-embed-text is trained so
+its leading dims stand alone, and an exact scan is memory-bound, so 256
+dims keep 100k rows under 10 ms where the full 768 take about 20.
+memory.add_project_summary() indexes new summaries in the background;
+batches whose embedding fails are retried with backoff.
+"""
+from __future__ import annotations
+import hashlib, json, os, queue, re, threading, time
+from pathlib import Path
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple
+import numpy as np
+from numpy.lib.format import open_memmap
+from . import memory
+from .config import get_config
+from .logger import log
+from .tracing import traced
+
+BLOCK_ROWS = 65536   # rows scored per matrix product in search
+RETRY_S = (5, 30, 120, 600)   # backoff between attempts to embed a failed batch
+
+# ------------------ embedders ------------------
+class Embedder(Protocol):
+    name: str
+    def embed(self, texts: Sequence[str]) -> np.ndarray: ...   # (n, dim) float32
+
+class OllamaEmbedder:
+    def __init__(self, model: str, dims: int = 0):
+        self.model, self.dims = model, dims
+        self.name = f"ollama:{model}" + (f"@{dims}" if dims else "")
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        from .ollama_client import model_embed
+        v = np.asarray(model_embed(self.model, list(texts)), dtype=np.float32)
+        return v[:, :self.dims] if self.dims and v.ndim == 2 else v
+
+class HashEmbedder:
+    """Signed feature hashing of words and character trigrams; same text -> same vector."""
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hash:{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r"\w+", text.lower())
+        feats = list(words)
+        for w in words:
+            w = f" {w} "
+            feats += [w[i:i+3] for i in range(len(w) - 2)]
+        return feats
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, t in enumerate(texts):
+            for f in self._features(t):
+                h = int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        return out
+
+def default_embedder() -> Embedder:
+    cfg = get_config()
+    if cfg.embed_backend == "hash":
+        return HashEmbedder()
+    return OllamaEmbedder(cfg.embed_model, cfg.embed_dims)
+
+def _normalize(v: np.ndarray) -> np.ndarray:
+    v = np.asarray(v, dtype=np.float32)
+    if v.ndim == 1: v = v[None, :]
+    n = np.linalg.norm(v, axis=1, keepdims=True)
+    n[n == 0] = 1.0
+    return v / n
+
+# ------------------ store ------------------
+class VectorStore:
+    def __init__(self, base: Path, embedder: Optional[Embedder] = None):
+        self.base = base
+        self.embedder = embedder or default_embedder()
+        self._vec_path = base.with_suffix(".npy")
+        self._ids_path = base.with_suffix(".ids.npy")
+        self._meta_path = base.with_suffix(".json")
+        self._lock = threading.Lock()
+        self._unread = threading.Condition(self._lock)   # signalled when the last search lets go of the maps
+        self._readers = 0
+        self._known: set = set()   # ids in the store
+        self.count = 0
+        self.dim: Optional[int] = None
+        self._vecs: Optional[np.ndarray] = None
+        self._ids: Optional[np.ndarray] = None
+        self._load()
+
+    def _load(self):
+        if not self._meta_path.exists():
+            return
+        meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+        if meta.get("embedder") != self.embedder.name:
+            log(f"Vector store built with {meta.get('embedder')}, now {self.embedder.name}; run reindex()", "WARN")
+            return
+        self.count, self.dim = int(meta["count"]), int(meta["dim"])
+        self._vecs = np.load(self._vec_path, mmap_mode="r+")
+        self._ids = np.load(self._ids_path, mmap_mode="r+")
+        self._known = set(self._ids[:self.count].tolist())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _save_meta(self):
+        tmp = self._meta_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({"count": self.count, "dim": self.dim, "embedder": self.embedder.name}),
+                       encoding="utf-8")
+        os.replace(tmp, self._meta_path)
+
+    def _grow(self, need: int):
+        cap = 0 if self._vecs is None else self._vecs.shape[0]
+        if need <= cap:
+            return
+        while self._readers:   # searches hold the old maps; the files are about to be replaced
+            self._unread.wait()
+        cap = max(need, cap * 2, 1024)
+        tv, ti = self._vec_path.with_suffix(".npy.tmp"), self._ids_path.with_suffix(".npy.tmp")
+        vecs = open_memmap(tv, mode="w+", dtype=np.float32, shape=(cap, self.dim))
+        ids = open_memmap(ti, mode="w+", dtype=np.int64, shape=(cap,))
+        if self.count:
+            vecs[:self.count] = self._vecs[:self.count]
+            ids[:self.count] = self._ids[:self.count]
+        vecs.flush(); ids.flush()
+        del vecs, ids
+        self._vecs = self._ids = None   # release old maps before replacing (Windows)
+        os.replace(tv, self._vec_path); os.replace(ti, self._ids_path)
+        self._vecs = np.load(self._vec_path, mmap_mode="r+")
+        self._ids = np.load(self._ids_path, mmap_mode="r+")
+
+    def add_vectors(self, ids: Sequence[int], vecs: np.ndarray):
+        vecs = _normalize(vecs)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vecs.shape[1]
+            self._grow(self.count + len(ids))
+            n = self.count
+            self._vecs[n:n + len(ids)] = vecs
+            self._ids[n:n + len(ids)] = np.asarray(ids, dtype=np.int64)
+            self._vecs.flush(); self._ids.flush()
+            self.count = n + len(ids)
+            self._known.update(int(i) for i in ids)
+            self._save_meta()
+
+    def unindexed(self, items) -> List[Tuple[int, str]]:
+        """The (id, text) pairs whose id is not in the store yet."""
+        with self._lock:
+            return [(i, t) for i, t in items if i not in self._known]
+
+    def add(self, ids: Sequence[int], texts: Sequence[str]):
+        if texts:
+            self.add_vectors(ids, self.embedder.embed(texts))
+
+    def search_vectors(self, queries: np.ndarray, k: int = 10) -> List[List[Tuple[int, float]]]:
+        """Top-k (id, cosine) per query row, best first."""
+        q = _normalize(queries)
+        with self._lock:
+            n, vecs, ids = self.count, self._vecs, self._ids
+            if not n or vecs is None:
+                return [[] for _ in range(len(q))]
+            self._readers += 1
+        try:
+            return self._topk(q, min(k, n), n, vecs, ids)
+        finally:
+            with self._lock:
+                self._readers -= 1
+                self._unread.notify_all()
+
+    @staticmethod
+    def _topk(q: np.ndarray, k: int, n: int, vecs: np.ndarray, ids: np.ndarray) -> List[List[Tuple[int, float]]]:
+        best_s = np.full((len(q), 0), -np.inf, dtype=np.float32)
+        best_i = np.zeros((len(q), 0), dtype=np.int64)
+        for start in range(0, n, BLOCK_ROWS):
+            stop = min(n, start + BLOCK_ROWS)
+            s = q @ vecs[start:stop].T                                   # (m, block)
+            kk = min(k, stop - start)
+            part = np.argpartition(-s, kk - 1, axis=1)[:, :kk]
+            best_s = np.concatenate([best_s, np.take_along_axis(s, part, axis=1)], axis=1)
+            best_i = np.concatenate([best_i, part + start], axis=1)
+            if best_s.shape[1] > k:
+                keep = np.argpartition(-best_s, k - 1, axis=1)[:, :k]
+                best_s = np.take_along_axis(best_s, keep, axis=1)
+                best_i = np.take_along_axis(best_i, keep, axis=1)
+        order = np.argsort(-best_s, axis=1)
+        best_s = np.take_along_axis(best_s, order, axis=1)
+        best_i = np.take_along_axis(best_i, order, axis=1)
+        return [[(int(ids[j]), float(sc)) for j, sc in zip(row_i, row_s)]
+                for row_i, row_s in zip(best_i, best_s)]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        if not self.count:
+            return []
+        return self.search_vectors(self.embedder.embed([query]), k)[0]
+
+    def reset(self):
+        with self._lock:
+            while self._readers:
+                self._unread.wait()
+            self._vecs = self._ids = None
+            self.count, self.dim = 0, None
+            self._known = set()
+            for p in (self._vec_path, self._ids_path, self._meta_path):
+                try: p.unlink()
+                except OSError: pass
+
+# ------------------ module-level store for memory.db ------------------
+_stores: Dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+
+def get_store() -> VectorStore:
+    base = memory.DB_PATH.with_name("memory_vectors")
+    key = str(base)
+    with _stores_lock:
+        st = _stores.get(key)
+        if st is None:
+            st = _stores[key] = VectorStore(base)
+    return st
+
+_q: "queue.Queue[Tuple[int, str]]" = queue.Queue()
+_worker: Optional[threading.Thread] = None
+_failed: List[Tuple[int, str]] = []   # indexer thread only
+
+def _catch_up():
+    # summaries a previous run stored but never embedded (model down at exit)
+    rows = memory.get_conn().execute("SELECT id, summary FROM project_summaries").fetchall()
+    _failed.extend(get_store().unindexed(rows))
+
+def _index_loop():
+    attempt, retry_at = 0, 0.0
+    try:
+        _catch_up()
+    except Exception as e:
+        log(f"Vector catch-up skipped: {e}", "WARN")
+    while True:
+        try:
+            batch = [_q.get(timeout=max(0.0, retry_at - time.monotonic()) if _failed else None)]
+        except queue.Empty:
+            batch = []
+        while len(batch) < 32:
+            try: batch.append(_q.get_nowait())
+            except queue.Empty: break
+        queued = len(batch)
+        if _failed and time.monotonic() >= retry_at:
+            batch += _failed[:64]; del _failed[:64]
+        try:
+            st = get_store()
+            batch = st.unindexed(dict(batch).items())
+            if batch:
+                st.add([i for i, _ in batch], [t for _, t in batch])
+                attempt = 0
+        except Exception as e:
+            _failed.extend(batch)
+            delay = RETRY_S[min(attempt, len(RETRY_S) - 1)]
+            retry_at, attempt = time.monotonic() + delay, attempt + 1
+            log(f"Vector indexing failed for {len(batch)} summaries, retrying in {delay}s: {e}", "WARN")
+        finally:
+            for _ in range(queued): _q.task_done()
+
+def index_summary_async(summary_id: int, text: str):
+    """Embed + append in the background (embedding may take a model call)."""
+    global _worker
+    with _stores_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_index_loop, name="vector-indexer", daemon=True)
+            _worker.start()
+    _q.put((summary_id, text))
+
+def wait_indexed():
+    """Block until queued summaries have been tried once (failures stay queued for retry)."""
+    _q.join()
+
+def reindex(batch: int = 64) -> int:
+    """Rebuild the store from every project summary (after changing embedder)."""
+    memory.flush()
+    st = get_store()
+    st.embedder = default_embedder()
+    st.reset()
+    rows = memory.get_conn().execute("SELECT id, summary FROM project_summaries ORDER BY id").fetchall()
+    for i in range(0, len(rows), batch):
+        chunk = rows[i:i + batch]
+        st.add([r[0] for r in chunk], [r[1] for r in chunk])
+    return len(rows)
+
+@traced("memory.vector_search")
+def search_summaries(query: str, k: int = 5) -> List[Dict]:
+    """Semantic hits [{id, root, text, score}] among summaries indexed so far; only the top-k rows are read from SQLite."""
+    hits = get_store().search(query, k)
+    if not hits:
+        return []
+    ids = [i for i, _ in hits]
+    rows = memory.get_conn().execute(
+        f"SELECT id, root, summary FROM project_summaries WHERE id IN ({','.join('?' * len(ids))})", ids).fetchall()
+    by_id = {r[0]: r for r in rows}
+    return [{"id": i, "root": by_id[i][1], "text": by_id[i][2], "score": sc} for i, sc in hits if i in by_id]
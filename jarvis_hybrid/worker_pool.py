@@ -0,0 +1,253 @@
+"""
+Warm Python worker pool for run_python / run_extension.
+
+Each worker is a pre-started `python worker_pool.py` process that has
+already imported the common modules (config: worker_preload) and waits for
+one job over a multiprocessing connection. It points fds 1/2 at capture
+files, runs the code as __main__, joins non-daemon threads and runs atexit
+handlers as interpreter shutdown would, reports back and exits. The parent
+then reads the capture files, so output (stdout then stderr, child
+processes included) matches what a fresh `python script.py` subprocess
+would have printed, and nothing one job does (sys.modules, monkeypatches,
+cwd, env, threads) can reach the next.
+
+Workers are single-use: taking one starts its replacement in the
+background, so the next job normally finds a warm interpreter.
+
+This module only imports the stdlib at top level because it doubles as the
+worker script.
+"""
+from __future__ import annotations
+import os, secrets, subprocess, sys, tempfile, threading, time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import List, Optional, Sequence
+
+def _tmpfile(suffix: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="jarvis_w_", suffix=suffix)
+    os.close(fd)
+    return path
+
+class _Worker:
+    def __init__(self, preload: Sequence[str]):
+        self.out_path = _tmpfile(".out")
+        self.err_path = _tmpfile(".err")
+        family = "AF_PIPE" if sys.platform == "win32" else "AF_UNIX"
+        key = secrets.token_bytes(16)
+        with Listener(family=family, authkey=key) as lis:
+            env = dict(os.environ, JARVIS_WORKER_KEY=key.hex())
+            self.proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), lis.address,
+                 self.out_path, self.err_path, ",".join(preload)],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env,
+            )
+            accepted = threading.Event()
+            threading.Thread(target=self._watch_start, args=(lis.address, accepted), daemon=True).start()
+            try:
+                self.conn: Connection = lis.accept()
+            except Exception:
+                self.kill()
+                raise RuntimeError("Python worker failed to start")
+            finally:
+                accepted.set()
+
+    def _watch_start(self, address, accepted: threading.Event):
+        # unblock accept() if the worker dies before connecting
+        while not accepted.wait(0.1):
+            if self.proc.poll() is not None:
+                try: Client(address, authkey=b"-").close()
+                except Exception: pass
+                return
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def read_output(self) -> str:
+        out = ""
+        for p in (self.out_path, self.err_path):
+            try:
+                with open(p, encoding="utf-8", errors="ignore") as fh: out += fh.read()
+            except OSError:
+                pass
+        return out
+
+    def kill(self):
+        try: self.conn.close()
+        except Exception: pass
+        if self.alive():
+            self.proc.kill()
+        try: self.proc.wait(timeout=5)
+        except Exception: pass
+        for p in (self.out_path, self.err_path):
+            try: os.remove(p)
+            except OSError: pass
+
+CANCEL_POLL = 0.05   # seconds between cancel checks while a job runs
+
+def _poll(conn: Connection, timeout: float, cancel: Optional[threading.Event]) -> bool:
+    """conn.poll(timeout) that also gives up once cancel is set."""
+    if cancel is None:
+        return conn.poll(timeout)
+    deadline = time.monotonic() + timeout
+    while not cancel.is_set():
+        left = deadline - time.monotonic()
+        if left <= 0: return False
+        if conn.poll(min(CANCEL_POLL, left)): return True
+    return False
+
+class WorkerPool:
+    """
+    Up to `size` jobs at once, each in a fresh pre-started interpreter;
+    run_*() blocks while all are busy and raises TimeoutError if a job
+    overruns (its worker is killed). Setting `cancel` (a threading.Event)
+    kills the job's worker too; run_*() then raises InterruptedError.
+    """
+    def __init__(self, size: int = 2, preload: Sequence[str] = ()):
+        self.size = max(1, int(size))
+        self.preload = tuple(preload)
+        self._idle: List[_Worker] = []
+        self._spawning = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def warm(self, n: Optional[int] = None):
+        """Start workers ahead of the first job."""
+        for _ in range(n or self.size):
+            w = _Worker(self.preload)
+            with self._lock:
+                self._idle.append(w)
+
+    def _spawn(self):
+        try:
+            w: Optional[_Worker] = _Worker(self.preload)
+        except Exception:
+            w = None   # the next job starts one itself
+        with self._lock:
+            self._spawning -= 1
+            if w is not None and not self._closed:
+                self._idle.append(w); w = None
+            self._ready.notify()
+        if w is not None: w.kill()
+
+    def _take(self) -> _Worker:
+        with self._lock:
+            while True:
+                while self._idle:
+                    w = self._idle.pop()
+                    if w.alive(): break
+                    w.kill()
+                else:
+                    if self._spawning:          # a replacement is nearly ready: cheaper than a cold start
+                        self._ready.wait(); continue
+                    w = None
+                if len(self._idle) + self._spawning < self.size and not self._closed:
+                    self._spawning += 1
+                    threading.Thread(target=self._spawn, name="worker-spawn", daemon=True).start()
+                break
+        return w or _Worker(self.preload)
+
+    def _run(self, kind: str, payload: str, timeout: float, cwd: Optional[str],
+             cancel: Optional[threading.Event] = None) -> str:
+        self._slots.acquire()
+        w = None
+        try:
+            w = self._take()
+            try:
+                w.conn.send((kind, payload, cwd))
+                finished = _poll(w.conn, timeout, cancel)
+            except (EOFError, OSError):
+                finished = True                           # died early (os._exit, crash...)
+            if not finished:
+                if cancel is not None and cancel.is_set():
+                    raise InterruptedError("cancelled")
+                raise TimeoutError(f"timed out after {timeout} seconds")
+            return w.read_output()
+        finally:
+            if w is not None: w.kill()
+            self._slots.release()
+
+    def run_code(self, code: str, timeout: float = 60, cwd: Optional[str] = None,
+                 cancel: Optional[threading.Event] = None) -> str:
+        return self._run("code", code, timeout, cwd, cancel)
+
+    def run_file(self, path: str, timeout: float = 60, cwd: Optional[str] = None,
+                 cancel: Optional[threading.Event] = None) -> str:
+        return self._run("file", path, timeout, cwd, cancel)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for w in idle: w.kill()
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool(size: int = 2, preload: Sequence[str] = ()) -> WorkerPool:
+    """Process-wide pool; arguments only apply on first call."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = WorkerPool(size, preload)
+                import atexit
+                atexit.register(_pool.close)
+    return _pool
+
+# ------------------ worker side ------------------
+def _serve(address: str, out_path: str, err_path: str, preload: str):
+    import importlib, linecache, traceback
+    # like a fresh interpreter: our own directory is not importable
+    here = os.path.dirname(os.path.abspath(__file__))
+    base_path = [p for p in sys.path if os.path.abspath(p or ".") != here]
+    sys.path[:] = base_path
+    for mod in filter(None, preload.split(",")):
+        try: importlib.import_module(mod)
+        except Exception: pass
+    conn = Client(address, authkey=bytes.fromhex(os.environ.pop("JARVIS_WORKER_KEY")))
+    try:
+        kind, payload, cwd = conn.recv()
+    except (EOFError, OSError):
+        return
+    sys.stdout.flush(); sys.stderr.flush()
+    with open(out_path, "wb") as fo, open(err_path, "wb") as fe:
+        os.dup2(fo.fileno(), 1); os.dup2(fe.fileno(), 2)
+    code = 0
+    try:
+        if cwd: os.chdir(cwd)
+        if kind == "file":
+            fname = os.path.abspath(payload)
+            with open(fname, encoding="utf-8", errors="ignore") as fh: src = fh.read()
+            sys.path[:] = [os.path.dirname(fname)] + base_path
+        else:
+            fname, src = "<jarvis>", payload
+            linecache.cache[fname] = (len(src), None, src.splitlines(True), fname)
+        sys.argv = [fname]
+        g = {"__name__": "__main__", "__file__": fname, "__builtins__": __builtins__}
+        exec(compile(src, fname, "exec"), g)
+    except SystemExit as e:
+        code = e.code
+        if code is not None and not isinstance(code, int):
+            print(code, file=sys.stderr); code = 1
+    except BaseException as e:
+        # drop this frame so the traceback starts at the user's code
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        code = 1
+    # what interpreter shutdown does that shows up in output: join
+    # non-daemon threads, run atexit handlers, flush. The rest of the
+    # teardown is skipped; this process never runs anything else.
+    try:
+        threading._shutdown()
+        import atexit; atexit._run_exitfuncs()
+    except BaseException as e:
+        traceback.print_exception(type(e), e, e.__traceback__)
+    for f in (sys.stdout, sys.stderr):
+        try: f.flush()
+        except Exception: pass
+    try: conn.send(code)
+    except OSError: pass
+    os._exit(code or 0)
+
+if __name__ == "__main__":
+    _serve(*sys.argv[1:5])
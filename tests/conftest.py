@@ -0,0 +1,24 @@
+"""
+Shared fixtures: a throwaway memory.db / extensions / config.json / logs
+(benchmarks.common.isolated_state) and the fake Ollama from the benchmarks.
+"""
+from __future__ import annotations
+import pytest
+from benchmarks.common import isolated_state
+from benchmarks.fake_ollama import FakeOllama
+from jarvis_hybrid import ollama_client
+
+@pytest.fixture
+def state():
+    with isolated_state() as root:
+        yield root
+
+@pytest.fixture
+def fake_ollama(state):
+    """A FakeOllama (default plan response) that the shared clients point at."""
+    srv = FakeOllama().start()
+    ollama_client.configure_client(srv.url, pool_size=4)
+    try:
+        yield srv
+    finally:
+        srv.stop()
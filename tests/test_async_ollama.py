@@ -0,0 +1,79 @@
+import asyncio, time
+import pytest
+from benchmarks.fake_ollama import DEFAULT_RESPONSE
+from jarvis_hybrid import async_ollama, ollama_client
+from jarvis_hybrid.async_ollama import AsyncOllamaClient
+
+def client(srv, **kw) -> AsyncOllamaClient:
+    return AsyncOllamaClient(srv.url, **kw)
+
+def test_generate_and_connection_reuse(fake_ollama):
+    async def main():
+        c = client(fake_ollama)
+        assert await c.generate("m", "hi") == DEFAULT_RESPONSE
+        conn = c._idle[-1]
+        assert await c.generate("m", "again") == DEFAULT_RESPONSE
+        assert c._idle == [conn]   # same keep-alive socket
+        c.close()
+    asyncio.run(main())
+
+def test_stream_tokens_and_final_fields(fake_ollama):
+    fake_ollama.response = "one two three four five"
+    async def main():
+        meta = {}
+        toks = [t async for t in client(fake_ollama).generate_stream("m", "hi", extra={"context": [7, 8]}, meta=meta)]
+        return toks, meta
+    toks, meta = asyncio.run(main())
+    assert len(toks) > 1 and "".join(toks) == "one two three four five"
+    assert meta["done"] and meta["context"][:2] == [7, 8] and meta["prompt_eval_count"] >= 1
+
+def test_pool_size_bounds_concurrent_requests(fake_ollama):
+    fake_ollama.latency = 0.1
+    async def main():
+        c = client(fake_ollama, pool_size=2)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(c.generate("m", str(i)) for i in range(5)))
+        dt = time.perf_counter() - t0
+        assert len(c._idle) == 2
+        c.close()
+        return dt
+    assert asyncio.run(main()) >= 0.3   # three rounds of two
+
+def test_http_error_status_raises(fake_ollama):
+    async def main():
+        c = client(fake_ollama)
+        with pytest.raises(RuntimeError, match="HTTP 404"):
+            await c.post_json("/api/nope", {})
+        assert await c.generate("m", "still usable") == DEFAULT_RESPONSE
+    asyncio.run(main())
+
+def test_stale_pooled_socket_is_retried_on_a_fresh_one(fake_ollama):
+    async def main():
+        async def hang_up(r, w): w.close()
+        dead = await asyncio.start_server(hang_up, "127.0.0.1", 0)
+        c = client(fake_ollama)
+        c._idle.append(await asyncio.open_connection(*dead.sockets[0].getsockname()[:2]))
+        await asyncio.sleep(0.05)   # let the close arrive
+        out = await c.generate("m", "hi")
+        dead.close()
+        return out
+    assert asyncio.run(main()) == DEFAULT_RESPONSE
+
+def test_read_timeout_without_progress(fake_ollama):
+    fake_ollama.latency = 1.0
+    async def main():
+        with pytest.raises(TimeoutError):
+            await client(fake_ollama, timeout=0.2).generate("m", "slow")
+    asyncio.run(main())
+
+def test_closing_a_stream_early_frees_the_scheduler_slot(fake_ollama):
+    fake_ollama.response = "x" * 400
+    fake_ollama.tokens_per_sec = 200
+    async def main():
+        gen = async_ollama.model_generate_stream("m", "hi")
+        first = await gen.__anext__()
+        assert ollama_client.get_scheduler().stats()["inflight"] == 1
+        await gen.aclose()
+        return first
+    assert asyncio.run(main())
+    assert ollama_client.get_scheduler().stats()["inflight"] == 0
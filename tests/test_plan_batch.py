@@ -0,0 +1,53 @@
+import asyncio, json, re
+from jarvis_hybrid import planner
+from jarvis_hybrid.planner import _parse_batch, aplan_batch
+
+def plan(target, **kw):
+    return {"intent": "python", "target": target, "python_code": "", **kw}
+
+def test_entries_matched_by_id_in_any_order():
+    got = _parse_batch({"plans": [plan("c", id=3), plan("a", id="1"), plan("b", id=2)]}, 3)
+    assert [p["target"] for p in got] == ["a", "b", "c"]
+
+def test_missing_unknown_and_duplicate_ids_leave_gaps():
+    got = _parse_batch({"plans": [plan("b", id=2), plan("x", id=9), plan("b2", id=2), plan("t", id=True)]}, 3)
+    assert got[0] is None and got[2] is None
+    assert got[1]["target"] == "b"   # first answer for an id wins
+
+def test_position_only_for_a_full_id_less_list():
+    assert [p["target"] for p in _parse_batch({"plans": [plan("a"), plan("b")]}, 2)] == ["a", "b"]
+    assert _parse_batch({"plans": [plan("a")]}, 2) == [None, None]   # which goal was skipped?
+
+def test_mixed_ids_use_ids_only():
+    got = _parse_batch({"plans": [plan("no id"), plan("b", id=2)]}, 2)
+    assert got == [None, planner.validate_plan(plan("b", id=2))]
+
+def test_invalid_entries_and_replies():
+    assert _parse_batch({"plans": [plan("a", id=1), {"id": 2, "intent": 5}]}, 2)[1] is None
+    assert _parse_batch({"plan": []}, 2) is None
+    assert _parse_batch([plan("a")], 1) is None
+
+def _reversed_batch(prompt: str) -> str:
+    """Fake model: batch prompts are answered in reverse order with ids, single prompts with one plan."""
+    goals = re.findall(r"^(\d+)\. (.+)$", prompt, re.M)
+    if "Goals:" in prompt:
+        return json.dumps({"plans": [plan(g, id=int(i)) for i, g in reversed(goals)]})
+    return json.dumps(plan(re.search(r"^Goal: (.+)$", prompt, re.M).group(1)))
+
+def test_aplan_batch_against_fake_ollama(fake_ollama):
+    fake_ollama.response = _reversed_batch
+    goals = [f"batch goal {i}" for i in range(5)]
+    got = asyncio.run(aplan_batch(goals, "m", max_goals=3))
+    assert [p["target"] for p in got] == goals
+    assert fake_ollama.requests == 2   # 3 + 2 goals
+
+def test_aplan_batch_plans_unanswered_goals_alone(fake_ollama):
+    def answer(prompt):
+        if "Goals:" in prompt:
+            return json.dumps({"plans": [plan("batch goal 1", id=2)]})
+        return _reversed_batch(prompt)
+    fake_ollama.response = answer
+    templates = []
+    got = asyncio.run(aplan_batch(["batch goal 0", "batch goal 1"], "m", templates=templates))
+    assert [p["target"] for p in got] == ["batch goal 0", "batch goal 1"]
+    assert templates == [planner.PROMPT_TEMPLATE, planner.BATCH_PROMPT_TEMPLATE]
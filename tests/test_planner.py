@@ -0,0 +1,67 @@
+import asyncio, json
+import pytest
+from jarvis_hybrid import planner
+from jarvis_hybrid.planner import ObjectScanner, atry_plan, validate_plan
+
+def scan(*chunks):
+    sc = ObjectScanner()
+    for c in chunks:
+        obj = sc.feed(c)
+        if obj is not None:
+            return obj
+    return None
+
+@pytest.mark.parametrize("text", [
+    '{"python_code": "d = {}; print(\'}\')", "target": "{"}',
+    '{"a": "quote \\" and } brace", "b": {"c": [1, {"d": "{{"}]}}',
+    '{"a": "backslash \\\\", "b": "}"}',
+])
+def test_braces_inside_strings(text):
+    assert scan(text) == text
+    assert scan(*text) == text                      # one character at a time
+    assert json.loads(scan(text))
+
+def test_prose_around_the_object_is_dropped():
+    assert scan("Sure! Here it is:\n", '{"intent": "python",', ' "target": null}', "\nHope this helps {") \
+        == '{"intent": "python", "target": null}'
+
+def test_incomplete_object_returns_none():
+    sc = ObjectScanner()
+    assert sc.feed('{"a": "}') is None and sc.feed('", "b": {') is None
+    assert sc.text() == '{"a": "}", "b": {'
+
+def test_validate_plan_schema():
+    assert validate_plan({"intent": "open_url", "target": "x.com"}) == \
+        {"intent": "open_url", "target": "x.com", "python_code": ""}
+    assert validate_plan({"intent": "fly", "target": None, "python_code": "pass"})["intent"] == "other"
+    for bad in [None, [], "plan", {"target": "x"}, {"intent": 3}, {"intent": "python", "target": 1},
+                {"intent": "python", "python_code": ["print(1)"]}]:
+        assert validate_plan(bad) is None, bad
+
+def test_try_plan_stops_at_the_first_object(fake_ollama):
+    fake_ollama.response = 'Plan: {"intent": "python", "target": null, "python_code": "print(1)"} ' + "x" * 4000
+    fake_ollama.tokens_per_sec = 2000
+    pl = asyncio.run(atry_plan("print one", "m"))
+    assert pl == {"intent": "python", "target": None, "python_code": "print(1)"}
+
+def test_try_plan_retries_once_then_gives_up(fake_ollama):
+    fake_ollama.response = "no json here"
+    assert asyncio.run(atry_plan("goal", "m")) is None
+    assert fake_ollama.requests == 1 + planner.PLAN_RETRIES
+
+def test_try_plan_rejects_schema_violations(fake_ollama):
+    fake_ollama.response = '{"intent": ["python"], "target": null}'
+    assert asyncio.run(atry_plan("goal", "m")) is None
+
+def test_identical_concurrent_plans_share_one_request(fake_ollama):
+    fake_ollama.latency = 0.2
+    async def main():
+        return await asyncio.gather(*(atry_plan("same goal", "m") for _ in range(4)), atry_plan("other goal", "m"))
+    plans = asyncio.run(main())
+    assert all(p == plans[0] for p in plans) and plans[0]["intent"] == "python"
+    assert fake_ollama.requests == 2
+
+def test_try_plan_without_llm_returns_none(fake_ollama, monkeypatch):
+    monkeypatch.setattr(planner.async_ollama.shutil, "which", lambda name: None)   # no CLI fallback
+    fake_ollama.stop()
+    assert asyncio.run(atry_plan("goal", "m")) is None
@@ -0,0 +1,132 @@
+import asyncio, threading, time
+import pytest
+from jarvis_hybrid.ollama_client import (PRIORITY_BACKGROUND, PRIORITY_CHAT, PRIORITY_PLANNER,
+                                         RequestScheduler)
+
+def wait_until(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+def queued(s: RequestScheduler) -> int:
+    return s.stats()["queued"]
+
+def test_single_flight_shares_one_call():
+    s = RequestScheduler(2)
+    calls, gate = [], threading.Event()
+    def fn():
+        calls.append(1); gate.wait(5)
+        return "answer"
+    out = []
+    ts = [threading.Thread(target=lambda: out.append(s.run(("k",), PRIORITY_PLANNER, fn))) for _ in range(5)]
+    for t in ts: t.start()
+    wait_until(lambda: s.stats()["by_priority"].get("planner", {}).get("coalesced") == 4)
+    gate.set()
+    for t in ts: t.join(5)
+    assert out == ["answer"] * 5 and len(calls) == 1
+
+def test_single_flight_shares_errors():
+    s = RequestScheduler(1)
+    gate = threading.Event()
+    def fn():
+        gate.wait(5); raise ValueError("boom")
+    errs = []
+    def call():
+        try: s.run(("k",), PRIORITY_PLANNER, fn)
+        except ValueError as e: errs.append(e)
+    ts = [threading.Thread(target=call) for _ in range(3)]
+    for t in ts: t.start()
+    wait_until(lambda: s.stats()["by_priority"].get("planner", {}).get("coalesced") == 2)
+    gate.set()
+    for t in ts: t.join(5)
+    assert len(errs) == 3 and len({id(e) for e in errs}) == 1
+
+def test_slots_go_by_priority_then_fifo():
+    s = RequestScheduler(1)
+    order, hold = [], threading.Event()
+    def take(name, prio):
+        with s.slot(prio): order.append(name)
+    with s.slot(PRIORITY_CHAT):
+        ts = []
+        for name, prio in [("bg", PRIORITY_BACKGROUND), ("plan1", PRIORITY_PLANNER),
+                           ("chat", PRIORITY_CHAT), ("plan2", PRIORITY_PLANNER)]:
+            ts.append(threading.Thread(target=take, args=(name, prio))); ts[-1].start()
+            wait_until(lambda: queued(s) == len(ts))
+    for t in ts: t.join(5)
+    assert order == ["chat", "plan1", "plan2", "bg"]
+
+def test_follower_priority_raises_queued_leader():
+    s = RequestScheduler(1)
+    order = []
+    def lead():
+        s.run(("prefetch",), PRIORITY_BACKGROUND, lambda: order.append("shared"))
+    def other():
+        with s.slot(PRIORITY_PLANNER): order.append("planner")
+    with s.slot(PRIORITY_CHAT):   # keep the only slot busy while the queue forms
+        a = threading.Thread(target=lead); a.start(); wait_until(lambda: queued(s) == 1)
+        b = threading.Thread(target=other); b.start(); wait_until(lambda: queued(s) == 2)
+        c = threading.Thread(target=lambda: s.run(("prefetch",), PRIORITY_CHAT, lambda: None))
+        c.start()
+        wait_until(lambda: s.stats()["by_priority"].get("chat", {}).get("coalesced") == 1)
+    for t in (a, b, c): t.join(5)
+    assert order == ["shared", "planner"]
+
+def test_async_slots_share_the_thread_budget():
+    s = RequestScheduler(2)
+    peak, now = [0], [0]
+    lock = threading.Lock()
+    def enter():
+        with lock:
+            now[0] += 1; peak[0] = max(peak[0], now[0])
+    def leave():
+        with lock: now[0] -= 1
+    def thread_user():
+        with s.slot(PRIORITY_PLANNER):
+            enter(); time.sleep(0.02); leave()
+    async def task_user():
+        async with s.aslot(PRIORITY_PLANNER):
+            enter(); await asyncio.sleep(0.02); leave()
+    async def main():
+        ts = [threading.Thread(target=thread_user) for _ in range(4)]
+        for t in ts: t.start()
+        await asyncio.gather(*(task_user() for _ in range(4)))
+        await asyncio.to_thread(lambda: [t.join(5) for t in ts])
+    asyncio.run(main())
+    assert peak[0] == 2 and s.stats()["inflight"] == 0
+
+def test_arun_follower_retries_when_leader_is_cancelled():
+    s = RequestScheduler(1)
+    calls = []
+    async def fn():
+        calls.append(1)
+        async with s.aslot(PRIORITY_PLANNER):
+            await asyncio.sleep(0.05)
+        return len(calls)
+    async def main():
+        leader = asyncio.create_task(s.arun(("k",), PRIORITY_PLANNER, fn))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(s.arun(("k",), PRIORITY_PLANNER, fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+    assert asyncio.run(main()) == 2
+    assert s.stats()["inflight"] == 0
+
+def test_cancelled_waiter_leaves_the_queue():
+    s = RequestScheduler(1)
+    async def main():
+        async with s.aslot(PRIORITY_PLANNER):
+            async def wait_for_slot():
+                async with s.aslot(PRIORITY_BACKGROUND): pass
+            t = asyncio.create_task(wait_for_slot())
+            await asyncio.sleep(0.01)
+            assert queued(s) == 1
+            t.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await t
+            assert queued(s) == 0
+    asyncio.run(main())
+    assert s.stats()["inflight"] == 0
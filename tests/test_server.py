@@ -0,0 +1,110 @@
+import asyncio, http.client, json, threading
+import pytest
+from jarvis_hybrid.config import load_config
+from jarvis_hybrid.server import MAX_BODY, HTTPError, JarvisServer, _hostname, _read_request
+
+def read(raw: bytes):
+    async def main():
+        r = asyncio.StreamReader()
+        r.feed_data(raw); r.feed_eof()
+        return await _read_request(r)
+    return asyncio.run(main())
+
+def test_parse_get_with_query():
+    req = read(b"get /memory/search/?q=disk+space&k=5&k=7 HTTP/1.1\r\nHost: localhost\r\nX-Thing:  a:b \r\n\r\n")
+    assert (req.method, req.path, req.query) == ("GET", "/memory/search", {"q": "disk space", "k": "7"})
+    assert req.headers == {"host": "localhost", "x-thing": "a:b"} and req.body == b"" and req.keep_alive
+
+def test_parse_post_body_and_connection_close():
+    req = read(b'POST /chat HTTP/1.1\r\nContent-Length: 17\r\nConnection: close\r\n\r\n{"message": "hi"}extra')
+    assert req.json() == {"message": "hi"} and not req.keep_alive
+
+def test_blank_line_means_no_request():
+    assert read(b"\r\n") is None and read(b"") is None
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"POST /chat HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n", 400),
+    (b"POST /chat HTTP/1.1\r\nContent-Length: abc\r\n\r\n", 400),
+    (b"POST /chat HTTP/1.1\r\nContent-Length: -5\r\n\r\n", 400),
+    (b"POST /chat HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (MAX_BODY + 1), 413),
+])
+def test_rejected_requests(raw, status):
+    with pytest.raises(HTTPError) as e:
+        read(raw)
+    assert e.value.status == status
+
+@pytest.mark.parametrize("body", [b"not json", b"[1, 2]"])
+def test_body_must_be_a_json_object(body):
+    req = read(b"POST /goals HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+    with pytest.raises(HTTPError) as e:
+        req.json()
+    assert e.value.status == 400
+
+def test_hostname():
+    assert [_hostname(h) for h in ("localhost:8765", "[::1]:8765", "::1", "127.0.0.1")] == \
+        ["localhost", "::1", "::1", "127.0.0.1"]
+
+GOOD = {"host": "127.0.0.1:8765", "authorization": "Bearer secret", "content-type": "application/json; charset=utf-8"}
+
+@pytest.mark.parametrize("change, status", [
+    ({}, None),
+    ({"host": "[::1]:8765"}, None),
+    ({"origin": "http://localhost:8765"}, 403),
+    ({"host": "evil.example:8765"}, 403),
+    ({"host": "localhost.evil.example"}, 403),
+    ({"authorization": ""}, 401),
+    ({"authorization": "Bearer wrong"}, 401),
+    ({"authorization": "secret"}, 401),
+    ({"content-type": "text/plain"}, 415),
+])
+def test_check_rejections(state, change, status):
+    cfg = load_config(); cfg.server_token = "secret"
+    srv = JarvisServer(cfg)
+    headers = {k: v for k, v in {**GOOD, **change}.items() if v}
+    raw = "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+    req = read(f"POST /goals HTTP/1.1\r\n{raw}Content-Length: 2\r\n\r\n{{}}".encode())
+    if status is None:
+        srv._check(req)
+    else:
+        with pytest.raises(HTTPError) as e:
+            srv._check(req)
+        assert e.value.status == status
+
+@pytest.fixture
+def daemon(fake_ollama):
+    cfg = load_config()
+    cfg.use_worker_pool = False; cfg.server_workers = 2; cfg.server_token = ""
+    server, ready, loop = JarvisServer(cfg), threading.Event(), asyncio.new_event_loop()
+    task = loop.create_task(server.serve("127.0.0.1", 0, ready=ready))
+    th = threading.Thread(target=lambda: loop.run_until_complete(asyncio.gather(task, return_exceptions=True)))
+    th.start()
+    assert ready.wait(30)
+    try:
+        yield server
+    finally:
+        loop.call_soon_threadsafe(task.cancel); th.join(30); loop.close()
+    assert not server.token_file.exists()
+
+def call(server, method, path, body=None, token=None, **headers):
+    conn = http.client.HTTPConnection(*server.address[:2], timeout=30)
+    headers = {"Content-Type": "application/json", **headers}
+    if token is not False: headers["Authorization"] = f"Bearer {token or server.token}"
+    conn.request(method, path, None if body is None else json.dumps(body), headers)
+    resp = conn.getresponse()
+    out = resp.status, json.loads(resp.read() or b"null")
+    conn.close()
+    return out
+
+def test_daemon_end_to_end(daemon):
+    assert daemon.token_file.read_text() == daemon.token
+    assert call(daemon, "GET", "/health", token=False)[0] == 401
+    assert call(daemon, "GET", "/health", token="nope")[0] == 401
+    assert call(daemon, "GET", "/health", Origin="http://evil.example")[0] == 403
+    status, health = call(daemon, "GET", "/health")
+    assert status == 200 and health["ok"]
+    assert call(daemon, "GET", "/nope")[0] == 404
+    assert call(daemon, "GET", "/goals")[0] == 405
+    assert call(daemon, "POST", "/goals", {"goals": []})[0] == 400
+    status, res = call(daemon, "POST", "/goals", {"goals": ["print ok via the daemon"]})
+    assert status == 200 and "ok" in [line.strip() for line in res["log"]]
@@ -0,0 +1,30 @@
+import random
+from jarvis_hybrid.trigger_index import TriggerMatcher
+
+def naive(patterns, text):
+    text = text.lower()
+    return sorted({(p.lower(), v) for p, v in patterns if p and p.lower() in text}, key=lambda pv: pv[1])
+
+def test_overlapping_and_nested_patterns():
+    pats = [("he", 0), ("she", 1), ("his", 2), ("hers", 3), ("ushers", 4)]
+    m = TriggerMatcher(pats)
+    assert m.find("USHERS") == naive(pats, "USHERS")
+    assert [v for _, v in m.find("ushers")] == [0, 1, 3, 4]
+
+def test_each_pattern_reported_once_in_registration_order():
+    m = TriggerMatcher([("disk", "a"), ("space", "b"), ("disk", "c")])
+    assert m.find("disk disk space") == [("disk", "a"), ("space", "b"), ("disk", "c")]
+
+def test_empty_patterns_and_no_match():
+    m = TriggerMatcher([("", 0), ("report", 1)])
+    assert len(m) == 1
+    assert m.find("") == []
+    assert m.find("weekly repor") == []
+
+def test_matches_naive_substring_search():
+    rnd = random.Random(5)
+    alphabet = "ab c"
+    for _ in range(200):
+        pats = [("".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 4))), i) for i in range(rnd.randint(1, 12))]
+        text = "".join(rnd.choice(alphabet + "AB") for _ in range(rnd.randint(0, 30)))
+        assert TriggerMatcher(pats).find(text) == naive(pats, text), (pats, text)